@@ -0,0 +1,42 @@
+"""add keyset pagination indexes
+
+Revision ID: 3f1c2a9d7b64
+Revises: bc150950f793
+Create Date: 2026-10-17 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b64'
+down_revision = 'bc150950f793'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (sort key, id) pairs back the ORDER BY ... , id and row comparison seeks of cursor pagination
+    op.execute("""
+    CREATE INDEX ix_sports_name_id ON sports (name, id);
+    CREATE INDEX ix_sports_created_at_id ON sports (created_at, id);
+
+    CREATE INDEX ix_events_name_id ON events (name, id);
+    CREATE INDEX ix_events_created_at_id ON events (created_at, id);
+
+    CREATE INDEX ix_selections_name_id ON selections (name, id);
+    CREATE INDEX ix_selections_created_at_id ON selections (created_at, id);
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP INDEX ix_selections_created_at_id;
+    DROP INDEX ix_selections_name_id;
+
+    DROP INDEX ix_events_created_at_id;
+    DROP INDEX ix_events_name_id;
+
+    DROP INDEX ix_sports_created_at_id;
+    DROP INDEX ix_sports_name_id;
+    """)
@@ -0,0 +1,54 @@
+"""add name search indexes
+
+Revision ID: 5a7e0c3f9d21
+Revises: 8d42e6b1c7a0
+Create Date: 2026-10-17 11:25:09.331842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7e0c3f9d21'
+down_revision = '8d42e6b1c7a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+
+    # Trigram indexes serve the regex (~*) and contains (ILIKE) search modes
+    op.execute("""
+    CREATE INDEX ix_sports_name_trgm ON sports USING gin (name gin_trgm_ops);
+    CREATE INDEX ix_sports_url_identifier_trgm ON sports USING gin (url_identifier gin_trgm_ops);
+    CREATE INDEX ix_events_name_trgm ON events USING gin (name gin_trgm_ops);
+    CREATE INDEX ix_events_url_identifier_trgm ON events USING gin (url_identifier gin_trgm_ops);
+    CREATE INDEX ix_selections_name_trgm ON selections USING gin (name gin_trgm_ops);
+    """)
+
+    # lower(column) LIKE 'term%' range scans serve the prefix search mode
+    op.execute("""
+    CREATE INDEX ix_sports_name_lower ON sports (lower(name) text_pattern_ops);
+    CREATE INDEX ix_sports_url_identifier_lower ON sports (lower(url_identifier) text_pattern_ops);
+    CREATE INDEX ix_events_name_lower ON events (lower(name) text_pattern_ops);
+    CREATE INDEX ix_events_url_identifier_lower ON events (lower(url_identifier) text_pattern_ops);
+    CREATE INDEX ix_selections_name_lower ON selections (lower(name) text_pattern_ops);
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP INDEX ix_selections_name_lower;
+    DROP INDEX ix_events_url_identifier_lower;
+    DROP INDEX ix_events_name_lower;
+    DROP INDEX ix_sports_url_identifier_lower;
+    DROP INDEX ix_sports_name_lower;
+
+    DROP INDEX ix_selections_name_trgm;
+    DROP INDEX ix_events_url_identifier_trgm;
+    DROP INDEX ix_events_name_trgm;
+    DROP INDEX ix_sports_url_identifier_trgm;
+    DROP INDEX ix_sports_name_trgm;
+    """)
+    # pg_trgm is left installed, other objects in the database may depend on it
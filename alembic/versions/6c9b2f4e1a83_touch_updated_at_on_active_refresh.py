@@ -0,0 +1,108 @@
+"""touch updated_at on active refresh
+
+Revision ID: 6c9b2f4e1a83
+Revises: 5a7e0c3f9d21
+Create Date: 2026-10-17 13:41:52.706318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c9b2f4e1a83'
+down_revision = '5a7e0c3f9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ETags and updated_at watermarks must see active flags flipped by the trigger
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_selection_active() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Collect only the events whose selections were touched by this statement
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_selections;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_selections;
+        ELSE
+            -- Price-only updates leave active and event_id alone, so they don't touch events at all
+            SELECT array_agg(DISTINCT changed.event_id) INTO changed_events
+            FROM (
+                SELECT n.event_id, o.event_id AS old_event_id
+                FROM new_selections n
+                JOIN old_selections o ON o.id = n.id
+                WHERE n.active IS DISTINCT FROM o.active OR n.event_id IS DISTINCT FROM o.event_id
+            ) moved
+            CROSS JOIN LATERAL (VALUES (moved.event_id), (moved.old_event_id)) AS changed(event_id);
+        END IF;
+
+        IF changed_events IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        -- Update the event active status of the touched events
+        UPDATE events
+        SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active),
+            updated_at = timezone('utc', now())
+        WHERE id = ANY(changed_events)
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+        -- Update the sport active status of the sports owning those events
+        UPDATE sports
+        SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active),
+            updated_at = timezone('utc', now())
+        WHERE id IN (SELECT sport_id FROM events WHERE id = ANY(changed_events))
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_selection_active() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Collect only the events whose selections were touched by this statement
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_selections;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_selections;
+        ELSE
+            -- Price-only updates leave active and event_id alone, so they don't touch events at all
+            SELECT array_agg(DISTINCT changed.event_id) INTO changed_events
+            FROM (
+                SELECT n.event_id, o.event_id AS old_event_id
+                FROM new_selections n
+                JOIN old_selections o ON o.id = n.id
+                WHERE n.active IS DISTINCT FROM o.active OR n.event_id IS DISTINCT FROM o.event_id
+            ) moved
+            CROSS JOIN LATERAL (VALUES (moved.event_id), (moved.old_event_id)) AS changed(event_id);
+        END IF;
+
+        IF changed_events IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        -- Update the event active status of the touched events
+        UPDATE events
+        SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active)
+        WHERE id = ANY(changed_events)
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+        -- Update the sport active status of the sports owning those events
+        UPDATE sports
+        SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active)
+        WHERE id IN (SELECT sport_id FROM events WHERE id = ANY(changed_events))
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
\ No newline at end of file
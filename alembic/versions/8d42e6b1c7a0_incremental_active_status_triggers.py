@@ -0,0 +1,113 @@
+"""incremental active status triggers
+
+Revision ID: 8d42e6b1c7a0
+Revises: 3f1c2a9d7b64
+Create Date: 2026-10-17 10:03:27.904115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d42e6b1c7a0'
+down_revision = '3f1c2a9d7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    DROP TRIGGER check_selection_active_trigger ON selections;
+    DROP FUNCTION check_selection_active;
+
+    -- The EXISTS lookups below go through the foreign keys, which have no index of their own
+    CREATE INDEX ix_selections_event_id ON selections (event_id);
+    CREATE INDEX ix_events_sport_id ON events (sport_id);
+
+    CREATE OR REPLACE FUNCTION refresh_selection_active() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Collect only the events whose selections were touched by this statement
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_selections;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_selections;
+        ELSE
+            -- Price-only updates leave active and event_id alone, so they don't touch events at all
+            SELECT array_agg(DISTINCT changed.event_id) INTO changed_events
+            FROM (
+                SELECT n.event_id, o.event_id AS old_event_id
+                FROM new_selections n
+                JOIN old_selections o ON o.id = n.id
+                WHERE n.active IS DISTINCT FROM o.active OR n.event_id IS DISTINCT FROM o.event_id
+            ) moved
+            CROSS JOIN LATERAL (VALUES (moved.event_id), (moved.old_event_id)) AS changed(event_id);
+        END IF;
+
+        IF changed_events IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        -- Update the event active status of the touched events
+        UPDATE events
+        SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active)
+        WHERE id = ANY(changed_events)
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+        -- Update the sport active status of the sports owning those events
+        UPDATE sports
+        SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active)
+        WHERE id IN (SELECT sport_id FROM events WHERE id = ANY(changed_events))
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Transition tables can only be declared for a single event, hence one trigger per operation
+    CREATE TRIGGER refresh_selection_active_insert_trigger
+    AFTER INSERT ON selections
+    REFERENCING NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+
+    CREATE TRIGGER refresh_selection_active_update_trigger
+    AFTER UPDATE ON selections
+    REFERENCING OLD TABLE AS old_selections NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+
+    CREATE TRIGGER refresh_selection_active_delete_trigger
+    AFTER DELETE ON selections
+    REFERENCING OLD TABLE AS old_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP TRIGGER refresh_selection_active_delete_trigger ON selections;
+    DROP TRIGGER refresh_selection_active_update_trigger ON selections;
+    DROP TRIGGER refresh_selection_active_insert_trigger ON selections;
+    DROP FUNCTION refresh_selection_active;
+
+    DROP INDEX ix_events_sport_id;
+    DROP INDEX ix_selections_event_id;
+
+    CREATE OR REPLACE FUNCTION check_selection_active() RETURNS TRIGGER AS $$
+    BEGIN
+        -- Update the event active status
+        UPDATE events
+        SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+        -- Update the sport active status
+        UPDATE sports
+        SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER check_selection_active_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON selections
+    FOR EACH STATEMENT EXECUTE FUNCTION check_selection_active();
+    """)
@@ -0,0 +1,32 @@
+"""add change feed indexes
+
+Revision ID: 9e3a7d5c2b18
+Revises: 6c9b2f4e1a83
+Create Date: 2026-10-17 15:02:13.480926
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3a7d5c2b18'
+down_revision = '6c9b2f4e1a83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (last change, id) pairs back the watermark seeks of the change feeds and updated_since exports
+    op.execute("""
+    CREATE INDEX ix_sports_changed_at_id ON sports ((coalesce(updated_at, created_at)), id);
+    CREATE INDEX ix_events_changed_at_id ON events ((coalesce(updated_at, created_at)), id);
+    CREATE INDEX ix_selections_changed_at_id ON selections ((coalesce(updated_at, created_at)), id);
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP INDEX ix_selections_changed_at_id;
+    DROP INDEX ix_events_changed_at_id;
+    DROP INDEX ix_sports_changed_at_id;
+    """)
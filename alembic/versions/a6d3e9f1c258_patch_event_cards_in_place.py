@@ -0,0 +1,362 @@
+"""patch event cards in place
+
+Revision ID: a6d3e9f1c258
+Revises: f3b8d2c6a417
+Create Date: 2026-10-18 02:47:15.330871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3e9f1c258'
+down_revision = 'f3b8d2c6a417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cards were rebuilt whole on every write, with the event row locked first: price writes to the
+    # selections of one event ran one at a time, and an active flip rebuilt its card twice (once from
+    # the selections trigger, once from the events trigger the active refresh fires). Now only
+    # selections joining or leaving an event rebuild its card. Every other write rewrites the fields
+    # it changed inside the card, locking the card row alone, and only for the rest of its transaction.
+    op.execute("""
+    DROP TRIGGER refresh_event_cards_sports_update_trigger ON sports;
+    DROP TRIGGER refresh_event_cards_events_update_trigger ON events;
+    DROP TRIGGER refresh_event_cards_events_insert_trigger ON events;
+    DROP TRIGGER refresh_event_cards_selections_delete_trigger ON selections;
+    DROP TRIGGER refresh_event_cards_selections_update_trigger ON selections;
+    DROP TRIGGER refresh_event_cards_selections_insert_trigger ON selections;
+    DROP TRIGGER refresh_selection_active_delete_trigger ON selections;
+    DROP TRIGGER refresh_selection_active_update_trigger ON selections;
+    DROP TRIGGER refresh_selection_active_insert_trigger ON selections;
+    DROP FUNCTION refresh_event_cards;
+    DROP FUNCTION refresh_selection_active;
+
+    -- the sport rename patch reads every card of a sport, active or not
+    CREATE INDEX ix_event_cards_sport_id ON event_cards (sport_id);
+
+    -- One trigger function per table keeps both the active flags and the cards of a statement in step
+    CREATE OR REPLACE FUNCTION refresh_selection_derived() RETURNS TRIGGER AS $$
+    DECLARE
+        active_events integer[];
+        rebuilt_events integer[];
+        patched_events integer[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT event_id) INTO active_events FROM new_selections;
+            rebuilt_events := active_events;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT event_id) INTO active_events FROM old_selections;
+            rebuilt_events := active_events;
+        ELSE
+            -- Price-only updates leave active and event_id alone, so they don't touch events at all
+            SELECT array_agg(DISTINCT changed.event_id) INTO active_events
+            FROM new_selections n
+            JOIN old_selections o ON o.id = n.id
+            CROSS JOIN LATERAL (VALUES (n.event_id), (o.event_id)) AS changed(event_id)
+            WHERE n.active IS DISTINCT FROM o.active OR n.event_id IS DISTINCT FROM o.event_id;
+
+            -- a selection moved to another event leaves one card and joins the other
+            SELECT array_agg(DISTINCT changed.event_id) INTO rebuilt_events
+            FROM new_selections n
+            JOIN old_selections o ON o.id = n.id
+            CROSS JOIN LATERAL (VALUES (n.event_id), (o.event_id)) AS changed(event_id)
+            WHERE n.event_id IS DISTINCT FROM o.event_id;
+
+            -- the rest only changed what their card entry shows, or nothing it shows at all
+            SELECT array_agg(DISTINCT n.event_id) INTO patched_events
+            FROM new_selections n
+            JOIN old_selections o ON o.id = n.id
+            WHERE n.event_id = o.event_id
+              AND NOT n.event_id = ANY(coalesce(rebuilt_events, '{}'))
+              AND (n.name, n.price, n.active, n.outcome) IS DISTINCT FROM (o.name, o.price, o.active, o.outcome);
+        END IF;
+
+        IF active_events IS NOT NULL THEN
+            -- the events trigger patches the new flags into the cards
+            UPDATE events
+            SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active),
+                updated_at = timezone('utc', now())
+            WHERE id = ANY(active_events)
+              AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+            UPDATE sports
+            SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active),
+                updated_at = timezone('utc', now())
+            WHERE id IN (SELECT sport_id FROM events WHERE id = ANY(active_events))
+              AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+        END IF;
+
+        -- Card rows are locked in event order, so statements touching several cards can't deadlock.
+        -- Each statement after the lock reads a new snapshot, which sees the write that held it before:
+        -- a rebuild or a patch never works from a card another transaction is still changing.
+        IF rebuilt_events IS NOT NULL THEN
+            PERFORM 1 FROM event_cards WHERE event_id = ANY(rebuilt_events) ORDER BY event_id FOR UPDATE;
+            PERFORM build_event_cards(rebuilt_events);
+        END IF;
+
+        IF patched_events IS NOT NULL THEN
+            PERFORM 1 FROM event_cards WHERE event_id = ANY(patched_events) ORDER BY event_id FOR UPDATE;
+
+            -- swap the changed entries, kept in the (name, id) order build_event_cards writes
+            UPDATE event_cards c
+            SET card = jsonb_set(c.card, '{selections}', (
+                    SELECT coalesce(jsonb_agg(entry ORDER BY entry->>'name', (entry->>'id')::int), '[]'::jsonb)
+                    FROM (
+                        SELECT coalesce(jsonb_strip_nulls(jsonb_build_object(
+                            'id', n.id,
+                            'name', n.name,
+                            'price', n.price,
+                            'active', n.active,
+                            'outcome', n.outcome
+                        )), current.entry) AS entry
+                        FROM jsonb_array_elements(c.card->'selections') AS current(entry)
+                        LEFT JOIN new_selections n ON n.id = (current.entry->>'id')::int
+                    ) entries
+                )),
+                updated_at = timezone('utc', now())
+            WHERE c.event_id = ANY(patched_events);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION refresh_event_cards_of_events() RETURNS TRIGGER AS $$
+    DECLARE
+        patched_events integer[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM build_event_cards(ARRAY(SELECT id FROM new_events));
+            RETURN NULL;
+        END IF;
+
+        -- only the event's own fields and its sport, the selections entries stay as they are
+        SELECT array_agg(n.id) INTO patched_events
+        FROM new_events n
+        JOIN old_events o ON o.id = n.id
+        WHERE (n.name, n.url_identifier, n.active, n.type, n.status, n.scheduled_start, n.actual_start, n.sport_id)
+            IS DISTINCT FROM (o.name, o.url_identifier, o.active, o.type, o.status, o.scheduled_start, o.actual_start, o.sport_id);
+
+        IF patched_events IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        PERFORM 1 FROM event_cards WHERE event_id = ANY(patched_events) ORDER BY event_id FOR UPDATE;
+
+        UPDATE event_cards c
+        SET sport_id = n.sport_id,
+            active = n.active,
+            scheduled_start = n.scheduled_start,
+            card = (c.card - ARRAY['name', 'url_identifier', 'active', 'type', 'status', 'scheduled_start', 'actual_start', 'sport'])
+                || jsonb_strip_nulls(jsonb_build_object(
+                    'name', n.name,
+                    'url_identifier', n.url_identifier,
+                    'active', n.active,
+                    'type', n.type,
+                    'status', n.status,
+                    'scheduled_start', to_char(n.scheduled_start, 'YYYY-MM-DD"T"HH24:MI:SS"Z"'),
+                    'actual_start', to_char(n.actual_start, 'YYYY-MM-DD"T"HH24:MI:SS"Z"'),
+                    'sport', jsonb_build_object('id', s.id, 'name', s.name, 'url_identifier', s.url_identifier)
+                )),
+            updated_at = timezone('utc', now())
+        FROM new_events n
+        JOIN sports s ON s.id = n.sport_id
+        WHERE c.event_id = n.id AND n.id = ANY(patched_events);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION refresh_event_cards_of_sports() RETURNS TRIGGER AS $$
+    BEGIN
+        -- the active refresh updates sports too, only a change to what the cards show patches them
+        UPDATE event_cards c
+        SET card = jsonb_set(c.card, '{sport}', jsonb_strip_nulls(jsonb_build_object('id', n.id, 'name', n.name, 'url_identifier', n.url_identifier))),
+            updated_at = timezone('utc', now())
+        FROM new_sports n
+        JOIN old_sports o ON o.id = n.id
+        WHERE c.sport_id = n.id
+          AND (n.name IS DISTINCT FROM o.name OR n.url_identifier IS DISTINCT FROM o.url_identifier);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Transition tables can only be declared for a single event, hence one trigger per operation.
+    -- Deleted events take their card with them through the foreign key.
+    CREATE TRIGGER refresh_selection_derived_insert_trigger
+    AFTER INSERT ON selections
+    REFERENCING NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_derived();
+
+    CREATE TRIGGER refresh_selection_derived_update_trigger
+    AFTER UPDATE ON selections
+    REFERENCING OLD TABLE AS old_selections NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_derived();
+
+    CREATE TRIGGER refresh_selection_derived_delete_trigger
+    AFTER DELETE ON selections
+    REFERENCING OLD TABLE AS old_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_derived();
+
+    CREATE TRIGGER refresh_event_cards_events_insert_trigger
+    AFTER INSERT ON events
+    REFERENCING NEW TABLE AS new_events
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards_of_events();
+
+    CREATE TRIGGER refresh_event_cards_events_update_trigger
+    AFTER UPDATE ON events
+    REFERENCING OLD TABLE AS old_events NEW TABLE AS new_events
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards_of_events();
+
+    CREATE TRIGGER refresh_event_cards_sports_update_trigger
+    AFTER UPDATE ON sports
+    REFERENCING OLD TABLE AS old_sports NEW TABLE AS new_sports
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards_of_sports();
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP TRIGGER refresh_event_cards_sports_update_trigger ON sports;
+    DROP TRIGGER refresh_event_cards_events_update_trigger ON events;
+    DROP TRIGGER refresh_event_cards_events_insert_trigger ON events;
+    DROP TRIGGER refresh_selection_derived_delete_trigger ON selections;
+    DROP TRIGGER refresh_selection_derived_update_trigger ON selections;
+    DROP TRIGGER refresh_selection_derived_insert_trigger ON selections;
+    DROP FUNCTION refresh_event_cards_of_sports;
+    DROP FUNCTION refresh_event_cards_of_events;
+    DROP FUNCTION refresh_selection_derived;
+
+    DROP INDEX ix_event_cards_sport_id;
+
+    CREATE OR REPLACE FUNCTION refresh_selection_active() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Collect only the events whose selections were touched by this statement
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_selections;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_selections;
+        ELSE
+            -- Price-only updates leave active and event_id alone, so they don't touch events at all
+            SELECT array_agg(DISTINCT changed.event_id) INTO changed_events
+            FROM (
+                SELECT n.event_id, o.event_id AS old_event_id
+                FROM new_selections n
+                JOIN old_selections o ON o.id = n.id
+                WHERE n.active IS DISTINCT FROM o.active OR n.event_id IS DISTINCT FROM o.event_id
+            ) moved
+            CROSS JOIN LATERAL (VALUES (moved.event_id), (moved.old_event_id)) AS changed(event_id);
+        END IF;
+
+        IF changed_events IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        -- Update the event active status of the touched events
+        UPDATE events
+        SET active = EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active),
+            updated_at = timezone('utc', now())
+        WHERE id = ANY(changed_events)
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM selections WHERE event_id = events.id AND active);
+
+        -- Update the sport active status of the sports owning those events
+        UPDATE sports
+        SET active = EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active),
+            updated_at = timezone('utc', now())
+        WHERE id IN (SELECT sport_id FROM events WHERE id = ANY(changed_events))
+          AND active IS DISTINCT FROM EXISTS (SELECT 1 FROM events WHERE sport_id = sports.id AND active);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION refresh_event_cards() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Rebuild only the cards of the events the statement touched
+        IF TG_TABLE_NAME = 'selections' THEN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_rows;
+            ELSE
+                -- a selection moved to another event changes both cards
+                SELECT array_agg(event_id) INTO changed_events
+                FROM (SELECT event_id FROM new_rows UNION SELECT event_id FROM old_rows) touched;
+            END IF;
+        ELSIF TG_TABLE_NAME = 'events' THEN
+            SELECT array_agg(id) INTO changed_events FROM new_rows;
+        ELSE
+            -- the active refresh updates sports too, only a change to what the cards show rebuilds them
+            SELECT array_agg(events.id) INTO changed_events
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            JOIN events ON events.sport_id = n.id
+            WHERE n.name IS DISTINCT FROM o.name OR n.url_identifier IS DISTINCT FROM o.url_identifier;
+        END IF;
+
+        IF changed_events IS NOT NULL THEN
+            -- Concurrent writes to sibling selections each rebuild the whole card from their own
+            -- snapshot, the one that commits last would drop the other's change. Locking the events
+            -- serializes the rebuilds of a card, in id order so they can't deadlock, and the build
+            -- that runs once the lock is granted takes a new snapshot that sees the other write.
+            PERFORM 1 FROM events WHERE id = ANY(changed_events) ORDER BY id FOR UPDATE;
+            PERFORM build_event_cards(changed_events);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER refresh_selection_active_insert_trigger
+    AFTER INSERT ON selections
+    REFERENCING NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+
+    CREATE TRIGGER refresh_selection_active_update_trigger
+    AFTER UPDATE ON selections
+    REFERENCING OLD TABLE AS old_selections NEW TABLE AS new_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+
+    CREATE TRIGGER refresh_selection_active_delete_trigger
+    AFTER DELETE ON selections
+    REFERENCING OLD TABLE AS old_selections
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_selection_active();
+
+    CREATE TRIGGER refresh_event_cards_selections_insert_trigger
+    AFTER INSERT ON selections
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_selections_update_trigger
+    AFTER UPDATE ON selections
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_selections_delete_trigger
+    AFTER DELETE ON selections
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_events_insert_trigger
+    AFTER INSERT ON events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_events_update_trigger
+    AFTER UPDATE ON events
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_sports_update_trigger
+    AFTER UPDATE ON sports
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+    """)
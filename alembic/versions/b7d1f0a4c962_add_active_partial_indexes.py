@@ -0,0 +1,51 @@
+"""add active partial indexes
+
+Revision ID: b7d1f0a4c962
+Revises: 9e3a7d5c2b18
+Create Date: 2026-10-17 18:21:40.117352
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d1f0a4c962'
+down_revision = '9e3a7d5c2b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- (sort key, id) over the active rows only, for the ?active=true pages and counts which otherwise
+    -- walk the full sort index and drop every inactive row on the way
+    CREATE INDEX ix_sports_active_name_id ON sports (name, id) WHERE active;
+    CREATE INDEX ix_sports_active_created_at_id ON sports (created_at, id) WHERE active;
+
+    CREATE INDEX ix_events_active_name_id ON events (name, id) WHERE active;
+    CREATE INDEX ix_events_active_created_at_id ON events (created_at, id) WHERE active;
+
+    CREATE INDEX ix_selections_active_name_id ON selections (name, id) WHERE active;
+    CREATE INDEX ix_selections_active_created_at_id ON selections (created_at, id) WHERE active;
+
+    -- The trigger's EXISTS (... WHERE event_id = events.id AND active) lookups only ever look for an
+    -- active child, with these they find one without visiting the inactive ones
+    CREATE INDEX ix_selections_event_id_active ON selections (event_id) WHERE active;
+    CREATE INDEX ix_events_sport_id_active ON events (sport_id) WHERE active;
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP INDEX ix_events_sport_id_active;
+    DROP INDEX ix_selections_event_id_active;
+
+    DROP INDEX ix_selections_active_created_at_id;
+    DROP INDEX ix_selections_active_name_id;
+
+    DROP INDEX ix_events_active_created_at_id;
+    DROP INDEX ix_events_active_name_id;
+
+    DROP INDEX ix_sports_active_created_at_id;
+    DROP INDEX ix_sports_active_name_id;
+    """)
@@ -0,0 +1,44 @@
+"""add nested listing indexes
+
+Revision ID: c4e8a2f61d07
+Revises: b7d1f0a4c962
+Create Date: 2026-10-17 19:04:55.630218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2f61d07'
+down_revision = 'b7d1f0a4c962'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- (parent, sort key, id) triples back the keyset pages of /sports/<id>/events and
+    -- /events/<id>/selections, and the ordered join of ?expand=selections
+    CREATE INDEX ix_events_sport_id_name_id ON events (sport_id, name, id);
+    CREATE INDEX ix_events_sport_id_created_at_id ON events (sport_id, created_at, id);
+
+    CREATE INDEX ix_selections_event_id_name_id ON selections (event_id, name, id);
+    CREATE INDEX ix_selections_event_id_created_at_id ON selections (event_id, created_at, id);
+
+    -- their leading column serves the foreign key lookups the single column indexes were for
+    DROP INDEX ix_events_sport_id;
+    DROP INDEX ix_selections_event_id;
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    CREATE INDEX ix_selections_event_id ON selections (event_id);
+    CREATE INDEX ix_events_sport_id ON events (sport_id);
+
+    DROP INDEX ix_selections_event_id_created_at_id;
+    DROP INDEX ix_selections_event_id_name_id;
+
+    DROP INDEX ix_events_sport_id_created_at_id;
+    DROP INDEX ix_events_sport_id_name_id;
+    """)
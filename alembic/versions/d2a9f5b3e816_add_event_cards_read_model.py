@@ -0,0 +1,157 @@
+"""add event cards read model
+
+Revision ID: d2a9f5b3e816
+Revises: c4e8a2f61d07
+Create Date: 2026-10-17 20:12:08.341597
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9f5b3e816'
+down_revision = 'c4e8a2f61d07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # One precomputed board card per event: the event, its sport and its selections as a single
+    # JSON document, so /v1/board reads a page of cards instead of assembling them per request
+    op.execute("""
+    CREATE TABLE event_cards (
+        event_id INT PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+        sport_id INT NOT NULL,
+        active BOOLEAN NOT NULL,
+        scheduled_start TIMESTAMP NOT NULL,
+        card JSONB NOT NULL,
+        updated_at TIMESTAMP NOT NULL
+    );
+
+    -- (scheduled_start, event_id) is the board order and its cursor
+    CREATE INDEX ix_event_cards_start_event_id ON event_cards (scheduled_start, event_id);
+    CREATE INDEX ix_event_cards_active_start_event_id ON event_cards (scheduled_start, event_id) WHERE active;
+    CREATE INDEX ix_event_cards_active_sport_id_start_event_id ON event_cards (sport_id, scheduled_start, event_id) WHERE active;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION build_event_cards(event_ids integer[]) RETURNS void AS $$
+        INSERT INTO event_cards (event_id, sport_id, active, scheduled_start, card, updated_at)
+        SELECT e.id, e.sport_id, e.active, e.scheduled_start,
+            -- same fields and timestamp format as the events and selections endpoints, nulls left out
+            jsonb_strip_nulls(jsonb_build_object(
+                'id', e.id,
+                'name', e.name,
+                'url_identifier', e.url_identifier,
+                'active', e.active,
+                'type', e.type,
+                'status', e.status,
+                'scheduled_start', to_char(e.scheduled_start, 'YYYY-MM-DD"T"HH24:MI:SS"Z"'),
+                'actual_start', to_char(e.actual_start, 'YYYY-MM-DD"T"HH24:MI:SS"Z"'),
+                'sport', jsonb_build_object('id', s.id, 'name', s.name, 'url_identifier', s.url_identifier),
+                'selections', coalesce((
+                    SELECT jsonb_agg(jsonb_build_object(
+                        'id', sel.id,
+                        'name', sel.name,
+                        'price', sel.price,
+                        'active', sel.active,
+                        'outcome', sel.outcome
+                    ) ORDER BY sel.name, sel.id)
+                    FROM selections sel WHERE sel.event_id = e.id
+                ), '[]'::jsonb)
+            )),
+            timezone('utc', now())
+        FROM events e
+        JOIN sports s ON s.id = e.sport_id
+        WHERE e.id = ANY(event_ids)
+        ON CONFLICT (event_id) DO UPDATE
+        SET sport_id = EXCLUDED.sport_id,
+            active = EXCLUDED.active,
+            scheduled_start = EXCLUDED.scheduled_start,
+            card = EXCLUDED.card,
+            updated_at = EXCLUDED.updated_at;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION refresh_event_cards() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Rebuild only the cards of the events the statement touched
+        IF TG_TABLE_NAME = 'selections' THEN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_rows;
+            ELSE
+                -- a selection moved to another event changes both cards
+                SELECT array_agg(event_id) INTO changed_events
+                FROM (SELECT event_id FROM new_rows UNION SELECT event_id FROM old_rows) touched;
+            END IF;
+        ELSIF TG_TABLE_NAME = 'events' THEN
+            SELECT array_agg(id) INTO changed_events FROM new_rows;
+        ELSE
+            -- the active refresh updates sports too, only a change to what the cards show rebuilds them
+            SELECT array_agg(events.id) INTO changed_events
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            JOIN events ON events.sport_id = n.id
+            WHERE n.name IS DISTINCT FROM o.name OR n.url_identifier IS DISTINCT FROM o.url_identifier;
+        END IF;
+
+        IF changed_events IS NOT NULL THEN
+            PERFORM build_event_cards(changed_events);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Transition tables can only be declared for a single event, hence one trigger per operation.
+    -- Deleted events take their card with them through the foreign key.
+    CREATE TRIGGER refresh_event_cards_selections_insert_trigger
+    AFTER INSERT ON selections
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_selections_update_trigger
+    AFTER UPDATE ON selections
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_selections_delete_trigger
+    AFTER DELETE ON selections
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_events_insert_trigger
+    AFTER INSERT ON events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_events_update_trigger
+    AFTER UPDATE ON events
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    CREATE TRIGGER refresh_event_cards_sports_update_trigger
+    AFTER UPDATE ON sports
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_event_cards();
+
+    SELECT build_event_cards(ARRAY(SELECT id FROM events));
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    DROP TRIGGER refresh_event_cards_sports_update_trigger ON sports;
+    DROP TRIGGER refresh_event_cards_events_update_trigger ON events;
+    DROP TRIGGER refresh_event_cards_events_insert_trigger ON events;
+    DROP TRIGGER refresh_event_cards_selections_delete_trigger ON selections;
+    DROP TRIGGER refresh_event_cards_selections_update_trigger ON selections;
+    DROP TRIGGER refresh_event_cards_selections_insert_trigger ON selections;
+    DROP FUNCTION refresh_event_cards;
+    DROP FUNCTION build_event_cards;
+
+    DROP TABLE event_cards;
+    """)
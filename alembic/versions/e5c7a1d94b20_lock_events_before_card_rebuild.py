@@ -0,0 +1,97 @@
+"""lock events before card rebuild
+
+Revision ID: e5c7a1d94b20
+Revises: d2a9f5b3e816
+Create Date: 2026-10-17 23:04:31.518273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c7a1d94b20'
+down_revision = 'd2a9f5b3e816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Card rebuilds of one event must not run side by side, or the last one to commit loses the other's update
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_event_cards() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Rebuild only the cards of the events the statement touched
+        IF TG_TABLE_NAME = 'selections' THEN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_rows;
+            ELSE
+                -- a selection moved to another event changes both cards
+                SELECT array_agg(event_id) INTO changed_events
+                FROM (SELECT event_id FROM new_rows UNION SELECT event_id FROM old_rows) touched;
+            END IF;
+        ELSIF TG_TABLE_NAME = 'events' THEN
+            SELECT array_agg(id) INTO changed_events FROM new_rows;
+        ELSE
+            -- the active refresh updates sports too, only a change to what the cards show rebuilds them
+            SELECT array_agg(events.id) INTO changed_events
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            JOIN events ON events.sport_id = n.id
+            WHERE n.name IS DISTINCT FROM o.name OR n.url_identifier IS DISTINCT FROM o.url_identifier;
+        END IF;
+
+        IF changed_events IS NOT NULL THEN
+            -- Concurrent writes to sibling selections each rebuild the whole card from their own
+            -- snapshot, the one that commits last would drop the other's change. Locking the events
+            -- serializes the rebuilds of a card, in id order so they can't deadlock, and the build
+            -- that runs once the lock is granted takes a new snapshot that sees the other write.
+            PERFORM 1 FROM events WHERE id = ANY(changed_events) ORDER BY id FOR UPDATE;
+            PERFORM build_event_cards(changed_events);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION refresh_event_cards() RETURNS TRIGGER AS $$
+    DECLARE
+        changed_events integer[];
+    BEGIN
+        -- Rebuild only the cards of the events the statement touched
+        IF TG_TABLE_NAME = 'selections' THEN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(DISTINCT event_id) INTO changed_events FROM old_rows;
+            ELSE
+                -- a selection moved to another event changes both cards
+                SELECT array_agg(event_id) INTO changed_events
+                FROM (SELECT event_id FROM new_rows UNION SELECT event_id FROM old_rows) touched;
+            END IF;
+        ELSIF TG_TABLE_NAME = 'events' THEN
+            SELECT array_agg(id) INTO changed_events FROM new_rows;
+        ELSE
+            -- the active refresh updates sports too, only a change to what the cards show rebuilds them
+            SELECT array_agg(events.id) INTO changed_events
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            JOIN events ON events.sport_id = n.id
+            WHERE n.name IS DISTINCT FROM o.name OR n.url_identifier IS DISTINCT FROM o.url_identifier;
+        END IF;
+
+        IF changed_events IS NOT NULL THEN
+            PERFORM build_event_cards(changed_events);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
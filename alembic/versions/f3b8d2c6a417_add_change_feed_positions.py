@@ -0,0 +1,75 @@
+"""add change feed positions
+
+Revision ID: f3b8d2c6a417
+Revises: e5c7a1d94b20
+Create Date: 2026-10-18 00:21:46.902115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2c6a417'
+down_revision = 'e5c7a1d94b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Change feed positions assigned by the database instead of the app's clock: the id of the
+    # writing transaction, then a sequence number. The feeds only hand out rows of transactions
+    # older than every one still running, so no write can commit behind a position already handed out.
+    # Rows written before this revision share transaction 0 and are numbered in table order.
+    op.execute("""
+    CREATE SEQUENCE change_seq;
+
+    ALTER TABLE events ADD COLUMN change_xid BIGINT NOT NULL DEFAULT 0, ADD COLUMN change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+    ALTER TABLE events ALTER COLUMN change_xid DROP DEFAULT, ALTER COLUMN change_seq DROP DEFAULT;
+    ALTER TABLE selections ADD COLUMN change_xid BIGINT NOT NULL DEFAULT 0, ADD COLUMN change_seq BIGINT NOT NULL DEFAULT nextval('change_seq');
+    ALTER TABLE selections ALTER COLUMN change_xid DROP DEFAULT, ALTER COLUMN change_seq DROP DEFAULT;
+
+    CREATE INDEX ix_events_change_position ON events (change_xid, change_seq);
+    CREATE INDEX ix_selections_change_position ON selections (change_xid, change_seq);
+
+    CREATE OR REPLACE FUNCTION set_change_position() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.change_xid := pg_current_xact_id()::text::bigint;
+        NEW.change_seq := nextval('change_seq');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Also fires for the active flags and updated_at set by refresh_selection_active
+    CREATE TRIGGER set_change_position_events_trigger
+    BEFORE INSERT OR UPDATE ON events
+    FOR EACH ROW EXECUTE FUNCTION set_change_position();
+
+    CREATE TRIGGER set_change_position_selections_trigger
+    BEFORE INSERT OR UPDATE ON selections
+    FOR EACH ROW EXECUTE FUNCTION set_change_position();
+
+    -- created_at came from CURRENT_TIMESTAMP in the server's time zone, updated_at is UTC
+    ALTER TABLE sports ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+    ALTER TABLE events ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+    ALTER TABLE selections ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+    """)
+
+def downgrade() -> None:
+    op.execute("""
+    ALTER TABLE selections ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+    ALTER TABLE events ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+    ALTER TABLE sports ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+
+    DROP TRIGGER set_change_position_selections_trigger ON selections;
+    DROP TRIGGER set_change_position_events_trigger ON events;
+    DROP FUNCTION set_change_position;
+
+    DROP INDEX ix_selections_change_position;
+    DROP INDEX ix_events_change_position;
+
+    ALTER TABLE selections DROP COLUMN change_seq, DROP COLUMN change_xid;
+    ALTER TABLE events DROP COLUMN change_seq, DROP COLUMN change_xid;
+
+    DROP SEQUENCE change_seq;
+    """)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Name search latency of every match mode. Loads the synthetic dataset of benchmarks/query_plans.py
+into the database of the config (migrated to head), then times a page of GET /selections?regex=
+through the model for each match mode, and once more for regex with index scans switched off,
+which is how every search ran before the trigram and prefix indexes. Reports the median time and
+whether the plan read selections sequentially. Runs in a transaction that is rolled back.
+
+  python -m benchmarks.name_search [selections] [repeat]
+"""
+
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.query_plans import check, load
+from src.app import app, db  # models need the app loaded first, as in run.py
+from src.models.selections import Selection
+
+SEARCHES = (
+  ("regex", "regex", "selection 4321"),
+  ("contains", "contains", "selection 4321"),
+  ("prefix", "prefix", "plan selection 99"),
+  ("exact", "exact", "plan selection 12345"),
+)
+
+# the planner settings of a table without the search indexes
+NO_INDEXES = "SET LOCAL enable_indexscan = off; SET LOCAL enable_bitmapscan = off; SET LOCAL enable_indexonlyscan = off"
+
+def measure(connection, match, term, repeat):
+  call = lambda: Selection.get_selections(page=1, offset=20, regex=term, match=match, count="none")
+
+  result, plans = check(connection, call)
+  if result is None:
+    raise RuntimeError(f"{match} search for {term!r} failed")
+
+  timings = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    call()
+    timings.append(time.perf_counter() - started)
+
+  sequential = any(seq_scans for _, seq_scans in plans)
+  return statistics.median(timings) * 1000, "sequential scan" if sequential else "index", len(result["selections"])
+
+if __name__ == "__main__":
+  selections = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+  with app.app_context():
+    connection = db.session.connection()
+
+    try:
+      load(max(selections // 5, 1))
+      print(f"{selections} synthetic selections, median of {repeat}")
+
+      for name, match, term in SEARCHES:
+        latency, scan, rows = measure(connection, match, term, repeat)
+        print(f"{name:>22} {term!r:>24}: {latency:9.2f} ms, {scan}, {rows} rows")
+
+      db.session.execute(text(NO_INDEXES))
+      latency, scan, rows = measure(connection, "regex", SEARCHES[0][2], repeat)
+      print(f"{'regex without indexes':>22} {SEARCHES[0][2]!r:>24}: {latency:9.2f} ms, {scan}, {rows} rows")
+    finally:
+      db.session.rollback()
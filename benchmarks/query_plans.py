@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Query plan regression check. Loads a synthetic dataset into the database of the config (migrated
+to head), runs the list, search, cursor, nested, board, single entity and change feed reads of every endpoint
+through the models, EXPLAINs each statement they send and fails when one of them reads a table
+of the API with a sequential scan, or when the read itself failed. The trigger's active lookups
+are checked as well. Everything runs in one transaction that is rolled back, the database is left as it was.
+
+  python -m benchmarks.query_plans [events]
+
+Exits with status 1 when a plan regressed. tests/test_query_plans.py runs the same cases under
+pytest in CI. Unfiltered COUNT(*) reads the whole table by definition and is not checked.
+"""
+
+import os
+import re
+import sys
+
+# every read has to reach the primary's session, not the cache or a replica
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["REPLICA_URIS"] = ""
+
+from sqlalchemy import event, text
+
+from src.app import app, db  # models need the app loaded first, as in run.py
+from src.models.event_cards import EventCard
+from src.models.events import Event
+from src.models.selections import Selection
+from src.models.sports import Sport
+
+TABLES = ("sports", "events", "selections", "event_cards")
+# an unfiltered count or list watermark reads the whole table whichever plan serves it
+FULL_COUNT = re.compile(r"^SELECT COUNT\(\*\)(, SUM\(.+\))? FROM \w+\s*$")
+
+DATASET = (
+  """INSERT INTO sports (name, url_identifier, active, created_at)
+    SELECT 'plan sport ' || g, 'plan-sport-' || g, false, timezone('utc', now()) - g * interval '1 minute'
+    FROM generate_series(1, :sports) g""",
+  """INSERT INTO events (name, url_identifier, active, type, sport_id, status, scheduled_start, created_at)
+    SELECT 'plan event ' || g, 'plan-event-' || g, false, 'preplay', first.id + g % :sports, 'Pending',
+      timezone('utc', now()) + g * interval '1 minute', timezone('utc', now()) - g * interval '1 second'
+    FROM generate_series(1, :events) g, (SELECT min(id) AS id FROM sports WHERE url_identifier LIKE 'plan-sport-%') first""",
+  # like a book that has mostly settled, one selection in 200 is active, which leaves about 2.5% of
+  # the events and 5% of the sports active
+  """INSERT INTO selections (name, event_id, price, active, outcome, created_at)
+    SELECT 'plan selection ' || g, first.id + g % :events, 2.5, g % 200 = 0, 'Unsettled', timezone('utc', now()) - g * interval '1 second'
+    FROM generate_series(1, :selections) g, (SELECT min(id) AS id FROM events WHERE url_identifier LIKE 'plan-event-%') first""",
+  "ANALYZE sports, events, selections, event_cards",
+)
+
+def cases(sport_id, event_id, selection_id):
+  return (
+    ("GET /sports", lambda: Sport.get_sports(page=1, offset=20)),
+    ("GET /sports?active=true", lambda: Sport.get_sports(page=1, offset=20, active=True, sortby="created_at", orderby="DESC")),
+    ("GET /sports?regex=", lambda: Sport.get_sports(page=1, offset=20, regex="sport 123", match="contains")),
+    ("GET /sports/<id>", lambda: Sport.get_sports(sport_id)),
+    ("GET /events", lambda: Event.get_events(page=1, offset=20, count="none")),
+    ("GET /events?active=true", lambda: Event.get_events(page=1, offset=20, active=True)),
+    ("GET /events?active=true&cursor=", lambda: Event.get_events(offset=20, active=True, cursor={"v": "plan event 5000", "id": 0}, if_none_match=None)),
+    ("GET /events?regex=", lambda: Event.get_events(page=1, offset=20, regex="event 1234", match="contains")),
+    ("GET /events?regex=&match=prefix", lambda: Event.get_events(page=1, offset=20, regex="plan event 99", match="prefix")),
+    ("GET /events/<id>", lambda: Event.get_events(event_id)),
+    ("GET /events/<id>?expand=selections", lambda: Event.get_an_event_with_selections(event_id)),
+    ("GET /sports/<id>/events", lambda: Event.get_events(offset=20, cursor={}, sport_id=sport_id)),
+    ("GET /events/changes", lambda: Event.get_event_changes(None, 100, 0)),
+    ("GET /selections", lambda: Selection.get_selections(page=1, offset=20, sortby="created_at", count="estimate")),
+    ("GET /selections?active=true", lambda: Selection.get_selections(page=1, offset=20, active=True)),
+    ("GET /selections?regex=", lambda: Selection.get_selections(page=1, offset=20, regex="selection 4321", match="contains")),
+    ("GET /selections/<id>", lambda: Selection.get_selections(selection_id)),
+    ("GET /events/<id>/selections", lambda: Selection.get_selections(offset=20, cursor={}, event_id=event_id)),
+    ("GET /selections/changes", lambda: Selection.get_selection_changes(None, 100, 0)),
+    ("GET /board", lambda: EventCard.get_board(limit=100)),
+    ("GET /board?sport_id=", lambda: EventCard.get_board(sport_id, limit=100)),
+  )
+
+# what refresh_selection_derived runs for every event and sport a write touches, and the sport rename patch of the cards
+TRIGGER_LOOKUPS = (
+  ("trigger: active selection of an event", "SELECT 1 FROM selections WHERE event_id = %(id)s AND active", "event_id"),
+  ("trigger: active event of a sport", "SELECT 1 FROM events WHERE sport_id = %(id)s AND active", "sport_id"),
+  ("trigger: cards of a sport", "SELECT 1 FROM event_cards WHERE sport_id = %(id)s", "sport_id"),
+)
+
+def scans(plan):
+  """
+  Yield (node type, relation) for every node of an EXPLAIN (FORMAT JSON) plan
+  """
+  yield plan["Node Type"], plan.get("Relation Name")
+  for child in plan.get("Plans", ()):
+    yield from scans(child)
+
+def explain(connection, statement, parameters):
+  plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+  return [relation for node, relation in scans(plan[0]["Plan"]) if node == "Seq Scan" and relation in TABLES]
+
+def load(events):
+  """
+  Insert the synthetic dataset in the session's transaction, roll it back when done
+
+  :param  events: [integer] events to insert, with half as many sports and five selections each
+
+  :return [tuple] ids of a sport, event and selection to read, an event with selections and a sport with events
+  """
+  for sql in DATASET:
+    db.session.execute(text(sql), {"sports": max(events // 2, 1), "events": events, "selections": events * 5})
+
+  return tuple(db.session.execute(text("""SELECT (SELECT max(id) FROM sports), (SELECT max(id) FROM events), (SELECT max(id) FROM selections),
+    (SELECT max(event_id) FROM selections), (SELECT max(sport_id) FROM events)""")).fetchone())
+
+def check(connection, call):
+  """
+  Run a case and EXPLAIN the SELECTs it sent
+
+  :param  connection: [object] connection of the session the dataset was loaded in
+  :param  call: [function] the case's model read
+
+  :return [tuple] what the read returned, None when it failed, and (statement, tables read with a sequential scan) per statement
+  """
+  statements = []
+  capture = lambda conn, cursor, statement, parameters, context, executemany: statements.append((statement, parameters))
+
+  event.listen(db.engine, "before_cursor_execute", capture)
+  try:
+    result = call()
+  finally:
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+  checked = [(statement, parameters) for statement, parameters in statements
+    if statement.lstrip().upper().startswith("SELECT") and not FULL_COUNT.match(statement.strip())]
+
+  return result, [(statement, explain(connection, statement, parameters)) for statement, parameters in checked]
+
+def run(events):
+  failures = 0
+  with app.app_context():
+    connection = db.session.connection()
+    ids = load(events)
+
+    try:
+      for name, call in cases(*ids[:3]):
+        result, plans = check(connection, call)
+
+        if result is None or not plans:
+          print(f"{name:>40}: {'read failed' if result is None else 'no statement ran'}")
+          failures += 1
+          continue
+
+        for statement, seq_scans in plans:
+          failures += bool(seq_scans)
+          print(f"{name:>40}: {'SEQ SCAN on ' + ', '.join(seq_scans) if seq_scans else 'ok'}")
+          if seq_scans:
+            print(" " * 42 + " ".join(statement.split()))
+
+      for name, statement, column in TRIGGER_LOOKUPS:
+        seq_scans = explain(connection, statement, {"id": ids[3] if column == "event_id" else ids[4]})
+        failures += bool(seq_scans)
+        print(f"{name:>40}: {'SEQ SCAN on ' + ', '.join(seq_scans) if seq_scans else 'ok'}")
+    finally:
+      db.session.rollback()
+
+  return failures
+
+if __name__ == "__main__":
+  events = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+  print(f"{events} synthetic events, {events * 5} selections")
+  failures = run(events)
+
+  print(f"{failures} failed read(s) or plan(s) with a sequential scan" if failures else "all reads succeeded and all plans use an index")
+  sys.exit(1 if failures else 0)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of list page serialization: the per-row zip/dict building the get_* methods
+used to do against rowSerializer. Needs no database, rows are built in memory.
+
+  python -m benchmarks.serialize_rows [rows] [repeat]
+"""
+
+import sys
+import timeit
+import ujson
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from src.app import app  # models need the app loaded first, as in run.py
+from src.helpers import datetime_to_str
+from src.libs.serializer import rowSerializer
+from src.models.selections import Selection
+
+def legacy(selections):
+  selections_dict = []
+  for selection in selections:
+    created_at = datetime_to_str(selection[6], True) if selection[6] else None
+    updated_at = datetime_to_str(selection[7], True) if selection[7] else None
+
+    selection_dict = dict(zip(("id", "name", "event_id", "price", "active", "outcome", "created_at", "updated_at"),
+      (selection[0], selection[1], selection[2], selection[3], selection[4], selection[5], created_at, updated_at)))
+
+    selection_dict = {k: v for k, v in selection_dict.items() if v is not None}
+
+    selections_dict.append(selection_dict)
+
+  return ujson.dumps({"selections": selections_dict})
+
+def compact(selections):
+  return ujson.dumps({"selections": rowSerializer.of(Selection.__table__).many(selections)})
+
+if __name__ == "__main__":
+  size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  start = datetime(2026, 1, 1)
+  rows = [
+    (i, f"Selection {i}", str(i // 3), Decimal("2.50"), i % 2 == 0, "Unsettled", start + timedelta(seconds=i), start + timedelta(days=1) if i % 4 else None)
+    for i in range(size)
+  ]
+
+  assert ujson.loads(legacy(rows)) == ujson.loads(compact(rows))
+
+  for name, serialize in (("legacy", legacy), ("rowSerializer", compact)):
+    best = min(timeit.repeat(lambda: serialize(rows), number=repeat, repeat=5)) / repeat
+    print(f"{name:>14}: {best * 1000:.2f} ms per {size} row page")
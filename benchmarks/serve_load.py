@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Load test of the dev server (app.run) against the production server (gunicorn with gunicorn.conf.py).
+Starts each server on a free local port, drives it with keep-alive clients for a fixed time and
+reports throughput and latency percentiles. The default path needs no database, point it at a
+list endpoint (e.g. /v1/sports) to include the database round trips.
+
+  python -m benchmarks.serve_load [path] [clients] [seconds]
+
+SERVER_WORKERS, SERVER_THREADS etc. apply to the gunicorn run as they do in production.
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+SERVERS = {
+  "dev": [sys.executable, "-c", "import sys; from src.app import app; app.run(host='127.0.0.1', port=int(sys.argv[1]))"],
+  "gunicorn": [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}", "--access-logfile", "/dev/null", "src.app:app"],
+}
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def start(name, port):
+  command = [part.format(port=port) for part in SERVERS[name]]
+  if name == "dev":
+    command.append(str(port))
+
+  server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+  deadline = time.monotonic() + 30
+  while time.monotonic() < deadline:
+    try:
+      requests.get(f"http://127.0.0.1:{port}/v1", timeout=1)
+      return server
+    except requests.RequestException:
+      time.sleep(0.2)
+
+  server.kill()
+  raise RuntimeError(f"{name} server did not come up on port {port}")
+
+def client(url, stop_at, latencies, errors):
+  session = requests.Session()
+
+  while time.monotonic() < stop_at:
+    started = time.perf_counter()
+    try:
+      if session.get(url, timeout=10).status_code >= 500:
+        errors.append(1)
+    except requests.RequestException:
+      errors.append(1)
+    latencies.append(time.perf_counter() - started)
+
+def run(name, path, clients, seconds):
+  port = free_port()
+  server = start(name, port)
+
+  try:
+    latencies, errors = [], []
+    stop_at = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(f"http://127.0.0.1:{port}{path}", stop_at, latencies, errors)) for _ in range(clients)]
+
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+  finally:
+    server.terminate()
+    server.wait()
+
+  latencies.sort()
+  percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+  print(f"{name:>9}: {len(latencies) / seconds:8.1f} req/s, p50 {percentile(0.5):.1f} ms, p99 {percentile(0.99):.1f} ms, "
+    f"mean {statistics.mean(latencies) * 1000:.1f} ms, errors {len(errors)}")
+
+if __name__ == "__main__":
+  path = sys.argv[1] if len(sys.argv) > 1 else "/v1"
+  clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+  seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+  os.environ.setdefault("APP_ENVIRONMENT", "test")
+  print(f"{clients} keep-alive clients for {seconds:g}s against {path}")
+
+  for name in SERVERS:
+    run(name, path, clients, seconds)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Load test of the live update hub alone, with the in-process backend standing in for Postgres NOTIFY
+(benchmarks/stream_hold.py load tests the streams over HTTP).
+Subscribes many idle clients spread over many events plus a few consumer threads on one hot
+event, then publishes price updates to the hot event and reports fan-out cost and delivery latency.
+
+  python -m benchmarks.stream_fanout [idle subscribers] [hot subscribers] [messages]
+"""
+
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy.orm import Session
+
+from src.app import app  # models need the app loaded first, as in run.py
+from src.libs.pubsub import eventHub
+
+def consume(subscription, count, latencies):
+  for _ in range(count):
+    message = subscription.get()
+    latencies.append(time.perf_counter() - message["sent_at"])
+
+if __name__ == "__main__":
+  idle = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  hot = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+  messages = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  idle_subscriptions = [(f"event:{i % 2000}", eventHub.subscribe(f"event:{i % 2000}")) for i in range(idle)]
+  per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / idle
+  tracemalloc.stop()
+
+  latencies = []
+  consumers = []
+  for _ in range(hot):
+    subscription = eventHub.subscribe("event:hot")
+    consumer = threading.Thread(target=consume, args=(subscription, messages, latencies), daemon=True)
+    consumer.start()
+    consumers.append(consumer)
+
+  publish_times = []
+  for i in range(messages):
+    start = time.perf_counter()
+    # a write's session without a database, its commit delivers the message
+    session = Session()
+    eventHub.publish("event:hot", {"type": "selection", "id": 1, "price": 1.5 + i / 100, "sent_at": start}, session)
+    session.commit()
+    publish_times.append(time.perf_counter() - start)
+    time.sleep(0.01)
+
+  for consumer in consumers:
+    consumer.join()
+
+  latencies.sort()
+  print(f"idle subscribers: {idle} over 2000 events, {per_subscriber:.0f} bytes each")
+  print(f"hot subscribers: {hot}, messages: {messages}, delivered: {len(latencies)}")
+  print(f"publish (fan-out to {hot}): median {statistics.median(publish_times) * 1000:.3f} ms, max {max(publish_times) * 1000:.3f} ms")
+  print(f"delivery latency: p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms")
+  print(eventHub.stats())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Load test of live update streams over HTTP against the server of production (gunicorn with
+gunicorn.conf.py and its stream server on STREAM_BIND). Follows the REST API's redirect to the
+stream server, opens many streams of the event of a selection and holds them, then PATCHes the
+selection's price through the REST API while keep-alive clients drive a REST path. Reports how many
+streams opened, the worker memory they take, how long each price change took to reach every stream
+and the REST latency while they are held. Needs the database of the config with the selection in it.
+
+  python -m benchmarks.stream_hold [selection id] [streams] [updates] [path] [clients] [seconds]
+
+SERVER_WORKERS, SERVER_THREADS and STREAM_MAX_PER_WORKER apply as they do in production, raise the
+open files limit (ulimit -n) above the number of streams first.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import ujson
+
+from urllib.parse import urlsplit
+
+import requests
+
+from benchmarks.serve_load import client, free_port, start
+
+def worker_memory(master):
+  """
+  Resident memory of the gunicorn workers in kB, from /proc (Linux)
+  """
+  try:
+    with open(f"/proc/{master}/task/{master}/children") as children:
+      pids = children.read().split()
+
+    total = 0
+    for pid in pids:
+      with open(f"/proc/{pid}/status") as status:
+        total += next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+    return total
+  except OSError:
+    return None
+
+async def open_stream(host, port, path):
+  try:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 30)
+  except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+    return type(e).__name__, None
+
+  status = int(head.split(b" ", 2)[1])
+  if status != 200:
+    writer.close()
+    return status, None
+
+  return status, (reader, writer)
+
+async def watch(reader, sent, latencies):
+  """
+  Read a stream until it ends, timing every price change announced in sent
+  """
+  try:
+    async for line in reader:
+      if line.startswith(b"data: "):
+        message = ujson.loads(line[6:])
+        if message.get("type") == "selection" and message.get("price") in sent:
+          latencies.append(time.perf_counter() - sent[message["price"]])
+  except (OSError, ValueError):
+    pass
+
+async def run(base, selection_id, event_id, count, updates, rest_url, clients, seconds, master):
+  loop = asyncio.get_running_loop()
+
+  location = requests.get(f"{base}/v1/stream/events/{event_id}", allow_redirects=False, timeout=10).headers["Location"]
+  stream = urlsplit(location)
+  path = stream.path + (f"?{stream.query}" if stream.query else "")
+
+  memory_before = worker_memory(master)
+  started = time.perf_counter()
+
+  # at most 500 connects in flight, as many clients reconnecting at once would
+  gate = asyncio.Semaphore(500)
+  async def gated():
+    async with gate:
+      return await open_stream(stream.hostname, stream.port, path)
+
+  opened = await asyncio.gather(*[gated() for _ in range(count)])
+  open_time = time.perf_counter() - started
+  await asyncio.sleep(1)
+  memory_after = worker_memory(master)
+
+  statuses = {}
+  for status, _ in opened:
+    statuses[status] = statuses.get(status, 0) + 1
+  streams = [connection for _, connection in opened if connection]
+
+  sent, latencies = {}, []
+  watchers = [loop.create_task(watch(reader, sent, latencies)) for reader, _ in streams]
+
+  rest_latencies, errors = [], []
+  stop_at = time.monotonic() + seconds
+  threads = [threading.Thread(target=client, args=(rest_url, stop_at, rest_latencies, errors)) for _ in range(clients)]
+  for thread in threads:
+    thread.start()
+
+  session = requests.Session()
+  patch_latencies = []
+  for i in range(updates):
+    price = round(1.01 + i / 100 + (time.time() % 1000), 2)
+    sent[price] = time.perf_counter()
+    response = await loop.run_in_executor(None, lambda: session.patch(f"{base}/v1/selections/{selection_id}", json={"price": price}, timeout=10))
+    patch_latencies.append(time.perf_counter() - sent[price])
+    if response.status_code != 200:
+      errors.append(response.status_code)
+    await asyncio.sleep(max(seconds / max(updates, 1), 0.05))
+
+  # the last change gets a moment to arrive everywhere
+  await asyncio.sleep(2)
+  for thread in threads:
+    await loop.run_in_executor(None, thread.join)
+
+  for reader, writer in streams:
+    writer.close()
+  await asyncio.gather(*watchers)
+
+  return statuses, open_time, memory_before, memory_after, latencies, patch_latencies, rest_latencies, errors
+
+if __name__ == "__main__":
+  selection_id = sys.argv[1] if len(sys.argv) > 1 else "1"
+  count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+  updates = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+  path = sys.argv[4] if len(sys.argv) > 4 else "/v1"
+  clients = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+  seconds = float(sys.argv[6]) if len(sys.argv) > 6 else 10
+
+  os.environ.setdefault("APP_ENVIRONMENT", "test")
+  port, stream_port = free_port(), free_port()
+  os.environ["STREAM_BIND"] = f"127.0.0.1:{stream_port}"
+  server = start("gunicorn", port)
+  base = f"http://127.0.0.1:{port}"
+
+  try:
+    selection = requests.get(f"{base}/v1/selections/{selection_id}", timeout=10).json()
+    event_id = selection["event_id"]
+
+    statuses, open_time, memory_before, memory_after, latencies, patch_latencies, rest_latencies, errors = asyncio.run(
+      run(base, selection_id, event_id, count, updates, base + path, clients, seconds, server.pid))
+  finally:
+    server.terminate()
+    server.wait()
+
+  percentile = lambda values, p: sorted(values)[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+  held = statuses.get(200, 0)
+
+  print(f"{count} streams of event {event_id} in {open_time:.2f} s: {', '.join(f'{status}: {opened}' for status, opened in statuses.items())}")
+  if memory_before is not None and held:
+    print(f"worker memory: {memory_before / 1024:.1f} MB before, {memory_after / 1024:.1f} MB held, {(memory_after - memory_before) * 1024 / held:.0f} bytes a stream")
+  print(f"{updates} price changes, PATCH p50 {percentile(patch_latencies, 0.5):.1f} ms, delivered {len(latencies)} of {updates * held}, "
+    f"latency to a stream p50 {percentile(latencies, 0.5):.1f} ms, p99 {percentile(latencies, 0.99):.1f} ms")
+  print(f"{path} with {clients} clients while they are open: {len(rest_latencies) / seconds:.1f} req/s, "
+    f"p50 {percentile(rest_latencies, 0.5):.1f} ms, p99 {percentile(rest_latencies, 0.99):.1f} ms, errors {len(errors)}")
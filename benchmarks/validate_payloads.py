@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of request payload validation: validationManager.validate interpreting a model's
+_validations_ on every call against the schema compiled once per model. Needs no database.
+
+  python -m benchmarks.validate_payloads [repeat]
+"""
+
+import sys
+import timeit
+
+from src.app import app  # models need the app loaded first, as in run.py
+from src.libs.validation_manager import validationManager
+from src.models.events import Event
+from src.models.selections import Selection
+from src.models.sports import Sport
+
+PAYLOADS = (
+  ("sport create", Sport, {"name": " Football ", "url_identifier": "football"}, Sport._restrict_in_creation_),
+  ("event create", Event, {"name": "Home v Away", "url_identifier": "home-v-away", "sport_id": "1", "type": "preplay", "status": "Pending", "scheduled_start": "2026-10-21 19:45:00"}, Event._restrict_in_creation_),
+  ("event update", Event, {"status": "Started", "scheduled_start": "2026-02-30 19:45:00"}, Event._restrict_in_update_),
+  ("selection create", Selection, {"name": "Home", "event_id": "1", "price": 2.5, "active": True, "outcome": "Unsettled"}, Selection._restrict_in_creation_),
+  ("selection update", Selection, {"price": 1.75, "outcome": "Win"}, Selection._restrict_in_update_),
+)
+
+# formats only the date, datetime and time validations look at, valid and invalid
+FORMATS = {
+  "date": ("2026-10-21", "2024-02-29", "2023-02-29", "2026-1-05", "0999-01-01", "2026-10-21 ", "21/10/2026"),
+  "datetime": ("2026-10-21 19:45:00", "2026-10-21 24:00:00", "2026-10-21 19:45:60", "2026-10-21T19:45:00", "2026-10-21 9:45:00"),
+  "time": ("19:45:00", "23:59:61", "24:00:00", "9:45:00", "1900-01-01T19:45:00"),
+}
+
+def check():
+  for _, model, payload, skip in PAYLOADS:
+    for join_msg in (True, False):
+      assert validationManager.validate(payload, model._validations_, skip, True, join_msg) == model._validator_.validate(payload, skip, True, join_msg)
+
+  for kind, values in FORMATS.items():
+    assertions = {"value": {"type": kind, "required": True}}
+    for value in values:
+      assert validationManager.validate({"value": value}, assertions) == validationManager.compile(assertions).validate({"value": value}), (kind, value)
+
+if __name__ == "__main__":
+  repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+  check()
+
+  for name, model, payload, skip in PAYLOADS:
+    interpreted = min(timeit.repeat(lambda: validationManager.validate(payload, model._validations_, skip, True), number=repeat, repeat=5)) / repeat
+    compiled = min(timeit.repeat(lambda: model._validator_.validate(payload, skip, True), number=repeat, repeat=5)) / repeat
+    print(f"{name:>16}: {interpreted * 1e6:.2f} us interpreted, {compiled * 1e6:.2f} us compiled ({interpreted / compiled:.1f}x)")
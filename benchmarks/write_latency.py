@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Selection write latency as the tables grow. For each size loads the synthetic dataset of
+benchmarks/query_plans.py into the database of the config (migrated to head), then times single
+row UPDATEs of random selections: a price change, which the active refresh trigger skips, and an
+active flip, which rechecks the selection's event and sport. With the incremental triggers both
+stay flat however many rows the tables hold. Every size runs in a transaction that is rolled back.
+
+  python -m benchmarks.write_latency [selections,...] [updates]
+"""
+
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.query_plans import load
+from src.app import app, db  # models need the app loaded first, as in run.py
+
+WRITES = (
+  ("price", "UPDATE selections SET price = price + 0.01, updated_at = timezone('utc', now()) WHERE id = :id"),
+  ("active flip", "UPDATE selections SET active = NOT active, updated_at = timezone('utc', now()) WHERE id = :id"),
+)
+
+def median_ms(statement, ids):
+  timings = []
+  for selection_id in ids:
+    started = time.perf_counter()
+    db.session.execute(statement, {"id": selection_id})
+    timings.append(time.perf_counter() - started)
+
+  return statistics.median(timings) * 1000
+
+def run(selections, updates):
+  with app.app_context():
+    try:
+      load(max(selections // 5, 1))
+      ids = [row[0] for row in db.session.execute(text(
+        "SELECT id FROM selections WHERE name LIKE 'plan selection %' ORDER BY random() LIMIT :updates"), {"updates": updates})]
+
+      return [median_ms(text(sql), ids) for _, sql in WRITES]
+    finally:
+      db.session.rollback()
+
+if __name__ == "__main__":
+  sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [5000, 100000, 500000]
+  updates = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  print(f"median of {updates} single row UPDATEs")
+  print(f"{'selections':>12}" + "".join(f"{name:>14}" for name, _ in WRITES))
+
+  for selections in sizes:
+    print(f"{selections:>12}" + "".join(f"{latency:>11.2f} ms" for latency in run(selections, updates)))
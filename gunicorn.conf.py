@@ -0,0 +1,43 @@
+"""
+gunicorn settings of the production server, read from src/config/config.py so they follow the
+same environment variables as the app. Used by ./run.py outside dev, or directly with
+
+  gunicorn src.app:app
+
+More than one worker needs the redis (or no) cache and the postgres pub/sub backend, with the
+per process memory backends a worker would serve entities other workers changed and miss their
+live updates, so the server refuses to start (see README).
+
+Send the master SIGHUP to reload gracefully: new workers are started with fresh code and the old
+ones finish their in-flight requests (up to SERVER_GRACEFUL_TIMEOUT) before exiting.
+"""
+
+from src.config.config import *
+
+if SERVER_WORKERS > 1 and "memory" in (CACHE_BACKEND, PUBSUB_BACKEND):
+  raise RuntimeError(f"SERVER_WORKERS={SERVER_WORKERS} needs CACHE_BACKEND=redis or none and PUBSUB_BACKEND=postgres, "
+    f"got CACHE_BACKEND={CACHE_BACKEND} and PUBSUB_BACKEND={PUBSUB_BACKEND}")
+
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+
+# threaded workers, so a long-poll doesn't hold a whole process
+worker_class = "gthread"
+threads = SERVER_THREADS
+
+keepalive = SERVER_KEEPALIVE
+timeout = SERVER_TIMEOUT
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+
+# recycle workers after this many requests, jittered so they don't all restart at once, 0 disables
+max_requests = SERVER_MAX_REQUESTS
+max_requests_jitter = SERVER_MAX_REQUESTS // 10
+
+pidfile = SERVER_PIDFILE
+accesslog = "-"
+errorlog = "-"
+
+def post_worker_init(worker):
+  # live update streams are served by each worker's own event loop on STREAM_BIND, not its threads
+  from src.controllers.stream import start_stream_server
+  start_stream_server()
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+import os
+import sys
+
 from src.app import app
 from alembic.config import Config
 from alembic import command
@@ -12,6 +15,13 @@ if __name__ == "__main__":
     command.upgrade(alembic_cfg, "head")
 
   if app.config['APP_ENVIRONMENT'] == "dev":
+    # the reloader serves the app from a child process, the live update streams are served there too
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+      from src.controllers.stream import start_stream_server
+      start_stream_server()
+
     app.run(host='127.0.0.1', port=5000, debug=True)
   else:
-    app.run()
\ No newline at end of file
+    # hand the process over to gunicorn (see gunicorn.conf.py), its workers load the app themselves
+    # so a SIGHUP reload picks up new code
+    os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "src.app:app"])
\ No newline at end of file
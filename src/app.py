@@ -1,6 +1,10 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from src.helpers import *
+from src.libs.pool import poolMonitor
+from src.libs.replicas import replicaRouter
+from src.libs.metrics import requestMetrics
+from src.libs.profiling import requestProfiler
 import logging
 from flask_swagger_ui import get_swaggerui_blueprint
 
@@ -38,8 +42,23 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 
 app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
+# connection pool sized and timed from config, see src/libs/pool.py
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = poolMonitor.engine_options()
+
 db = SQLAlchemy(app)
 
+with app.app_context():
+  poolMonitor.attach(db.engine)
+
+# reads of the get_* methods go to REPLICA_URIS when set, a client's reads right after its writes don't
+replicaRouter.init_app(app)
+
+# route latency, query, serialization and pool wait timings served at /metrics, see src/libs/metrics.py
+requestMetrics.init_app(app)
+
+# opt-in stack sampling of one request in PROFILE_SAMPLE_RATE, see src/libs/profiling.py
+requestProfiler.init_app(app)
+
 # wires up controller routes
 import src.controllers
 
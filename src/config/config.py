@@ -18,9 +18,127 @@ DB_URI = "postgresql://{}:{}@{}:{}/{}".format(RDS_USERNAME, RDS_PASSWORD, RDS_HO
 SQLALCHEMY_POOL_RECYCLE = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", 3600))
 SQLALCHEMY_DATABASE_URI = DB_URI
 
+# Connection pool per process (see src/libs/pool.py): SIZE kept open, up to MAX_OVERFLOW more under a
+# burst, a checkout waits at most POOL_TIMEOUT seconds. Statements are cancelled after
+# STATEMENT_TIMEOUT milliseconds, 0 disables.
+SQLALCHEMY_POOL_SIZE         = int(os.getenv("SQLALCHEMY_POOL_SIZE", 10))
+SQLALCHEMY_MAX_OVERFLOW      = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 20))
+SQLALCHEMY_POOL_TIMEOUT      = float(os.getenv("SQLALCHEMY_POOL_TIMEOUT", 5))
+SQLALCHEMY_POOL_PRE_PING     = os.getenv("SQLALCHEMY_POOL_PRE_PING", "true").lower() == "true"
+SQLALCHEMY_STATEMENT_TIMEOUT = int(os.getenv("SQLALCHEMY_STATEMENT_TIMEOUT", 30000))
+
+# Set when RDS_HOSTNAME/RDS_PORT point at PgBouncer in transaction pooling mode: no prepared statements
+# and no session settings. LISTEN needs a session, so keep PUBSUB_BACKEND=memory or point PUBSUB_DB_URI at Postgres directly.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# SQL statement registry: text() constructs kept per distinct SQL string
+SQL_STATEMENT_CACHE_SIZE = int(os.getenv("SQL_STATEMENT_CACHE_SIZE", 512))
+
+# Server-side prepared statements (opt-in, runs on the psycopg 3 driver of requirements.txt): a statement run this many
+# times on a connection is prepared there and later runs skip parse and plan. Empty disables.
+SQL_PREPARE_THRESHOLD = os.getenv("SQL_PREPARE_THRESHOLD") or None
+
+# Read replicas (see src/libs/replicas.py), comma separated URIs, empty sends every read to the primary.
+# A client's reads stay on the primary for REPLICA_STICKY_SECONDS after it wrote, so it reads its writes.
+# A replica lagging more than REPLICA_MAX_LAG seconds is skipped, 0 disables the lag check. Replicas are
+# probed every REPLICA_CHECK_INTERVAL seconds in the background, connects give up after REPLICA_CONNECT_TIMEOUT.
+REPLICA_URIS            = [uri.strip() for uri in os.getenv("REPLICA_URIS", "").split(",") if uri.strip()]
+REPLICA_CHECK_INTERVAL  = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", 2))
+REPLICA_MAX_LAG         = float(os.getenv("REPLICA_MAX_LAG", 0))
+REPLICA_STICKY_SECONDS  = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+REPLICA_STICKY_COOKIE   = os.getenv("REPLICA_STICKY_COOKIE", "sports_book_read_primary")
+
+if SQL_PREPARE_THRESHOLD is not None:
+    SQLALCHEMY_DATABASE_URI = DB_URI.replace("postgresql://", "postgresql+psycopg://", 1)
+    REPLICA_URIS = [uri.replace("postgresql://", "postgresql+psycopg://", 1) for uri in REPLICA_URIS]
+
 EX_API_KEY = os.getenv("External_API_KEY") or ""
 EX_API = os.getenv("EX_API") or ""
 
+# External API client
+EX_API_CONNECT_TIMEOUT = float(os.getenv("EX_API_CONNECT_TIMEOUT", 3.05))
+EX_API_READ_TIMEOUT    = float(os.getenv("EX_API_READ_TIMEOUT", 10))
+EX_API_RETRIES         = int(os.getenv("EX_API_RETRIES", 3))
+EX_API_BACKOFF         = float(os.getenv("EX_API_BACKOFF", 0.5))
+EX_API_MAX_WORKERS     = int(os.getenv("EX_API_MAX_WORKERS", 8))
+EX_API_POOL_SIZE       = int(os.getenv("EX_API_POOL_SIZE", EX_API_MAX_WORKERS))
+
+# Background ingest jobs
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+JOBS_RETENTION = int(os.getenv("JOBS_RETENTION", 1000))
+
+# Single entity response cache: memory (per process LRU), redis or none
+CACHE_BACKEND       = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL           = int(os.getenv("CACHE_TTL", 30))
+CACHE_MAX_ENTRIES   = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+CACHE_REDIS_URL     = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", 0.1))
+CACHE_KEY_PREFIX    = os.getenv("CACHE_KEY_PREFIX", "sports_book:")
+
+# Streaming exports
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Batch selection updates
+SELECTIONS_BATCH_MAX = int(os.getenv("SELECTIONS_BATCH_MAX", 1000))
+
+# Change feeds
+CHANGES_MAX_WAIT      = int(os.getenv("CHANGES_MAX_WAIT", 30))
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", 0.5))
+CHANGES_MAX_PAGE      = int(os.getenv("CHANGES_MAX_PAGE", 1000))
+
+# Market board (event cards, see src/models/event_cards.py)
+BOARD_PAGE_SIZE = int(os.getenv("BOARD_PAGE_SIZE", 100))
+BOARD_MAX_PAGE  = int(os.getenv("BOARD_MAX_PAGE", 500))
+
+# Live update streams: memory (per process hub) or postgres (LISTEN/NOTIFY across processes)
+PUBSUB_BACKEND         = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_CHANNEL         = os.getenv("PUBSUB_CHANNEL", "sports_book_updates")
+PUBSUB_RECONNECT_DELAY = float(os.getenv("PUBSUB_RECONNECT_DELAY", 1))
+PUBSUB_DB_URI          = os.getenv("PUBSUB_DB_URI") or DB_URI
+STREAM_HEARTBEAT       = float(os.getenv("STREAM_HEARTBEAT", 15))
+STREAM_QUEUE_SIZE      = int(os.getenv("STREAM_QUEUE_SIZE", 100))
+
+# The streams are served by an asyncio server on STREAM_BIND in every process next to the REST API (see
+# src/libs/stream_server.py), /v1/stream/events/<id> of the REST API redirects there, to STREAM_URL when
+# set (e.g. the public address of a proxy in front of STREAM_BIND). An open stream costs a socket and a
+# coroutine, no server thread. A process serves at most STREAM_MAX_PER_WORKER streams, clients over it
+# get a 503, keep the open files limit (ulimit -n) above it.
+STREAM_BIND           = os.getenv("STREAM_BIND", "0.0.0.0:5001")
+STREAM_URL            = os.getenv("STREAM_URL", "").rstrip("/")
+STREAM_MAX_PER_WORKER = int(os.getenv("STREAM_MAX_PER_WORKER", 10000))
+
+# Production server (gunicorn, see gunicorn.conf.py): worker processes default to 2 x cores + 1, or to
+# 1 while the cache or pub/sub backend is per process memory, each serving SERVER_THREADS requests at
+# once, a long-poll holds a thread while it waits.
+SERVER_BIND             = os.getenv("SERVER_BIND", "0.0.0.0:5000")
+SERVER_WORKERS          = int(os.getenv("SERVER_WORKERS", 0)) or (1 if "memory" in (CACHE_BACKEND, PUBSUB_BACKEND) else (os.cpu_count() or 1) * 2 + 1)
+SERVER_THREADS          = int(os.getenv("SERVER_THREADS", 8))
+SERVER_KEEPALIVE        = int(os.getenv("SERVER_KEEPALIVE", 5))
+SERVER_TIMEOUT          = int(os.getenv("SERVER_TIMEOUT", 60))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+SERVER_MAX_REQUESTS     = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+SERVER_PIDFILE          = os.getenv("SERVER_PIDFILE") or None
+
+# Request metrics (see src/libs/metrics.py) served in the Prometheus format at /metrics, per process and
+# labelled with its pid, so scrape servers running a single worker.
+# Histogram bucket bounds are in seconds. METRICS_SERVER_TIMING adds a Server-Timing header to every response.
+METRICS_ENABLED       = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_BUCKETS       = tuple(float(bound) for bound in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(","))
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+
+# Diagnostics, both off by default. Statements taking SLOW_QUERY_MS or longer are logged with their parameters,
+# with SLOW_QUERY_EXPLAIN a SELECT also with an EXPLAIN ANALYZE, run again in the background at most once per
+# SLOW_QUERY_EXPLAIN_INTERVAL seconds each. One request in PROFILE_SAMPLE_RATE is stack sampled every
+# PROFILE_INTERVAL seconds into PROFILE_DIR as collapsed stacks, keeping the newest PROFILE_MAX_FILES.
+SLOW_QUERY_MS               = float(os.getenv("SLOW_QUERY_MS", 0))
+SLOW_QUERY_EXPLAIN          = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 60))
+PROFILE_SAMPLE_RATE         = int(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL            = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR                 = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES           = int(os.getenv("PROFILE_MAX_FILES", 200))
+
 # API URI Prefix
 BASE_PATH = "/v1"
 API_URI   = os.getenv("API_URI", "http://0.0.0.0:5000")
\ No newline at end of file
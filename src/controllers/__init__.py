@@ -1,4 +1,10 @@
 from src.controllers.sports import *
 from src.controllers.selections import *
 from src.controllers.events import *
-from src.controllers.nodes import *
\ No newline at end of file
+from src.controllers.nodes import *
+from src.controllers.jobs import *
+from src.controllers.cache import *
+from src.controllers.stream import *
+from src.controllers.pool import *
+from src.controllers.board import *
+from src.controllers.metrics import *
\ No newline at end of file
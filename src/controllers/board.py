@@ -0,0 +1,47 @@
+from flask import request
+from src.models.event_cards import EventCard
+from src.helpers import *
+from src.app import app
+from src.libs.metrics import requestMetrics
+import time
+import ujson
+
+@app.route(BASE_PATH + "/board", methods=["GET"])
+def get_board():
+    """
+    Get a page of the market board, events with their sport and selections in scheduled start order
+    """
+    app.logger.info('Get board request received')
+
+    active = True
+    if request.args.get("active") is not None:
+        active = True if request.args.get("active").lower() == 'true' else False
+
+    cursor = decode_watermark(request.args.get("cursor", ""))
+    if cursor is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be empty for the first page or a next_cursor value from a previous response"}, "TAG_ERROR", 400)
+
+    try:
+        limit = int(request.args.get("page_offset", BOARD_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+
+    if not 1 <= limit <= BOARD_MAX_PAGE:
+        app.logger.warning('Invalid page_offset value')
+        return errorit({"page_offset":f"should be between 1 and {BOARD_MAX_PAGE}"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Sport ID: {request.args.get("sport_id")}, Active: {active}, Cursor: {cursor}, Page offset: {limit}')
+
+    board = EventCard.get_board(request.args.get("sport_id"), active, cursor, limit)
+
+    if board is None:
+        return errorit("Failed to retrieve the board", "BOARD_RETRIEVAL_FAILED", 500)
+
+    # the cards are stored as JSON, splice them in instead of decoding and encoding them again
+    started = time.perf_counter()
+    body = '{"events":[' + ",".join(board["cards"]) + '],"meta_data":' + ujson.dumps(board["meta_data"]) + '}'
+    requestMetrics.observe_serialization(time.perf_counter() - started)
+
+    app.logger.info(f'{len(board["cards"])} board cards found')
+    return responsify_raw(body, etag=True)
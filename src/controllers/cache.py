@@ -0,0 +1,12 @@
+from src.helpers import *
+from src.app import app
+from src.libs.cache import entityCache
+
+@app.route(BASE_PATH + "/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    Get the single entity cache's and the SQL statement registry's hit/miss counters for this process
+    """
+    app.logger.info('Cache stats request received')
+
+    return responsify({**entityCache.stats(), "statements": sql_statement_stats()}, {})
@@ -1,7 +1,10 @@
 from flask import request
 from src.models.events import Event
+from src.libs.serializer import rowSerializer
 from src.helpers import *
 from src.app import app
+from src.libs.external_api import externalApi
+from src.libs.jobs import jobQueue
 import requests
 from src.models.sports import Sport
 from datetime import datetime
@@ -35,14 +38,22 @@ def get_an_event(event_id):
     """
     app.logger.info(f'Event information request received for Event ID: {event_id}')
 
-    event = Event.get_events(event_id)
+    expand = request.args.get("expand")
+    if expand is not None and expand != "selections":
+        app.logger.warning('Invalid expand value')
+        return errorit({"expand":"should be selections"}, "TAG_ERROR", 400)
+
+    if expand:
+        event = Event.get_an_event_with_selections(event_id)
+    else:
+        event = Event.get_events(event_id)
 
     if not event:
         app.logger.error(f'Event not found for ID: {event_id}')
         return errorit("No such event found", "EVENT_NOT_FOUND", 404)
     else:
         app.logger.info(f'Event information retrieved for ID: {event_id}')
-        return responsify(event, {})
+        return responsify(event, {}, etag=True)
 
 @app.route(BASE_PATH + "/events", methods=["GET"])
 def get_events():
@@ -79,20 +90,149 @@ def get_events():
     if request.args.get("name_or_url_pattern") is not None:
         regex = request.args.get("name_or_url_pattern")
 
-    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}')
+    cursor = None
+    if request.args.get("cursor") is not None:
+        cursor = decode_cursor(request.args.get("cursor"))
+        if cursor is None:
+            app.logger.warning('Invalid cursor value')
+            return errorit({"cursor":"should be empty for the first page or a next_cursor/prev_cursor value from a previous response"}, "TAG_ERROR", 400)
+
+    count = request.args.get("count")
+    if count is not None and count not in ("exact", "estimate", "none"):
+        app.logger.warning('Invalid count value')
+        return errorit({"count":"should be exact, estimate or none"}, "TAG_ERROR", 400)
+
+    match = request.args.get("match")
+    if match is not None and match not in ("regex", "contains", "prefix", "exact"):
+        app.logger.warning('Invalid match value')
+        return errorit({"match":"should be regex, contains, prefix or exact"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}, Match: {match}, Cursor: {cursor}, Count: {count}')
 
-    events = Event.get_events(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex)
+    events = Event.get_events(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex, cursor, count, match, request.if_none_match)
     
     if not events:
         app.logger.info('No events found')
         return responsify({"events":[]}, {})
+    elif events.get("not_modified"):
+        return not_modified(events["etag"])
     elif type(events) is dict:
         app.logger.info('Single event found')
-        return responsify(events, {}, 200)
+        return responsify(events, {}, 200, etag=events.pop("etag", None))
     else:
         app.logger.info(f'{len(events)} events found')
         return responsify(events, {})
 
+@app.route(BASE_PATH + "/sports/<sport_id>/events", methods=["GET"])
+def get_events_of_a_sport(sport_id):
+    """
+    Get a sport's events, a page at a time with cursor pagination
+
+    :param sport_id: [str] sports table primary key
+    """
+    app.logger.info(f'Get events request received for Sport ID: {sport_id}')
+
+    sorting_column = None
+    orderby = None
+    active = None
+
+    if request.args.get("orderby") and request.args.get("sortby"):
+        if request.args.get("orderby") == "1":
+            orderby = "ASC"
+        elif request.args.get("orderby") == "-1":
+            orderby = "DESC"
+        else:
+            app.logger.warning('Invalid orderby value')
+            return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be event name or createdAt"}, "TAG_ERROR", 400)
+
+        if request.args.get("sortby") == "name":
+            sorting_column = "name"
+        elif request.args.get("sortby") == "createdAt":
+            sorting_column = "created_at"
+        else:
+            app.logger.warning('Invalid sortby value')
+            return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be event name or createdAt"}, "TAG_ERROR", 400)
+
+    if request.args.get("active") is not None:
+        active = True if request.args.get("active").lower() == 'true' else False
+
+    cursor = decode_cursor(request.args.get("cursor", ""))
+    if cursor is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be empty for the first page or a next_cursor/prev_cursor value from a previous response"}, "TAG_ERROR", 400)
+
+    count = request.args.get("count")
+    if count is not None and count not in ("exact", "estimate", "none"):
+        app.logger.warning('Invalid count value')
+        return errorit({"count":"should be exact, estimate or none"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Cursor: {cursor}, Count: {count}')
+
+    events = Event.get_events(None, None, request.args.get("page_offset"), orderby, sorting_column, active, None, cursor, count, None, request.if_none_match, sport_id)
+
+    if events is None:
+        app.logger.error(f'Events retrieval failed for Sport ID: {sport_id}')
+        return errorit("No such sport found", "SPORT_NOT_FOUND", 404)
+    elif events.get("not_modified"):
+        return not_modified(events["etag"])
+    elif not events["events"] and not Sport.get_sports(sport_id):
+        # only an empty page pays for looking the sport up
+        app.logger.error(f'Sport not found for ID: {sport_id}')
+        return errorit("No such sport found", "SPORT_NOT_FOUND", 404)
+    else:
+        app.logger.info(f'{len(events["events"])} events found for Sport ID: {sport_id}')
+        return responsify(events, {}, 200, etag=events.pop("etag", None))
+
+@app.route(BASE_PATH + "/events/export", methods=["GET"])
+def export_events():
+    """
+    Stream every event as NDJSON or CSV
+    """
+    app.logger.info('Export events request received')
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        app.logger.warning('Invalid format value')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    updated_since = None
+    if request.args.get("updated_since") is not None:
+        updated_since = str_to_datetime(request.args.get("updated_since"))
+        if updated_since is None:
+            app.logger.warning('Invalid updated_since value')
+            return errorit({"updated_since":"should be a timestamp like 2016-10-21T23:46:50Z"}, "TAG_ERROR", 400)
+
+    return streamify(Event.export_events(updated_since), rowSerializer.of(Event.__table__).columns, fmt, "events")
+
+@app.route(BASE_PATH + "/events/changes", methods=["GET"])
+def get_event_changes():
+    """
+    Get the events changed since a change feed position, optionally long-polling until one changes
+    """
+    app.logger.info('Get event changes request received')
+
+    since = decode_change_position(request.args.get("since", ""))
+    if since is None:
+        app.logger.warning('Invalid since value')
+        return errorit({"since":"should be empty to start from the oldest change or a next_since value from a previous response"}, "TAG_ERROR", 400)
+
+    try:
+        limit = int(request.args.get("page_offset", 100))
+        wait = int(request.args.get("wait", 0))
+    except ValueError:
+        limit, wait = 0, -1
+
+    if not 1 <= limit <= CHANGES_MAX_PAGE or not 0 <= wait <= CHANGES_MAX_WAIT:
+        app.logger.warning('Invalid page_offset or wait value')
+        return errorit({"page_offset":f"should be between 1 and {CHANGES_MAX_PAGE}","wait":f"should be between 0 and {CHANGES_MAX_WAIT} seconds"}, "TAG_ERROR", 400)
+
+    changes = Event.get_event_changes(since, limit, wait)
+
+    if changes is None:
+        return errorit("Failed to retrieve event changes", "EVENT_CHANGES_FAILED", 500)
+
+    return responsify(changes, {})
+
 @app.route(BASE_PATH + "/events/<id>", methods=["PATCH"])
 def update_an_event(id):
     """
@@ -138,8 +278,8 @@ def fetch_and_store_events(sport_id):
     data = request.get_json()
     no_of_events = data.get("no_of_events", 1)
     
-    if no_of_events <= 0 or no_of_events > 3:
-        return errorit("No of events to be added must be a positive integer and cannot exceed 3", "INVALID_REQUEST", 400)
+    if no_of_events <= 0:
+        return errorit("No of events to be added must be a positive integer", "INVALID_REQUEST", 400)
 
     # Fetch sport details using provided sport_id
     sport = Sport.get_sports(sport_id=sport_id)
@@ -150,46 +290,89 @@ def fetch_and_store_events(sport_id):
     # Extract the url_identifier from sport details
     sport_key = sport["url_identifier"]
 
-    response = requests.get(f'{EX_API}sports/{sport_key}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu')
-
-    if response.status_code == 200:
-        events = response.json()
-
-        if no_of_events > len(events):
-            return errorit(f"Requested {no_of_events} events, but only {len(events)} available", "TOO_MANY_EVENTS_REQUESTED", 400)
-
-        count_added = 0
-        for event in events:
-            if count_added >= no_of_events:
-                break
-
-            event_data = {
-                "name": event["home_team"] + ' vs ' + event["away_team"],
-                "url_identifier": event["id"],
-                "type": 'preplay',
-                "sport_id": sport_id,
-                "status": 'Pending',
-                "scheduled_start": datetime.strptime(event["commence_time"], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S"),
-            }
-
-            # Check if event already exists
-            existing_event = Event.get_events(regex=event_data["url_identifier"])
-            if existing_event["events"]:
-                app.logger.debug('Event already exists, skipping to next')
-                continue
-
-            app.logger.debug(f'Event data: {event_data}')
-            result = Event.create_an_event(event_data)
-
-            if result.get("error"):
-                app.logger.error('Event creation failed')
-                app.logger.debug(f'Error details: {result}')
-                return errorit(result, "EVENT_CREATION_FAILED", 400)
+    url = f'{EX_API}sports/{sport_key}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu'
+    job_id = jobQueue.submit(app, "events_ingest", ingest_events, {sport_id: url}, no_of_events, True)
+
+    app.logger.info(f'Events ingest job submitted with id: {job_id}')
+    return responsify({"message": "Events ingest job submitted", "job_id": job_id}, {"job": f"{API_URI}{BASE_PATH}/jobs/{job_id}"}, 202)
+
+@app.route(BASE_PATH + "/events/upload_external", methods=["POST"])
+def fetch_and_store_events_of_sports():
+    """
+    Fetches events data from external API for many sports concurrently and stores it in database
+    """
+    app.logger.info('Fetch and store events data request received for many sports')
+
+    data = request.get_json()
+    sport_ids = data.get("sport_ids")
+    no_of_events = data.get("no_of_events", 1)
+
+    if not isinstance(sport_ids, list) or not sport_ids:
+        return errorit("sport_ids must be a non empty list of sport ids", "INVALID_REQUEST", 400)
+
+    if no_of_events <= 0:
+        return errorit("No of events to be added must be a positive integer", "INVALID_REQUEST", 400)
+
+    urls = {}
+    for sport_id in sport_ids:
+        sport = Sport.get_sports(sport_id=sport_id)
+        if not sport:
+            app.logger.error(f'No sport found with id: {sport_id}')
+            return errorit(f"No sport found with id {sport_id}", "INVALID_SPORT_ID", 400)
+
+        urls[sport_id] = f'{EX_API}sports/{sport["url_identifier"]}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu'
+
+    job_id = jobQueue.submit(app, "events_ingest", ingest_events, urls, no_of_events, False, total=len(urls))
+
+    app.logger.info(f'Events ingest job submitted with id: {job_id}')
+    return responsify({"message": "Events ingest job submitted", "job_id": job_id}, {"job": f"{API_URI}{BASE_PATH}/jobs/{job_id}"}, 202)
+
+def ingest_events(job_id, urls, no_of_events, strict):
+    """
+    Background job: fetches events data from external API for one or many sports concurrently and stores it in database
+
+    :param job_id: [str] id of the running job
+    :param urls: [dict] sports table primary key => external API odds url
+    :param no_of_events: [int] number of new events to store per sport
+    :param strict: [bool] fail the job when fewer than no_of_events events are available
+    """
+    responses = externalApi.get_many(urls)
+
+    results = {}
+    for sport_id, response in responses.items():
+        if isinstance(response, Exception) or response.status_code != 200:
+            app.logger.error(f'Failed to fetch events data from external API for sport id: {sport_id}')
+            results[sport_id] = {"error": "Failed to fetch events data from external API"}
+        else:
+            events = response.json()
+
+            if strict and no_of_events > len(events):
+                results[sport_id] = {"error": f"Requested {no_of_events} events, but only {len(events)} available"}
             else:
-                count_added += 1
+                events_data = [event_data_from_feed(event, sport_id) for event in events]
+                app.logger.debug(f'Events data: {events_data}')
+                results[sport_id] = Event.create_events(events_data, no_of_events)
 
-        app.logger.info('Events data successfully fetched and stored')
-        return responsify({"message": "Events data successfully fetched and stored"}, {}, 201)
-    else:
-        app.logger.error('Failed to fetch events data from external API')
-        return errorit("Failed to fetch events data from external API", "EXTERNAL_API_ERROR", 500)
+        jobQueue.progress(job_id, inserted=results[sport_id].get("inserted", 0), skipped=results[sport_id].get("skipped", 0), truncated=results[sport_id].get("truncated", 0))
+
+    if all(result.get("error") for result in results.values()):
+        return {"error": results[sport_id]["error"] if len(results) == 1 else results}
+
+    app.logger.info('Events data successfully fetched and stored')
+    return {"results": results}
+
+def event_data_from_feed(event, sport_id):
+    """
+    Map an event of the external odds feed to events table data
+
+    :param event: [dict] event as returned by the external API
+    :param sport_id: [str] sports table primary key the event belongs to
+    """
+    return {
+        "name": event["home_team"] + ' vs ' + event["away_team"],
+        "url_identifier": event["id"],
+        "type": 'preplay',
+        "sport_id": sport_id,
+        "status": 'Pending',
+        "scheduled_start": datetime.strptime(event["commence_time"], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S"),
+    }
\ No newline at end of file
@@ -0,0 +1,20 @@
+from src.helpers import *
+from src.app import app
+from src.libs.jobs import jobQueue
+
+@app.route(BASE_PATH + "/jobs/<job_id>", methods=["GET"])
+def get_a_job(job_id):
+    """
+    Get a background job's status, progress and inserted/skipped counts
+
+    :param job_id: [str] id returned when the job was submitted
+    """
+    app.logger.info(f'Job status request received for Job ID: {job_id}')
+
+    job = jobQueue.get(job_id)
+
+    if not job:
+        app.logger.error(f'Job not found for ID: {job_id}')
+        return errorit("No such job found", "JOB_NOT_FOUND", 404)
+    else:
+        return responsify(job, {}, etag=True)
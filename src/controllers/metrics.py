@@ -0,0 +1,21 @@
+from src.helpers import *
+from src.app import app
+from src.libs.metrics import requestMetrics
+from src.libs.pool import poolMonitor
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Get this process's request, query, serialization and pool metrics in the Prometheus text format
+    """
+    pool = poolMonitor.stats()
+
+    gauges = {
+        "sportsbook_db_pool_size": ("Connections the pool keeps open", "gauge", pool.get("size", 0)),
+        "sportsbook_db_pool_checked_out": ("Connections in use", "gauge", pool.get("checked_out", 0)),
+        "sportsbook_db_pool_overflow": ("Connections open beyond the pool size", "gauge", pool.get("overflow", 0)),
+        "sportsbook_db_pool_checkouts_total": ("Connection checkouts", "counter", pool["checkouts"]),
+        "sportsbook_db_pool_timeouts_total": ("Checkouts that gave up waiting for a connection", "counter", pool["timeouts"]),
+    }
+
+    return responsify_raw(requestMetrics.render(gauges), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,13 @@
+from src.helpers import *
+from src.app import app
+from src.libs.pool import poolMonitor
+from src.libs.replicas import replicaRouter
+
+@app.route(BASE_PATH + "/pool/stats", methods=["GET"])
+def get_pool_stats():
+    """
+    Get the database connection pool's live state and checkout counters, and the read replicas' health, for this process
+    """
+    app.logger.info('Pool stats request received')
+
+    return responsify({**poolMonitor.stats(), "replicas": replicaRouter.stats()}, {})
@@ -1,9 +1,12 @@
 from flask import request
 from src.models.selections import Selection
+from src.libs.serializer import rowSerializer
 from src.helpers import *
 from src.app import app
 from src.models.events import Event
 from src.models.sports import Sport
+from src.libs.external_api import externalApi
+from src.libs.jobs import jobQueue
 import requests
 
 @app.route(BASE_PATH + "/selections", methods=["POST"])
@@ -42,7 +45,7 @@ def get_a_selection(selection_id):
         return errorit("No such selection found", "SELECTION_NOT_FOUND", 404)
     else:
         app.logger.info(f'Selection information retrieved for ID: {selection_id}')
-        return responsify(selection, {})
+        return responsify(selection, {}, etag=True)
 
 @app.route(BASE_PATH + "/selections", methods=["GET"])
 def get_selections():
@@ -79,20 +82,149 @@ def get_selections():
     if request.args.get("name_pattern") is not None:
         regex = request.args.get("name_pattern")
 
-    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}')
+    cursor = None
+    if request.args.get("cursor") is not None:
+        cursor = decode_cursor(request.args.get("cursor"))
+        if cursor is None:
+            app.logger.warning('Invalid cursor value')
+            return errorit({"cursor":"should be empty for the first page or a next_cursor/prev_cursor value from a previous response"}, "TAG_ERROR", 400)
 
-    selections = Selection.get_selections(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex)
+    count = request.args.get("count")
+    if count is not None and count not in ("exact", "estimate", "none"):
+        app.logger.warning('Invalid count value')
+        return errorit({"count":"should be exact, estimate or none"}, "TAG_ERROR", 400)
+
+    match = request.args.get("match")
+    if match is not None and match not in ("regex", "contains", "prefix", "exact"):
+        app.logger.warning('Invalid match value')
+        return errorit({"match":"should be regex, contains, prefix or exact"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}, Match: {match}, Cursor: {cursor}, Count: {count}')
+
+    selections = Selection.get_selections(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex, cursor, count, match, request.if_none_match)
     
     if not selections:
         app.logger.info('No selections found')
         return responsify({"selections":[]}, {})
+    elif selections.get("not_modified"):
+        return not_modified(selections["etag"])
     elif type(selections) is dict:
         app.logger.info('Single selection found')
-        return responsify(selections, {}, 200)
+        return responsify(selections, {}, 200, etag=selections.pop("etag", None))
     else:
         app.logger.info(f'{len(selections)} selections found')
         return responsify(selections, {})
 
+@app.route(BASE_PATH + "/events/<event_id>/selections", methods=["GET"])
+def get_selections_of_an_event(event_id):
+    """
+    Get an event's selections, a page at a time with cursor pagination
+
+    :param event_id: [str] events table primary key
+    """
+    app.logger.info(f'Get selections request received for Event ID: {event_id}')
+
+    sorting_column = None
+    orderby = None
+    active = None
+
+    if request.args.get("orderby") and request.args.get("sortby"):
+        if request.args.get("orderby") == "1":
+            orderby = "ASC"
+        elif request.args.get("orderby") == "-1":
+            orderby = "DESC"
+        else:
+            app.logger.warning('Invalid orderby value')
+            return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be selection name or createdAt"}, "TAG_ERROR", 400)
+
+        if request.args.get("sortby") == "name":
+            sorting_column = "name"
+        elif request.args.get("sortby") == "createdAt":
+            sorting_column = "created_at"
+        else:
+            app.logger.warning('Invalid sortby value')
+            return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be selection name or createdAt"}, "TAG_ERROR", 400)
+
+    if request.args.get("active") is not None:
+        active = True if request.args.get("active").lower() == 'true' else False
+
+    cursor = decode_cursor(request.args.get("cursor", ""))
+    if cursor is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be empty for the first page or a next_cursor/prev_cursor value from a previous response"}, "TAG_ERROR", 400)
+
+    count = request.args.get("count")
+    if count is not None and count not in ("exact", "estimate", "none"):
+        app.logger.warning('Invalid count value')
+        return errorit({"count":"should be exact, estimate or none"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Cursor: {cursor}, Count: {count}')
+
+    selections = Selection.get_selections(None, None, request.args.get("page_offset"), orderby, sorting_column, active, None, cursor, count, None, request.if_none_match, event_id)
+
+    if selections is None:
+        app.logger.error(f'Selections retrieval failed for Event ID: {event_id}')
+        return errorit("No such event found", "EVENT_NOT_FOUND", 404)
+    elif selections.get("not_modified"):
+        return not_modified(selections["etag"])
+    elif not selections["selections"] and not Event.get_events(event_id):
+        # only an empty page pays for looking the event up
+        app.logger.error(f'Event not found for ID: {event_id}')
+        return errorit("No such event found", "EVENT_NOT_FOUND", 404)
+    else:
+        app.logger.info(f'{len(selections["selections"])} selections found for Event ID: {event_id}')
+        return responsify(selections, {}, 200, etag=selections.pop("etag", None))
+
+@app.route(BASE_PATH + "/selections/export", methods=["GET"])
+def export_selections():
+    """
+    Stream every selection as NDJSON or CSV
+    """
+    app.logger.info('Export selections request received')
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        app.logger.warning('Invalid format value')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    updated_since = None
+    if request.args.get("updated_since") is not None:
+        updated_since = str_to_datetime(request.args.get("updated_since"))
+        if updated_since is None:
+            app.logger.warning('Invalid updated_since value')
+            return errorit({"updated_since":"should be a timestamp like 2016-10-21T23:46:50Z"}, "TAG_ERROR", 400)
+
+    return streamify(Selection.export_selections(updated_since), rowSerializer.of(Selection.__table__).columns, fmt, "selections")
+
+@app.route(BASE_PATH + "/selections/changes", methods=["GET"])
+def get_selection_changes():
+    """
+    Get the selections changed since a change feed position, optionally long-polling until one changes
+    """
+    app.logger.info('Get selection changes request received')
+
+    since = decode_change_position(request.args.get("since", ""))
+    if since is None:
+        app.logger.warning('Invalid since value')
+        return errorit({"since":"should be empty to start from the oldest change or a next_since value from a previous response"}, "TAG_ERROR", 400)
+
+    try:
+        limit = int(request.args.get("page_offset", 100))
+        wait = int(request.args.get("wait", 0))
+    except ValueError:
+        limit, wait = 0, -1
+
+    if not 1 <= limit <= CHANGES_MAX_PAGE or not 0 <= wait <= CHANGES_MAX_WAIT:
+        app.logger.warning('Invalid page_offset or wait value')
+        return errorit({"page_offset":f"should be between 1 and {CHANGES_MAX_PAGE}","wait":f"should be between 0 and {CHANGES_MAX_WAIT} seconds"}, "TAG_ERROR", 400)
+
+    changes = Selection.get_selection_changes(since, limit, wait)
+
+    if changes is None:
+        return errorit("Failed to retrieve selection changes", "SELECTION_CHANGES_FAILED", 500)
+
+    return responsify(changes, {})
+
 @app.route(BASE_PATH + "/selections/<id>", methods=["PATCH"])
 def update_a_selection(id):
     """
@@ -111,6 +243,29 @@ def update_a_selection(id):
     else:
         return responsify(result, {}, 200)
     
+@app.route(BASE_PATH + "/selections:batch", methods=["PATCH"])
+def update_selections():
+    """
+    Update the price, active state and outcome of many selections in one transaction
+    """
+    items = request.get_json(silent=True)
+
+    if type(items) is not list or not items:
+        return errorit("Request body must be a non empty list of selection updates", "INVALID_REQUEST", 400)
+
+    if len(items) > SELECTIONS_BATCH_MAX:
+        return errorit(f"No more than {SELECTIONS_BATCH_MAX} selections can be updated at once", "INVALID_REQUEST", 400)
+
+    result = Selection.update_selections(items)
+
+    if result.get("error"):
+        return errorit(result.get("error"), "SELECTIONS_UPDATE_FAILED", 500)
+
+    if not result["updated"]:
+        return errorit(result, "SELECTIONS_UPDATE_FAILED", 400)
+
+    return responsify(result, {}, 200)
+
 @app.route(BASE_PATH + "/selections/<id>", methods=["DELETE"])
 def delete_selection_permanently(id):
     """
@@ -138,8 +293,8 @@ def fetch_and_store_selections(sport_id, event_id):
     data = request.get_json()
     no_of_selections = data.get("no_of_selections", 2)
     
-    if no_of_selections <= 0 or no_of_selections > 2:
-        return errorit("No of selections to be added must be a positive integer or less then 3", "INVALID_REQUEST", 400)
+    if no_of_selections <= 0:
+        return errorit("No of selections to be added must be a positive integer", "INVALID_REQUEST", 400)
 
     sport = Sport.get_sports(sport_id=sport_id)
     event = Event.get_events(event_id=event_id)
@@ -150,44 +305,93 @@ def fetch_and_store_selections(sport_id, event_id):
     sport_key = sport["url_identifier"]
     event_key = event["url_identifier"]
 
-    response = requests.get(f'{EX_API}sports/{sport_key}/events/{event_key}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu')
-
-    if response.status_code == 200:
-        selection = response.json()
-
-        count_added = 0
-        for bookmaker in selection["bookmakers"]:
-            for market in bookmaker["markets"]:
-                for outcome in market["outcomes"]:
-                    if count_added >= no_of_selections:
-                        break
-
-                    selection_data = {
-                        "name": outcome["name"],
-                        "event_id": event_id,
-                        "price": outcome["price"],
-                        "active": True,
-                        "outcome": 'Unsettled'
-                    }
-
-                    # Check if selection already exists
-                    existing_selection = Selection.get_selections(regex=selection_data["name"])
-                    if existing_selection["selections"]:
-                        app.logger.debug('Selection already exists, skipping to next')
-                        continue
-
-                    app.logger.debug(f'Selection data: {selection_data}')
-                    result = Selection.create_a_selection(selection_data)
-
-                    if result.get("error"):
-                        app.logger.error('Selection creation failed')
-                        app.logger.debug(f'Error details: {result}')
-                        return errorit(result, "SELECTION_CREATION_FAILED", 400)
-                    else:
-                        count_added += 1
-
-        app.logger.info('Selections data successfully fetched and stored')
-        return responsify({"message": "Selections data successfully fetched and stored"}, {}, 201)
-    else:
-        app.logger.error('Failed to fetch selections data from external API')
-        return errorit("Failed to fetch selections data from external API", "EXTERNAL_API_ERROR", 500)
\ No newline at end of file
+    url = f'{EX_API}sports/{sport_key}/events/{event_key}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu'
+    job_id = jobQueue.submit(app, "selections_ingest", ingest_selections, {event_id: url}, no_of_selections)
+
+    app.logger.info(f'Selections ingest job submitted with id: {job_id}')
+    return responsify({"message": "Selections ingest job submitted", "job_id": job_id}, {"job": f"{API_URI}{BASE_PATH}/jobs/{job_id}"}, 202)
+
+@app.route(BASE_PATH + "/selections/upload_external", methods=["POST"])
+def fetch_and_store_selections_of_events():
+    """
+    Fetches selections data from external API for many events concurrently and stores it in database
+    """
+    app.logger.info('Fetch and store selections data request received for many events')
+
+    data = request.get_json()
+    event_ids = data.get("event_ids")
+    no_of_selections = data.get("no_of_selections", 2)
+
+    if not isinstance(event_ids, list) or not event_ids:
+        return errorit("event_ids must be a non empty list of event ids", "INVALID_REQUEST", 400)
+
+    if no_of_selections <= 0:
+        return errorit("No of selections to be added must be a positive integer", "INVALID_REQUEST", 400)
+
+    sports = {}
+    urls = {}
+    for event_id in event_ids:
+        event = Event.get_events(event_id=event_id)
+        if not event:
+            app.logger.error(f'No event found with id: {event_id}')
+            return errorit(f"No event found with id {event_id}", "INVALID_EVENT_ID", 400)
+
+        if event["sport_id"] not in sports:
+            sports[event["sport_id"]] = Sport.get_sports(sport_id=event["sport_id"])
+
+        sport_key = sports[event["sport_id"]]["url_identifier"]
+        urls[event_id] = f'{EX_API}sports/{sport_key}/events/{event["url_identifier"]}/odds?apiKey={EX_API_KEY}&regions=uk,us,eu'
+
+    job_id = jobQueue.submit(app, "selections_ingest", ingest_selections, urls, no_of_selections, total=len(urls))
+
+    app.logger.info(f'Selections ingest job submitted with id: {job_id}')
+    return responsify({"message": "Selections ingest job submitted", "job_id": job_id}, {"job": f"{API_URI}{BASE_PATH}/jobs/{job_id}"}, 202)
+
+def ingest_selections(job_id, urls, no_of_selections):
+    """
+    Background job: fetches selections data from external API for one or many events concurrently and stores it in database
+
+    :param job_id: [str] id of the running job
+    :param urls: [dict] events table primary key => external API odds url
+    :param no_of_selections: [int] number of new selections to store per event
+    """
+    responses = externalApi.get_many(urls)
+
+    results = {}
+    for event_id, response in responses.items():
+        if isinstance(response, Exception) or response.status_code != 200:
+            app.logger.error(f'Failed to fetch selections data from external API for event id: {event_id}')
+            results[event_id] = {"error": "Failed to fetch selections data from external API"}
+        else:
+            selections_data = selections_data_from_feed(response.json(), event_id)
+            app.logger.debug(f'Selections data: {selections_data}')
+            results[event_id] = Selection.create_selections(selections_data, no_of_selections)
+
+        jobQueue.progress(job_id, inserted=results[event_id].get("inserted", 0), skipped=results[event_id].get("skipped", 0), truncated=results[event_id].get("truncated", 0))
+
+    if all(result.get("error") for result in results.values()):
+        return {"error": results[event_id]["error"] if len(results) == 1 else results}
+
+    app.logger.info('Selections data successfully fetched and stored')
+    return {"results": results}
+
+def selections_data_from_feed(feed, event_id):
+    """
+    Map the bookmaker outcomes of an external odds feed to selections table data
+
+    :param feed: [dict] event odds as returned by the external API
+    :param event_id: [str] events table primary key the selections belong to
+    """
+    selections_data = []
+    for bookmaker in feed["bookmakers"]:
+        for market in bookmaker["markets"]:
+            for outcome in market["outcomes"]:
+                selections_data.append({
+                    "name": outcome["name"],
+                    "event_id": str(event_id),
+                    "price": outcome["price"],
+                    "active": True,
+                    "outcome": 'Unsettled'
+                })
+
+    return selections_data
\ No newline at end of file
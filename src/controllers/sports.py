@@ -1,7 +1,10 @@
 from flask import request
 from src.models.sports import Sport
+from src.libs.serializer import rowSerializer
 from src.helpers import *
 from src.app import app
+from src.libs.external_api import externalApi
+from src.libs.jobs import jobQueue
 import requests
 
 @app.route(BASE_PATH + "/sports", methods=["POST"])
@@ -40,7 +43,7 @@ def get_a_sport(sport_id):
         return errorit("No such sport found", "SPORT_NOT_FOUND", 404)
     else:
         app.logger.info(f'Sport information retrieved for ID: {sport_id}')
-        return responsify(sport, {})
+        return responsify(sport, {}, etag=True)
 
 @app.route(BASE_PATH + "/sports", methods=["GET"])
 def get_sports():
@@ -77,20 +80,60 @@ def get_sports():
     if request.args.get("name_or_url_pattern") is not None:
         regex = request.args.get("name_or_url_pattern")
 
-    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}')
+    cursor = None
+    if request.args.get("cursor") is not None:
+        cursor = decode_cursor(request.args.get("cursor"))
+        if cursor is None:
+            app.logger.warning('Invalid cursor value')
+            return errorit({"cursor":"should be empty for the first page or a next_cursor/prev_cursor value from a previous response"}, "TAG_ERROR", 400)
 
-    sports = Sport.get_sports(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex)
+    count = request.args.get("count")
+    if count is not None and count not in ("exact", "estimate", "none"):
+        app.logger.warning('Invalid count value')
+        return errorit({"count":"should be exact, estimate or none"}, "TAG_ERROR", 400)
+
+    match = request.args.get("match")
+    if match is not None and match not in ("regex", "contains", "prefix", "exact"):
+        app.logger.warning('Invalid match value')
+        return errorit({"match":"should be regex, contains, prefix or exact"}, "TAG_ERROR", 400)
+
+    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}, Active: {active}, Regex: {regex}, Match: {match}, Cursor: {cursor}, Count: {count}')
+
+    sports = Sport.get_sports(None, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, active, regex, cursor, count, match, request.if_none_match)
     
     if not sports:
         app.logger.info('No sports found')
         return responsify({"sports":[]}, {})
+    elif sports.get("not_modified"):
+        return not_modified(sports["etag"])
     elif type(sports) is dict:
         app.logger.info('Single sport found')
-        return responsify(sports, {}, 200)
+        return responsify(sports, {}, 200, etag=sports.pop("etag", None))
     else:
         app.logger.info(f'{len(sports)} sports found')
         return responsify(sports, {})
 
+@app.route(BASE_PATH + "/sports/export", methods=["GET"])
+def export_sports():
+    """
+    Stream every sport as NDJSON or CSV
+    """
+    app.logger.info('Export sports request received')
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        app.logger.warning('Invalid format value')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    updated_since = None
+    if request.args.get("updated_since") is not None:
+        updated_since = str_to_datetime(request.args.get("updated_since"))
+        if updated_since is None:
+            app.logger.warning('Invalid updated_since value')
+            return errorit({"updated_since":"should be a timestamp like 2016-10-21T23:46:50Z"}, "TAG_ERROR", 400)
+
+    return streamify(Sport.export_sports(updated_since), rowSerializer.of(Sport.__table__).columns, fmt, "sports")
+
 @app.route(BASE_PATH + "/sports/<id>", methods=["PATCH"])
 def update_a_sport(id):
     """
@@ -141,41 +184,59 @@ def fetch_and_store_sports():
     if no_of_sports <= 0:
         return errorit("No of sports to be added must be a positive integer", "INVALID_REQUEST", 400)
 
-    response = requests.get(f'{EX_API}sports?apiKey={EX_API_KEY}')
-
-    if response.status_code == 200:
-        sports = response.json()
-        if no_of_sports > len(sports):
-            return errorit(f"Requested {no_of_sports} sports, but only {len(sports)} available", "TOO_MANY_SPORTS_REQUESTED", 400)
-
-        count_added = 0
-        for sport in sports:
-            if count_added >= no_of_sports:
-                break
-
-            data = {
-                "name": sport["group"],
-                "url_identifier": sport["key"],
-            }
-            app.logger.debug(f'Sport data: {data}')
-
-            # Check if sport already exists
-            existing_sport = Sport.get_sports(regex=data["name"])
-            if existing_sport and existing_sport.get("sports"):
-                app.logger.debug('Sport already exists, skipping to next')
-                continue
-
-            result = Sport.create_a_sport(data)
-
-            if result.get("error"):
-                app.logger.error('Sport creation failed')
-                app.logger.debug(f'Error details: {result}')
-                return errorit(result, "SPORT_CREATION_FAILED", 400)
-            else:
-                count_added += 1
-
-        app.logger.info('Sports data successfully fetched and stored')
-        return responsify({"message":"Sports data successfully fetched and stored"}, {}, 201)
-    else:
-        app.logger.error('Failed to fetch sports data from external API')
-        return errorit("Failed to fetch sports data from external API", "EXTERNAL_API_ERROR", 500)
\ No newline at end of file
+    job_id = jobQueue.submit(app, "sports_ingest", ingest_sports, no_of_sports)
+
+    app.logger.info(f'Sports ingest job submitted with id: {job_id}')
+    return responsify({"message": "Sports ingest job submitted", "job_id": job_id}, {"job": f"{API_URI}{BASE_PATH}/jobs/{job_id}"}, 202)
+
+def ingest_sports(job_id, no_of_sports):
+    """
+    Background job: fetches sports data from external API and stores it in database
+
+    :param job_id: [str] id of the running job
+    :param no_of_sports: [int] number of new sports to store
+    """
+    try:
+        response = externalApi.get(f'{EX_API}sports?apiKey={EX_API_KEY}')
+    except requests.RequestException:
+        return {"error": "Failed to fetch sports data from external API"}
+
+    if response.status_code != 200:
+        return {"error": "Failed to fetch sports data from external API"}
+
+    sports = response.json()
+    if no_of_sports > len(sports):
+        return {"error": f"Requested {no_of_sports} sports, but only {len(sports)} available"}
+
+    count_added = 0
+    for sport in sports:
+        if count_added >= no_of_sports:
+            break
+
+        data = {
+            "name": sport["group"],
+            "url_identifier": sport["key"],
+        }
+        app.logger.debug(f'Sport data: {data}')
+
+        # Check if sport already exists
+        existing_sport = Sport.get_sports(regex=data["name"], match="exact", count="none")
+        if existing_sport and existing_sport.get("sports"):
+            app.logger.debug('Sport already exists, skipping to next')
+            jobQueue.progress(job_id, completed=0, skipped=1)
+            continue
+
+        result = Sport.create_a_sport(data)
+
+        if result.get("error"):
+            app.logger.error('Sport creation failed')
+            app.logger.debug(f'Error details: {result}')
+            return {"error": result["error"]}
+        else:
+            count_added += 1
+            jobQueue.progress(job_id, completed=0, inserted=1)
+
+    jobQueue.progress(job_id)
+
+    app.logger.info('Sports data successfully fetched and stored')
+    return {}
\ No newline at end of file
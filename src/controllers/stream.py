@@ -0,0 +1,48 @@
+import re
+
+from flask import redirect, request
+from src.helpers import *
+from src.app import app
+from src.libs.pubsub import eventHub
+from src.libs.stream_server import streamServer
+from src.models.events import Event
+
+@app.route(BASE_PATH + "/stream/events/<event_id>", methods=["GET"])
+def stream_an_event(event_id):
+    """
+    Redirect to the Server-Sent Events stream of an event's live updates, served by the stream
+    server on STREAM_BIND (or STREAM_URL) where an open stream holds no server thread
+
+    :param event_id: [str] events table primary key
+    """
+    app.logger.info(f'Event stream request received for Event ID: {event_id}')
+
+    stream_url = STREAM_URL or "{}://{}:{}".format(request.scheme, re.sub(r":\d+$", "", request.host), STREAM_BIND.rsplit(":", 1)[1])
+
+    return redirect(stream_url + request.full_path.rstrip("?"), 307)
+
+@app.route(BASE_PATH + "/stream/stats", methods=["GET"])
+def get_stream_stats():
+    """
+    Get the live update hub's counters for this process
+    """
+    app.logger.info('Stream stats request received')
+
+    return responsify(eventHub.stats(), {})
+
+def event_snapshot(event_id):
+    """
+    The event a new stream starts with, read by the stream server off its event loop
+
+    :param event_id: [str] events table primary key
+    """
+    with app.app_context():
+        return Event.get_events(event_id)
+
+def start_stream_server():
+    """
+    Serve this process' live update streams on STREAM_BIND, called once the app is loaded in the
+    process that serves it (see gunicorn.conf.py and run.py)
+    """
+    port = streamServer.start(event_snapshot)
+    app.logger.info(f'Live update streams served on port {port}')
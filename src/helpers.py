@@ -1,9 +1,24 @@
+import csv
+import io
 import ujson
-from flask import Response
+import base64
+import hashlib
+import functools
+import logging
+import time
+from datetime import datetime, timezone
+from flask import Response, request, stream_with_context
 from src.config.config import *
-from sqlalchemy import text
+from sqlalchemy import exc, text
+from src.libs.replicas import replicaRouter
+from src.libs.metrics import requestMetrics
+from src.libs.profiling import slowQueryLog
 
-def responsify(payload, links={}, http_code=200, mimetype="application/json"):
+# columns and directions list pages may be sorted by, the only parts of their SQL that can't be bound
+SORT_COLUMNS = ("name", "created_at")
+SORT_ORDERS = ("ASC", "DESC")
+
+def responsify(payload, links={}, http_code=200, mimetype="application/json", etag=None):
   """
   An utility for returning reponse of an api call
 
@@ -11,6 +26,8 @@ def responsify(payload, links={}, http_code=200, mimetype="application/json"):
   :param  links: [dictionary] e.g. {"movie_url": "http://sdsd.com/232/movie.html"}
   :param  http_code: [integer]
   :param  mimetype: [string]
+  :param  etag: [string/bool] strong ETag of the payload, True hashes the serialized payload.
+                A matching If-None-Match turns the response into a 304 Not Modified
 
   :return [Object] Response object
   """
@@ -18,9 +35,109 @@ def responsify(payload, links={}, http_code=200, mimetype="application/json"):
     payload = payload or {}  # If payload is None, initialize it as an empty dict
     payload["links"] = links
 
+  started = time.perf_counter()
   data = ujson.dumps(payload) if payload else None
+  requestMetrics.observe_serialization(time.perf_counter() - started)
+
+  response = Response(response=data, status=http_code, mimetype=mimetype)
+
+  if etag:
+    if etag is True:
+      response.add_etag()
+    else:
+      response.set_etag(etag)
+    response.make_conditional(request)
+
+  return response
+
+def responsify_raw(data, http_code=200, mimetype="application/json", etag=False):
+  """
+  responsify for a body that is serialized already, e.g. JSON documents read from the database as text
+
+  :param  data: [string] response body
+  :param  http_code: [integer]
+  :param  mimetype: [string]
+  :param  etag: [bool] hash the body into a strong ETag, a matching If-None-Match turns the response into a 304
+
+  :return [Object] Response object
+  """
+  response = Response(response=data, status=http_code, mimetype=mimetype)
+
+  if etag:
+    response.add_etag()
+    response.make_conditional(request)
+
+  return response
+
+def make_etag(*parts):
+  """
+  Build a strong ETag from everything a response body is derived from
+
+  :param  parts: [any] e.g. request arguments, row count, max(updated_at)
+
+  :return [string] unquoted ETag
+  """
+  return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def streamify(batches, columns, fmt="ndjson", filename="export"):
+  """
+  An utility for streaming a large result set as a chunked NDJSON or CSV download. When the
+  batches fail part way, NDJSON ends with an EXPORT_ERROR error object line and CSV aborts the
+  connection, so neither reads as a complete export.
+
+  :param  batches: [generator] lists of dictionaries, consumed lazily while the body is sent
+  :param  columns: [list] CSV header, also the order of the CSV fields
+  :param  fmt: [string] ndjson or csv
+  :param  filename: [string] download name without extension e.g. selections
 
-  return Response(response=data, status=http_code, mimetype=mimetype)
+  :return [Object] Response object
+  """
+  def ndjson():
+    try:
+      for batch in batches:
+        if batch:
+          yield "\n".join(ujson.dumps(row) for row in batch) + "\n"
+    except Exception:
+      # the 200 is already sent, a last line that is an error object tells the client the rows stop short
+      yield err_dict("export failed, the rows above are incomplete", "EXPORT_ERROR") + "\n"
+
+  def csv_rows():
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, restval="", extrasaction="ignore")
+    writer.writeheader()
+
+    # a failure propagates and the server drops the connection before the last chunk, CSV has no
+    # room for an error row that a reader wouldn't take for data
+    for batch in batches:
+      writer.writerows(batch)
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+
+    # the header when there were no rows at all
+    if buffer.tell():
+      yield buffer.getvalue()
+
+  body, mimetype = (csv_rows(), "text/csv") if fmt == "csv" else (ndjson(), "application/x-ndjson")
+
+  return Response(
+    stream_with_context(body),
+    status=200,
+    mimetype=mimetype,
+    headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+  )
+
+def not_modified(etag):
+  """
+  An utility for returning a 304 Not Modified response without building the body
+
+  :param  etag: [string] unquoted ETag the client already holds
+
+  :return [Object] Response object
+  """
+  response = Response(status=304)
+  response.set_etag(etag)
+  return response
   
   
 def errorit(msg, custom_code, http_code=400, info="", mimetype="application/json", debug_info=None, **kwargs):
@@ -95,20 +212,382 @@ def datetime_to_str(dt, with_time=False, no_day=False):
   except:
     return None
 
-def execute_sql_query(db, sql_query, params=None, operation="select", fetchone=False):
+def str_to_datetime(value):
+  """
+  Parse a timestamp given as a query parameter
+
+  :param  value: [string] "2016-10-21T23:46:50Z" as returned by the API, or any ISO 8601 timestamp
+
+  :return [object] naive UTC datetime, None if the value can't be parsed
+  """
+  try:
+    if value.endswith("Z"):
+      value = value[:-1] + "+00:00"
+    dt = datetime.fromisoformat(value)
+  except (AttributeError, ValueError):
+    return None
+
+  if dt.tzinfo is not None:
+    dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+  return dt
+
+def encode_cursor(sortby, orderby, value, row_id, direction="next"):
+  """
+  Build an opaque keyset pagination token
+
+  :param  sortby: [string] column the page is sorted by e.g. name
+  :param  orderby: [string] ASC or DESC
+  :param  value: [any] value of the sort column for the boundary row
+  :param  row_id: [string/integer] id of the boundary row, used as tie breaker
+  :param  direction: [string] next or prev
+
+  :return [string] url safe token
+  """
+  if isinstance(value, datetime):
+    value = value.isoformat()
+
+  payload = ujson.dumps({"s": sortby, "o": orderby, "v": value, "id": row_id, "d": direction})
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+  """
+  Decode a token built by encode_cursor
+
+  :param  token: [string] opaque token, an empty string means the first page
+
+  :return [dict] decoded cursor, {} for the first page or None if the token is invalid
+  """
+  if not token:
+    return {}
+
+  try:
+    cursor = ujson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+  except Exception:
+    return None
+
+  if not isinstance(cursor, dict) or not {"s", "o", "v", "id", "d"} <= cursor.keys():
+    return None
+  if cursor["s"] not in SORT_COLUMNS or cursor["o"] not in SORT_ORDERS or cursor["d"] not in ("next", "prev"):
+    return None
+  if type(cursor["id"]) not in (int, str) or not isinstance(cursor["v"], str):
+    return None
+
+  if cursor["s"] == "created_at":
+    try:
+      cursor["v"] = datetime.fromisoformat(cursor["v"])
+    except (TypeError, ValueError):
+      return None
+
+  return cursor
+
+def encode_watermark(changed_at, row_id):
+  """
+  Build an opaque (timestamp, id) position, e.g. the board cursor
+
+  :param  changed_at: [datetime] timestamp the rows are ordered by of the last row seen
+  :param  row_id: [string/integer] id of the last row seen, used as tie breaker
+
+  :return [string] url safe token
+  """
+  payload = ujson.dumps({"t": changed_at.isoformat(), "id": row_id})
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_watermark(token):
+  """
+  Decode a token built by encode_watermark
+
+  :param  token: [string] opaque token, an empty string means the start
+
+  :return [dict] {"t": datetime, "id": id}, {} for the start or None if the token is invalid
+  """
+  if not token:
+    return {}
+
+  try:
+    watermark = ujson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+    watermark["t"] = datetime.fromisoformat(watermark["t"])
+  except Exception:
+    return None
+
+  if not isinstance(watermark, dict) or "id" not in watermark:
+    return None
+
+  return watermark
+
+def encode_change_position(change_xid, change_seq):
+  """
+  Build an opaque change feed position
+
+  :param  change_xid: [integer] transaction that wrote the last row seen
+  :param  change_seq: [integer] sequence number of that write
+
+  :return [string] url safe token
+  """
+  payload = ujson.dumps({"x": change_xid, "s": change_seq})
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_change_position(token):
+  """
+  Decode a token built by encode_change_position
+
+  :param  token: [string] opaque token, an empty string means the start of the feed
+
+  :return [dict] {"x": change_xid, "s": change_seq}, {} for the start of the feed or None if the token is invalid
+  """
+  if not token:
+    return {}
+
+  try:
+    position = ujson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+  except Exception:
+    return None
+
+  if not isinstance(position, dict) or type(position.get("x")) is not int or type(position.get("s")) is not int:
+    return None
+
+  return position
+
+def order_clause(sortby, orderby):
+  """
+  Build the ORDER BY of a list page from whitelisted parts, since identifiers can't be bound parameters
+
+  :param  sortby: [string] one of SORT_COLUMNS
+  :param  orderby: [string] ASC or DESC
+
+  :return [string] e.g. name ASC
+  """
+  if sortby not in SORT_COLUMNS or orderby not in SORT_ORDERS:
+    raise ValueError(f"Unsupported sort: {sortby} {orderby}")
+
+  return f"{sortby} {orderby}"
+
+def keyset_clause(cursor, sortby, orderby):
+  """
+  Build the seek condition and ORDER BY for a keyset (cursor) page
+
+  :param  cursor: [dict] decoded cursor, {} for the first page
+  :param  sortby: [string] column to sort by
+  :param  orderby: [string] ASC or DESC
+
+  :return [tuple] (condition, order_by, params, backwards)
+  """
+  order_clause(sortby, orderby)
+
+  backwards = cursor.get("d") == "prev"
+  direction = orderby
+  if backwards:
+    direction = "DESC" if orderby == "ASC" else "ASC"
+
+  order_by = f"{sortby} {direction}, id {direction}"
+
+  if "v" not in cursor:
+    return "", order_by, {}, backwards
+
+  operator = ">" if direction == "ASC" else "<"
+  condition = f"({sortby}, id) {operator} (:cursor_value, :cursor_id)"
+
+  return condition, order_by, {"cursor_value": cursor["v"], "cursor_id": cursor["id"]}, backwards
+
+def keyset_page(rows, cursor, sortby, orderby, limit):
+  """
+  Trim a keyset result fetched with LIMIT limit + 1 and work out the neighbouring cursors
+
+  :param  rows: [list] rows returned by the keyset query
+  :param  cursor: [dict] decoded cursor the page was requested with
+  :param  sortby: [string] column the page is sorted by
+  :param  orderby: [string] ASC or DESC
+  :param  limit: [integer] page size
+
+  :return [tuple] (rows, next_cursor, prev_cursor)
+  """
+  backwards = cursor.get("d") == "prev"
+  has_more = len(rows) > limit
+  rows = list(rows[:limit])
+
+  if backwards:
+    rows.reverse()
+
+  next_cursor = None
+  prev_cursor = None
+
+  if rows:
+    # walking backwards always leaves rows after the page, forwards only when one extra row came back
+    if has_more or backwards:
+      last = rows[-1]
+      next_cursor = encode_cursor(sortby, orderby, getattr(last, sortby), last.id, "next")
+    if (has_more and backwards) or (not backwards and "v" in cursor):
+      first = rows[0]
+      prev_cursor = encode_cursor(sortby, orderby, getattr(first, sortby), first.id, "prev")
+
+  return rows, next_cursor, prev_cursor
+
+def search_clause(columns, pattern, match="regex"):
+  """
+  Build a parameterised name search condition
+
+  :param  columns: [list] columns to search e.g. ["name", "url_identifier"]
+  :param  pattern: [string] user supplied search term
+  :param  match: [string] regex (case insensitive, trigram indexed), contains (case insensitive substring,
+                 trigram indexed), prefix (case insensitive, lower(column) btree indexed) or exact (unique index)
+
+  :return [tuple] (condition, params)
+  """
+  if match == "exact":
+    operator, column_sql, value = "=", "{}", pattern
+  elif match == "prefix":
+    operator, column_sql, value = "LIKE", "lower({})", escape_like(pattern.lower()) + "%"
+  elif match == "contains":
+    operator, column_sql, value = "ILIKE", "{}", "%" + escape_like(pattern) + "%"
+  else:
+    operator, column_sql, value = "~*", "{}", pattern
+
+  condition = " OR ".join(f"{column_sql.format(column)} {operator} :search" for column in columns)
+  return f"({condition})", {"search": value}
+
+def escape_like(value):
+  """
+  Escape LIKE wildcards so a search term is matched literally
+  """
+  return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def count_rows(db, table, where_query="", params=None, mode="exact", replica=False):
+  """
+  Count the rows of a list query according to the requested count mode
+
+  :param  db: [object] SQLAlchemy instance
+  :param  table: [string] table name e.g. sports
+  :param  where_query: [string] WHERE clause of the list query, may be empty
+  :param  params: [dict] bound parameters used by where_query
+  :param  mode: [string] exact runs COUNT(*), estimate reads the planner's row estimate, none skips counting
+  :param  replica: [boolean] the count may be served by a read replica
+
+  :return [integer/None] row count, None when mode is none
+  """
+  if mode == "none":
+    return None
+
+  if mode == "estimate":
+    plan = execute_sql_query(db, f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table} {where_query}", params, operation="select", replica=replica)
+    return int(plan[0][0][0]["Plan"]["Plan Rows"]) if plan else 0
+
+  total = execute_sql_query(db, f"SELECT COUNT(*) FROM {table} {where_query}", params, operation="select", replica=replica)
+  return total[0][0] if total else 0
+
+def list_watermark(db, table, where_query="", params=None, version="change_seq", replica=False):
+  """
+  Summarise every row a list filter matches in one aggregate, read before the count and the page
+  so a client holding a matching ETag gets its 304 without them. Every insert and update gives a
+  row a higher version and deletes lower the count, so any change to the filtered rows changes the
+  watermark, the rows of every page of it included.
+
+  :param  db: [object] SQLAlchemy instance
+  :param  table: [string] table name e.g. sports
+  :param  where_query: [string] WHERE clause of the list query, may be empty
+  :param  params: [dict] bound parameters used by where_query
+  :param  version: [string] SQL expression that grows on every write of a row e.g. change_seq
+  :param  replica: [boolean] the watermark may be served by a read replica
+
+  :return [tuple] (row count, sum of the row versions)
+  """
+  watermark = execute_sql_query(db, f"SELECT COUNT(*), SUM({version}) FROM {table} {where_query}", params, operation="select", replica=replica)
+  if watermark is None:
+    raise Exception('Failed to execute SQL query')
+
+  return tuple(watermark[0])
+
+def bulk_insert_query(table, rows, returning="id"):
+  """
+  Build a single multi-row INSERT that skips rows violating a unique constraint
+
+  :param  table: [string] table name e.g. selections
+  :param  rows: [list] dictionaries of column => value, columns missing from a row are inserted as NULL
+  :param  returning: [string] column returned for every inserted row
+
+  :return [tuple] (sql, params)
+  """
+  columns = list(dict.fromkeys(column for row in rows for column in row))
+  values = []
+  params = {}
+
+  for i, row in enumerate(rows):
+    values.append("({})".format(", ".join(f":{column}_{i}" for column in columns)))
+    params.update({f"{column}_{i}": row.get(column) for column in columns})
+
+  sql = "INSERT INTO {}({}) VALUES {} ON CONFLICT DO NOTHING RETURNING {}".format(
+    table, ", ".join(columns), ", ".join(values), returning
+  )
+
+  return sql, params
+
+def stream_rows(db, sql_query, params=None, batch_size=1000):
+  """
+  Run a SELECT through a server-side cursor and yield its rows batch by batch,
+  so memory use and time to the first row don't grow with the table
+
+  :param  db: [object] SQLAlchemy instance
+  :param  sql_query: [string] SELECT to run
+  :param  params: [dict] bound parameters used by sql_query
+  :param  batch_size: [integer] rows fetched from the cursor at a time
+
+  :return [generator] lists of at most batch_size rows
+  """
+  result = db.session.execute(sql_statement(sql_query), params or {}, execution_options={"yield_per": batch_size})
+
+  try:
+    for rows in result.partitions(batch_size):
+      yield rows
+  finally:
+    result.close()
+
+@functools.lru_cache(maxsize=SQL_STATEMENT_CACHE_SIZE)
+def sql_statement(sql_query):
+  """
+  Get the text() construct of a SQL string, built once per distinct string. Reusing the construct
+  skips re-parsing its bind parameters and keeps SQLAlchemy's compiled cache (and, with
+  SQL_PREPARE_THRESHOLD, the server's prepared statements) hitting for queries that bind every
+  variable part.
+
+  :param  sql_query: [string] SQL with :name placeholders
+
+  :return [object] TextClause
+  """
+  return text(sql_query)
+
+def sql_statement_stats():
+  """
+  Get the statement registry's counters for this process
+
+  :return [dictionary] hits, misses, size and max_size
+  """
+  info = sql_statement.cache_info()
+  return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+def execute_sql_query(db, sql_query, params=None, operation="select", fetchone=False, replica=False):
     """
     Executes a SQL query and returns the results.
     :param sql_query: [str] SQL query to execute
     :param params: [dict] Parameters to substitute into the SQL query
     :param operation: [str] The type of SQL operation being performed: "select", "insert", "update", "delete"
+    :param replica: [bool] a select may be served by a read replica, see replicaRouter
     :return: [ResultProxy / None] Result of the SQL query, if any
     """
+    started = time.perf_counter()
+    served, rows, error = False, None, None
+
     try:
-        result = db.session.execute(text(sql_query), params) if params else db.session.execute(text(sql_query))
+        if replica and operation.lower() == "select":
+            served, rows = replicaRouter.read(sql_statement(sql_query), params, fetchone)
+            if served:
+                return rows
+
+        result = db.session.execute(sql_statement(sql_query), params) if params else db.session.execute(sql_statement(sql_query))
         if operation.lower() == "select":
             if fetchone:
-              return result.fetchone()
-            return result.fetchall()
+              rows = result.fetchone()
+              return rows
+            rows = result.fetchall()
+            return rows
         
         elif operation.lower() in ["insert", "update", "delete"]:
             db.session.flush()
@@ -117,6 +596,21 @@ def execute_sql_query(db, sql_query, params=None, operation="select", fetchone=F
         else:
             raise ValueError(f"Unsupported SQL operation: {operation}")
 
+    except exc.TimeoutError as e:
+        # no pooled connection came free in SQLALCHEMY_POOL_TIMEOUT, don't let it pass for an empty result unnoticed
+        logging.getLogger("sports_book_rest_api").error(f"Database connection pool exhausted: {e}")
+        error = e
+        return None
     except Exception as e:
+        logging.getLogger("sports_book_rest_api").error(f"SQL query failed: {type(e).__name__}: {e}")
+        error = e
         return None
+    finally:
+        seconds = time.perf_counter() - started
+
+        # rows is a single row with fetchone, a list otherwise
+        requestMetrics.observe_query(sql_query, seconds, (1 if fetchone else len(rows)) if rows else 0, served)
+
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            slowQueryLog.record(db, sql_query, params, seconds, served, error)
 
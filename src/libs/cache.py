@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+import ujson
+
+from collections import OrderedDict
+from src.config.config import *
+
+class memoryBackend:
+  """
+  In-process LRU with a per entry TTL
+  """
+
+  # invalidation counters, keys share them by hash so their number stays fixed
+  GENERATIONS = 4096
+
+  def __init__(self, max_entries, ttl):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.generations = [0] * memoryBackend.GENERATIONS
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+
+      value, expires_at = entry
+      if expires_at < time.monotonic():
+        del self.entries[key]
+        return None
+
+      self.entries.move_to_end(key)
+      return value
+
+  def version(self, key):
+    with self.lock:
+      return self.generations[hash(key) % memoryBackend.GENERATIONS]
+
+  def set(self, key, value, version):
+    with self.lock:
+      # invalidated since the value was read
+      if self.generations[hash(key) % memoryBackend.GENERATIONS] != version:
+        return
+
+      self.entries[key] = (value, time.monotonic() + self.ttl)
+      self.entries.move_to_end(key)
+
+      # evict the least recently used entries once the size limit is hit
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+  def delete(self, keys):
+    with self.lock:
+      for key in keys:
+        self.entries.pop(key, None)
+        self.generations[hash(key) % memoryBackend.GENERATIONS] += 1
+
+  def size(self):
+    with self.lock:
+      return len(self.entries)
+
+class redisBackend:
+  """
+  Redis (or any server speaking its protocol) shared by every process of the service.
+  A failing server is treated as a cache miss, so reads fall back to the database.
+  """
+
+  def __init__(self, url, ttl):
+    # optional dependency, only needed when CACHE_BACKEND=redis
+    import redis
+
+    self.client = redis.Redis.from_url(url, socket_timeout=CACHE_REDIS_TIMEOUT, socket_connect_timeout=CACHE_REDIS_TIMEOUT)
+    self.ttl = ttl
+    self.errors = redis.RedisError
+    # store only while the key's invalidation counter still has the value it had before the read
+    self.set_if_current = self.client.register_script("""
+      if (redis.call('get', KEYS[2]) or '') == ARGV[3] then
+        return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+      end
+    """)
+
+  def get(self, key):
+    try:
+      value = self.client.get(key)
+    except self.errors:
+      return None
+
+    return ujson.loads(value) if value is not None else None
+
+  def version(self, key):
+    try:
+      version = self.client.get(key + ":gen")
+    except self.errors:
+      return None
+
+    return version.decode() if version is not None else ""
+
+  def set(self, key, value, version):
+    if version is None:
+      return
+
+    try:
+      self.set_if_current(keys=[key, key + ":gen"], args=[ujson.dumps(value), self.ttl, version])
+    except self.errors:
+      pass
+
+  def delete(self, keys):
+    # raises, entityCache.invalidate logs and counts a lost invalidation
+    if keys:
+      pipeline = self.client.pipeline()
+      pipeline.delete(*keys)
+      for key in keys:
+        # counters outlive any read in flight by far, an expired one only makes a fill miss
+        pipeline.incr(key + ":gen")
+        pipeline.expire(key + ":gen", 86400)
+      pipeline.execute()
+
+  def size(self):
+    return None
+
+class entityCache:
+  """
+  Read-through cache of single sports, events and selections keyed by entity type and id.
+  Writes invalidate the entries they touch explicitly, the TTL only bounds how long a
+  missed invalidation can go unnoticed. Every invalidation bumps a counter of the key, a fill
+  only stores its value if the counter didn't move since before its read, so a read that raced
+  a write can't put the old row back after the write's invalidation.
+  """
+
+  _backend = None
+  _lock = threading.Lock()
+  _stats = {"hits": 0, "misses": 0, "invalidations": 0, "failed_invalidations": 0}
+
+  @staticmethod
+  def backend():
+    with entityCache._lock:
+      if entityCache._backend is None:
+        if CACHE_BACKEND == "redis":
+          entityCache._backend = redisBackend(CACHE_REDIS_URL, CACHE_TTL)
+        else:
+          entityCache._backend = memoryBackend(CACHE_MAX_ENTRIES, CACHE_TTL)
+      return entityCache._backend
+
+  @staticmethod
+  def key(kind, entity_id):
+    return f"{CACHE_KEY_PREFIX}{kind}:{entity_id}"
+
+  @staticmethod
+  def get(kind, entity_id):
+    """
+    Look an entity up
+
+    :param  kind: [string] entity type e.g. sport
+    :param  entity_id: [string/integer] primary key
+
+    :return [dictionary] cached entity or None on a miss
+    """
+    if CACHE_BACKEND == "none":
+      return None
+
+    value = entityCache.backend().get(entityCache.key(kind, entity_id))
+
+    with entityCache._lock:
+      entityCache._stats["hits" if value is not None else "misses"] += 1
+
+    return value
+
+  @staticmethod
+  def version(kind, entity_id):
+    """
+    Get the invalidation counter of an entity, take it on a miss before reading the database
+
+    :param  kind: [string] entity type e.g. sport
+    :param  entity_id: [string/integer] primary key
+
+    :return [object] pass it to set with the value read
+    """
+    if CACHE_BACKEND == "none":
+      return None
+
+    return entityCache.backend().version(entityCache.key(kind, entity_id))
+
+  @staticmethod
+  def set(kind, entity_id, value, version):
+    """
+    Store an entity read from the database, unless it was invalidated since version was taken
+
+    :param  kind: [string] entity type e.g. sport
+    :param  entity_id: [string/integer] primary key
+    :param  value: [dictionary] entity as returned by the API
+    :param  version: [object] what version returned before the read
+    """
+    if CACHE_BACKEND == "none":
+      return
+
+    entityCache.backend().set(entityCache.key(kind, entity_id), value, version)
+
+  @staticmethod
+  def invalidate(kind, *entity_ids):
+    """
+    Drop entities after a write, call it once the write is committed. Never raises: the write
+    stands, a failed invalidation is logged and counted and its entries go stale until CACHE_TTL.
+
+    :param  kind: [string] entity type e.g. event
+    :param  entity_ids: [string/integer] primary keys, None values are ignored
+    """
+    keys = list({entityCache.key(kind, entity_id) for entity_id in entity_ids if entity_id is not None})
+    if CACHE_BACKEND == "none" or not keys:
+      return
+
+    try:
+      entityCache.backend().delete(keys)
+    except Exception as e:
+      logging.getLogger("sports_book_rest_api").error(f"Cache invalidation of {', '.join(keys)} failed, stale for up to {CACHE_TTL} s: {e}")
+      with entityCache._lock:
+        entityCache._stats["failed_invalidations"] += 1
+      return
+
+    with entityCache._lock:
+      entityCache._stats["invalidations"] += len(keys)
+
+  @staticmethod
+  def stats():
+    """
+    Get the hit/miss counters of this process
+
+    :return [dictionary] counters, hit ratio and the number of entries held in memory
+    """
+    with entityCache._lock:
+      stats = dict(entityCache._stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["backend"] = CACHE_BACKEND
+    stats["ttl"] = CACHE_TTL
+
+    if CACHE_BACKEND != "none":
+      size = entityCache.backend().size()
+      if size is not None:
+        stats["size"] = size
+
+    return stats
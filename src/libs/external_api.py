@@ -0,0 +1,74 @@
+import requests
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.config.config import *
+
+class externalApi:
+  """
+  Keep-alive HTTP client for the external odds API, shared by every request of the process
+  """
+
+  _session = None
+  _lock = threading.Lock()
+
+  @staticmethod
+  def session():
+    """
+    Get the process's session, built on first use. Request threads and get_many's workers can get
+    here at once, the lock keeps them from each building a session with its own connection pool.
+
+    :return [Object] requests Session object
+    """
+    if externalApi._session is not None:
+      return externalApi._session
+
+    with externalApi._lock:
+      if externalApi._session is None:
+        retry = Retry(
+          total=EX_API_RETRIES,
+          backoff_factor=EX_API_BACKOFF,
+          status_forcelist=(429, 500, 502, 503, 504),
+          allowed_methods=["GET"],
+          raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=EX_API_POOL_SIZE, pool_maxsize=EX_API_POOL_SIZE, max_retries=retry)
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        externalApi._session = session
+
+    return externalApi._session
+
+  @staticmethod
+  def get(url):
+    """
+    GET a single url through the pooled session
+
+    :param  url: [string] absolute url
+
+    :return [Object] requests Response object
+    """
+    return externalApi.session().get(url, timeout=(EX_API_CONNECT_TIMEOUT, EX_API_READ_TIMEOUT))
+
+  @staticmethod
+  def get_many(urls):
+    """
+    GET many urls concurrently, at most EX_API_MAX_WORKERS at a time
+
+    :param  urls: [dictionary] key => url e.g. {"soccer_epl": "http://sdsd.com/sports/soccer_epl/odds"}
+
+    :return [dictionary] key => Response object, or the exception raised for that url
+    """
+    def fetch(url):
+      try:
+        return externalApi.get(url)
+      except requests.RequestException as e:
+        return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(EX_API_MAX_WORKERS, len(urls)))) as executor:
+      responses = executor.map(fetch, urls.values())
+      return dict(zip(urls.keys(), responses))
@@ -0,0 +1,124 @@
+import threading
+import uuid
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.config.config import *
+from src.helpers import datetime_to_str
+
+class jobQueue:
+  """
+  In-process worker pool for ingest jobs, so that slow upstream calls and bulk writes
+  don't hold on to an API worker. Jobs live in the memory of the process that accepted them.
+  """
+
+  _executor = None
+  _jobs = OrderedDict()
+  _lock = threading.Lock()
+
+  @staticmethod
+  def executor():
+    with jobQueue._lock:
+      if jobQueue._executor is None:
+        jobQueue._executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+      return jobQueue._executor
+
+  @staticmethod
+  def submit(app, kind, target, *args, total=1):
+    """
+    Queue a job and return right away
+
+    :param  app: [object] Flask app, the job runs inside its app context
+    :param  kind: [string] job type e.g. events_ingest
+    :param  target: [function] called as target(job_id, *args), returns {"inserted", "skipped", "truncated", ...} or {"error": ...}
+    :param  total: [integer] number of work items, used to report progress
+
+    :return [string] job id
+    """
+    job_id = str(uuid.uuid4())
+    job = {
+      "id": job_id,
+      "type": kind,
+      "status": "queued",
+      "progress": {"completed": 0, "total": total},
+      "inserted": 0,
+      "skipped": 0,
+      "truncated": 0,
+      "created_at": datetime.utcnow()
+    }
+
+    with jobQueue._lock:
+      jobQueue._jobs[job_id] = job
+
+      # forget the oldest jobs once the retention limit is hit
+      while len(jobQueue._jobs) > JOBS_RETENTION:
+        jobQueue._jobs.popitem(last=False)
+
+    jobQueue.executor().submit(jobQueue.run, app, job_id, target, args)
+    return job_id
+
+  @staticmethod
+  def run(app, job_id, target, args):
+    jobQueue.update(job_id, status="running", started_at=datetime.utcnow())
+
+    try:
+      with app.app_context():
+        result = target(job_id, *args)
+    except Exception as e:
+      result = {"error": str(e)}
+
+    if result.get("error"):
+      app.logger.error(f'Job {job_id} failed')
+      app.logger.debug(f'Error details: {result["error"]}')
+      jobQueue.update(job_id, status="failed", error=result["error"], finished_at=datetime.utcnow())
+    else:
+      app.logger.info(f'Job {job_id} finished')
+      jobQueue.update(job_id, status="finished", finished_at=datetime.utcnow(), **result)
+
+  @staticmethod
+  def update(job_id, **fields):
+    with jobQueue._lock:
+      if job_id in jobQueue._jobs:
+        jobQueue._jobs[job_id].update(fields)
+
+  @staticmethod
+  def progress(job_id, completed=1, inserted=0, skipped=0, truncated=0):
+    """
+    Record finished work items of a running job
+
+    :param  job_id: [string] job id
+    :param  completed: [integer] number of work items finished
+    :param  inserted: [integer] rows inserted by these items
+    :param  skipped: [integer] rows skipped by these items
+    :param  truncated: [integer] new rows these items left out to stay within their limit
+    """
+    with jobQueue._lock:
+      job = jobQueue._jobs.get(job_id)
+      if job:
+        job["progress"]["completed"] += completed
+        job["inserted"] += inserted
+        job["skipped"] += skipped
+        job["truncated"] += truncated
+
+  @staticmethod
+  def get(job_id):
+    """
+    Get a job's state
+
+    :param  job_id: [string] job id
+
+    :return [dictionary] job state or None if the job is unknown
+    """
+    with jobQueue._lock:
+      job = jobQueue._jobs.get(job_id)
+      if not job:
+        return None
+
+      job = {**job, "progress": dict(job["progress"])}
+
+    for key in ("created_at", "started_at", "finished_at"):
+      if job.get(key):
+        job[key] = datetime_to_str(job[key], True)
+
+    return job
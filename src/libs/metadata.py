@@ -0,0 +1,79 @@
+import threading
+
+from sqlalchemy.orm import class_mapper, ColumnProperty
+
+class modelMetadata:
+  """
+  Column metadata of a model worked out once per process: its columns, the columns a create or
+  an update may write and the INSERT statements for them, so writes do no mapper reflection.
+  """
+
+  _registry = {}
+  _lock = threading.Lock()
+
+  def __init__(self, model):
+    self.table = model.__tablename__
+    self.columns = tuple(prop.key for prop in class_mapper(model).iterate_properties if isinstance(prop, ColumnProperty))
+
+    # kept in column order so the same payload fields always render the same statement
+    self.insert_columns = tuple(column for column in self.columns if column not in model._restrict_in_creation_)
+    self.update_columns = tuple(column for column in self.columns if column not in model._restrict_in_update_)
+
+    self.inserts = {}
+    self.insert_sql(self.insert_columns)
+
+  @staticmethod
+  def of(model):
+    """
+    Get the metadata of a model, built on first use
+
+    :param  model: [object] model class e.g. Sport
+
+    :return [object] modelMetadata
+    """
+    with modelMetadata._lock:
+      if model not in modelMetadata._registry:
+        modelMetadata._registry[model] = modelMetadata(model)
+      return modelMetadata._registry[model]
+
+  def insert_data(self, data):
+    """
+    Pick the fields a create may write from a payload
+
+    :param  data: [dictionary] payload
+
+    :return [dictionary] column => value in column order
+    """
+    return {column: data[column] for column in self.insert_columns if column in data}
+
+  def update_data(self, data):
+    """
+    Pick the fields an update may write from a payload
+
+    :param  data: [dictionary] payload
+
+    :return [dictionary] column => value in column order
+    """
+    return {column: data[column] for column in self.update_columns if column in data}
+
+  def insert_sql(self, columns, returning=None):
+    """
+    Get the single row INSERT of some columns, rendered once per column set
+
+    :param  columns: [iterable] column names, in the order of insert_data
+    :param  returning: [string] RETURNING list e.g. id
+
+    :return [string] INSERT with a :column placeholder per column
+    """
+    key = (tuple(columns), returning)
+    sql = self.inserts.get(key)
+
+    if sql is None:
+      sql = "INSERT INTO {}({}) VALUES ({})".format(self.table, ", ".join(key[0]), ", ".join(":" + column for column in key[0]))
+      if returning:
+        sql += " RETURNING " + returning
+
+      # at most one statement per subset of insert_columns, so this stays small
+      self.inserts[key] = sql
+
+    return sql
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from src.config.config import *
+
+# statement types a query is labelled with, anything else is OTHER so the label stays bounded
+STATEMENT_TYPES = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "EXPLAIN"))
+
+class metricHistogram:
+  """
+  Prometheus histogram of one metric, a bucket counter list plus sum and count per label set
+  """
+
+  def __init__(self, name, help_text, label_names):
+    self.name = name
+    self.help_text = help_text
+    self.label_names = label_names
+    self.series = {}
+
+  def observe(self, labels, value):
+    series = self.series.get(labels)
+    if series is None:
+      series = self.series[labels] = [[0] * len(METRICS_BUCKETS), 0.0, 0]
+
+    buckets = series[0]
+    for i, bound in enumerate(METRICS_BUCKETS):
+      if value <= bound:
+        buckets[i] += 1
+        break
+
+    series[1] += value
+    series[2] += 1
+
+  def render(self, pid):
+    lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+
+    for labels, (buckets, total, count) in sorted(self.series.items()):
+      label_text = ",".join([f'pid="{pid}"'] + [f'{name}="{value}"' for name, value in zip(self.label_names, labels)])
+      prefix = label_text + ","
+
+      cumulative = 0
+      for bound, observed in zip(METRICS_BUCKETS, buckets):
+        cumulative += observed
+        lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+      lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+
+      lines.append(f"{self.name}_sum{{{label_text}}} {total:.6f}")
+      lines.append(f"{self.name}_count{{{label_text}}} {count}")
+
+    return lines
+
+class requestMetrics:
+  """
+  Per request timings of this process: latency per route, time and rows of execute_sql_query per
+  statement type, responsify serialization time and connection pool waits, rendered in the
+  Prometheus text format. With METRICS_SERVER_TIMING each response also carries a Server-Timing
+  header splitting its time into database, serialization and Python time.
+
+  Nothing is shared between processes, every sample is labelled with the pid of the worker that
+  rendered it. A scrape only sees the worker that answered it, so scrape a single worker server
+  (SERVER_WORKERS=1, one per container) to see every request.
+  """
+
+  _lock = threading.Lock()
+  _requests = metricHistogram("sportsbook_http_request_duration_seconds", "Time to build a response, by route", ("method", "route", "status"))
+  _queries = metricHistogram("sportsbook_db_query_duration_seconds", "Time spent in execute_sql_query, by statement type", ("statement", "target"))
+  _serialization = metricHistogram("sportsbook_serialization_duration_seconds", "Time responsify spent serializing payloads, by route", ("route",))
+  _pool_waits = metricHistogram("sportsbook_db_pool_wait_seconds", "Time waited for a pooled database connection", ())
+  _rows = {}
+
+  @staticmethod
+  def init_app(app):
+    if METRICS_ENABLED:
+      app.before_request(requestMetrics.start)
+      app.after_request(requestMetrics.finish)
+
+  @staticmethod
+  def start():
+    g.metrics = {"started": time.perf_counter(), "db": 0.0, "queries": 0, "pool": 0.0, "serialize": 0.0}
+
+  @staticmethod
+  def finish(response):
+    """
+    Record the request's latency and add its Server-Timing header. Streamed responses are timed to
+    their first byte.
+    """
+    timings = g.pop("metrics", None)
+    if timings is None:
+      return response
+
+    elapsed = time.perf_counter() - timings["started"]
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+
+    with requestMetrics._lock:
+      requestMetrics._requests.observe((request.method, route, str(response.status_code)), elapsed)
+
+    if METRICS_SERVER_TIMING:
+      python = max(elapsed - timings["db"] - timings["serialize"], 0)
+      response.headers["Server-Timing"] = ", ".join((
+        f'db;dur={timings["db"] * 1000:.2f};desc="{timings["queries"]} queries"',
+        f'pool;dur={timings["pool"] * 1000:.2f}',
+        f'serialize;dur={timings["serialize"] * 1000:.2f}',
+        f'app;dur={python * 1000:.2f}',
+        f'total;dur={elapsed * 1000:.2f}',
+      ))
+
+    return response
+
+  @staticmethod
+  def observe_query(sql_query, seconds, rows, replica=False):
+    """
+    Record a statement run by execute_sql_query
+
+    :param  sql_query: [string] SQL that was run
+    :param  seconds: [float] time spent executing and fetching
+    :param  rows: [integer] rows returned
+    :param  replica: [boolean] a read replica served it
+    """
+    if not METRICS_ENABLED:
+      return
+
+    statement = sql_query.split(None, 1)[0].upper() if sql_query else ""
+    if statement not in STATEMENT_TYPES:
+      statement = "OTHER"
+
+    with requestMetrics._lock:
+      requestMetrics._queries.observe((statement, "replica" if replica else "primary"), seconds)
+      requestMetrics._rows[statement] = requestMetrics._rows.get(statement, 0) + rows
+
+    timings = g.get("metrics") if has_request_context() else None
+    if timings is not None:
+      timings["db"] += seconds
+      timings["queries"] += 1
+
+  @staticmethod
+  def observe_serialization(seconds):
+    if not METRICS_ENABLED or not has_request_context():
+      return
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    with requestMetrics._lock:
+      requestMetrics._serialization.observe((route,), seconds)
+
+    timings = g.get("metrics")
+    if timings is not None:
+      timings["serialize"] += seconds
+
+  @staticmethod
+  def observe_pool_wait(seconds):
+    if not METRICS_ENABLED:
+      return
+
+    with requestMetrics._lock:
+      requestMetrics._pool_waits.observe((), seconds)
+
+    timings = g.get("metrics") if has_request_context() else None
+    if timings is not None:
+      timings["pool"] += seconds
+
+  @staticmethod
+  def render(gauges=None):
+    """
+    Render every metric in the Prometheus text exposition format
+
+    :param  gauges: [dictionary] extra name => (help, type, value) samples, e.g. the pool's live state
+
+    :return [string]
+    """
+    pid = os.getpid()
+
+    with requestMetrics._lock:
+      lines = requestMetrics._requests.render(pid) + requestMetrics._queries.render(pid)
+      lines += ["# HELP sportsbook_db_rows_total Rows returned by execute_sql_query, by statement type", "# TYPE sportsbook_db_rows_total counter"]
+      lines += [f'sportsbook_db_rows_total{{pid="{pid}",statement="{statement}"}} {rows}' for statement, rows in sorted(requestMetrics._rows.items())]
+      lines += requestMetrics._serialization.render(pid) + requestMetrics._pool_waits.render(pid)
+
+    for name, (help_text, kind, value) in (gauges or {}).items():
+      lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f'{name}{{pid="{pid}"}} {value}']
+
+    return "\n".join(lines) + "\n"
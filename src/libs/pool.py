@@ -0,0 +1,127 @@
+import importlib.util
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from src.config.config import *
+from src.libs.metrics import requestMetrics
+
+class monitoredPool(QueuePool):
+  """
+  QueuePool that reports how long checkouts wait for a connection and how many give up
+  """
+
+  def connect(self):
+    started = time.perf_counter()
+    try:
+      return super().connect()
+    except exc.TimeoutError:
+      poolMonitor.record("timeouts")
+      raise
+    finally:
+      poolMonitor.record_wait(time.perf_counter() - started)
+
+class poolMonitor:
+  """
+  Database connection pool set up from config plus its live counters. In DB_PGBOUNCER mode the
+  engine only relies on what PgBouncer's transaction pooling keeps working: no prepared statements
+  and no session settings, the statement timeout is set per transaction instead.
+  """
+
+  _lock = threading.Lock()
+  _stats = {"checkouts": 0, "timeouts": 0, "connects": 0, "invalidations": 0, "waits": 0, "wait_total": 0.0, "wait_max": 0.0}
+  _pool = None
+
+  @staticmethod
+  def engine_options():
+    """
+    Get the SQLAlchemy engine options, set them as SQLALCHEMY_ENGINE_OPTIONS before the engine is built
+
+    :return [dictionary]
+    """
+    connect_args = {}
+
+    if SQLALCHEMY_STATEMENT_TIMEOUT and not DB_PGBOUNCER:
+      connect_args["options"] = f"-c statement_timeout={SQLALCHEMY_STATEMENT_TIMEOUT}"
+
+    if SQLALCHEMY_DATABASE_URI.startswith("postgresql+psycopg://"):
+      if importlib.util.find_spec("psycopg") is None:
+        raise RuntimeError("SQL_PREPARE_THRESHOLD needs the psycopg 3 driver, install psycopg[binary] from requirements.txt or unset it")
+      if not SQL_PREPARE_THRESHOLD.isdigit():
+        raise RuntimeError(f"SQL_PREPARE_THRESHOLD must be a whole number of runs, got {SQL_PREPARE_THRESHOLD!r}")
+
+      # psycopg 3 prepares statements by default, which PgBouncer can't route between server connections
+      connect_args["prepare_threshold"] = None if DB_PGBOUNCER or SQL_PREPARE_THRESHOLD is None else int(SQL_PREPARE_THRESHOLD)
+
+    return {
+      "poolclass": monitoredPool,
+      "pool_size": SQLALCHEMY_POOL_SIZE,
+      "max_overflow": SQLALCHEMY_MAX_OVERFLOW,
+      "pool_timeout": SQLALCHEMY_POOL_TIMEOUT,
+      "pool_recycle": SQLALCHEMY_POOL_RECYCLE,
+      "pool_pre_ping": SQLALCHEMY_POOL_PRE_PING,
+      "connect_args": connect_args,
+    }
+
+  @staticmethod
+  def attach(engine):
+    """
+    Start counting an engine's pool events, call it once the engine is built
+
+    :param  engine: [object] SQLAlchemy Engine e.g. db.engine
+    """
+    poolMonitor._pool = engine.pool
+
+    event.listen(engine.pool, "checkout", lambda *args: poolMonitor.record("checkouts"))
+    event.listen(engine.pool, "connect", lambda *args: poolMonitor.record("connects"))
+    event.listen(engine.pool, "invalidate", lambda *args: poolMonitor.record("invalidations"))
+
+    if DB_PGBOUNCER and SQLALCHEMY_STATEMENT_TIMEOUT:
+      event.listen(engine, "begin", poolMonitor.set_statement_timeout)
+
+  @staticmethod
+  def set_statement_timeout(connection):
+    # a connection only belongs to us for the length of a transaction behind PgBouncer
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(SQLALCHEMY_STATEMENT_TIMEOUT)}")
+
+  @staticmethod
+  def record(counter):
+    with poolMonitor._lock:
+      poolMonitor._stats[counter] += 1
+
+  @staticmethod
+  def record_wait(seconds):
+    with poolMonitor._lock:
+      poolMonitor._stats["waits"] += 1
+      poolMonitor._stats["wait_total"] += seconds
+      poolMonitor._stats["wait_max"] = max(poolMonitor._stats["wait_max"], seconds)
+
+    requestMetrics.observe_pool_wait(seconds)
+
+  @staticmethod
+  def stats():
+    """
+    Get the pool's live state and counters for this process
+
+    :return [dictionary] size, checked out and overflow connections, checkout counters and wait times in ms
+    """
+    with poolMonitor._lock:
+      stats = dict(poolMonitor._stats)
+
+    waits, wait_total, wait_max = stats.pop("waits"), stats.pop("wait_total"), stats.pop("wait_max")
+    stats["wait_avg_ms"] = round(wait_total / waits * 1000, 3) if waits else None
+    stats["wait_max_ms"] = round(wait_max * 1000, 3)
+
+    pool = poolMonitor._pool
+    if pool is not None:
+      stats.update({
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": SQLALCHEMY_MAX_OVERFLOW,
+      })
+
+    stats["pgbouncer"] = DB_PGBOUNCER
+    return stats
@@ -0,0 +1,207 @@
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+import ujson
+from flask import g, has_request_context, request
+from sqlalchemy import text
+from src.config.config import *
+from src.libs.replicas import replicaRouter
+
+class slowQueryLog:
+  """
+  Logs the statements of execute_sql_query that take SLOW_QUERY_MS or longer, one JSON line each with
+  the SQL, its parameters, the duration, the route and the error of a statement that failed. With
+  SLOW_QUERY_EXPLAIN a successful SELECT is run again under EXPLAIN ANALYZE, at most once per
+  SLOW_QUERY_EXPLAIN_INTERVAL per statement, by a background thread on a connection of its own so
+  the request doesn't wait for it, and its line is logged with the plan once that is done.
+  """
+
+  logger = logging.getLogger("sports_book_rest_api.slow_queries")
+
+  _lock = threading.Lock()
+  _explained = {}
+  _explains = queue.Queue(maxsize=16)
+  _explainer = None
+
+  @staticmethod
+  def record(db, sql_query, params, seconds, replica=False, error=None):
+    """
+    Log a slow statement
+
+    :param  db: [object] SQLAlchemy instance the statement ran on
+    :param  sql_query: [string] SQL that was run
+    :param  params: [dict] its bound parameters
+    :param  seconds: [float] time it took
+    :param  replica: [boolean] a read replica served it
+    :param  error: [object] exception the statement failed with, e.g. a statement_timeout cancellation
+    """
+    entry = {
+      "duration_ms": round(seconds * 1000, 3),
+      "target": "replica" if replica else "primary",
+      "route": f"{request.method} {request.url_rule.rule if request.url_rule else request.path}" if has_request_context() else None,
+      "sql": " ".join(sql_query.split()),
+      # the batch endpoints bind whole payloads, keep the line readable
+      "params": {name: str(value)[:200] for name, value in (params or {}).items()},
+    }
+
+    if error is not None:
+      # nothing to explain, and the request's transaction is aborted anyway
+      entry["error"] = f"{type(error).__name__}: {error}"
+    elif SLOW_QUERY_EXPLAIN and sql_query.lstrip()[:6].upper() == "SELECT" and slowQueryLog.due(sql_query):
+      try:
+        slowQueryLog._explains.put_nowait((db.engine, sql_query, params, replica, entry))
+        slowQueryLog.start_explainer()
+        return
+      except queue.Full:
+        entry["plan"] = ["EXPLAIN skipped, too many pending"]
+
+    slowQueryLog.logger.warning("Slow query " + ujson.dumps(entry))
+
+  @staticmethod
+  def due(sql_query):
+    now = time.monotonic()
+
+    with slowQueryLog._lock:
+      if now - slowQueryLog._explained.get(sql_query, -SLOW_QUERY_EXPLAIN_INTERVAL) < SLOW_QUERY_EXPLAIN_INTERVAL:
+        return False
+
+      # one entry per distinct statement, list SQL binds every variable part so there are few of them
+      if len(slowQueryLog._explained) >= SQL_STATEMENT_CACHE_SIZE:
+        slowQueryLog._explained.clear()
+      slowQueryLog._explained[sql_query] = now
+
+    return True
+
+  @staticmethod
+  def start_explainer():
+    with slowQueryLog._lock:
+      if slowQueryLog._explainer is None or not slowQueryLog._explainer.is_alive():
+        slowQueryLog._explainer = threading.Thread(target=slowQueryLog.run_explainer, name="slow-query-explainer", daemon=True)
+        slowQueryLog._explainer.start()
+
+  @staticmethod
+  def run_explainer():
+    while True:
+      engine, sql_query, params, replica, entry = slowQueryLog._explains.get()
+      entry["plan"] = slowQueryLog.explain(engine, sql_query, params, replica)
+      slowQueryLog.logger.warning("Slow query " + ujson.dumps(entry))
+
+  @staticmethod
+  def explain(engine, sql_query, params, replica=False):
+    """
+    Run a SELECT again under EXPLAIN ANALYZE where it ran first, a replica or the primary
+
+    :param  engine: [object] SQLAlchemy Engine of the primary
+
+    :return [list] plan lines, or the error that stopped the EXPLAIN
+    """
+    statement = text("EXPLAIN (ANALYZE, BUFFERS) " + sql_query)
+
+    try:
+      if replica:
+        served, rows = replicaRouter.read(statement, params)
+        if served:
+          return [row[0] for row in rows]
+
+      # a connection of its own that is rolled back on close, the request's session is left alone
+      with engine.connect() as connection:
+        return [row[0] for row in connection.execute(statement, params or {})]
+    except Exception as e:
+      return [f"EXPLAIN failed: {e}"]
+
+class requestProfiler:
+  """
+  Stack sampler for one request in PROFILE_SAMPLE_RATE. While a sampled request runs, a thread
+  records the request thread's stack every PROFILE_INTERVAL seconds. At its end the samples are
+  written to PROFILE_DIR in the collapsed stack format ("outer;inner;leaf count" per line) that
+  flamegraph.pl, speedscope and inferno read. Only the newest PROFILE_MAX_FILES profiles are kept.
+  """
+
+  _turn = itertools.count()
+
+  @staticmethod
+  def init_app(app):
+    if PROFILE_SAMPLE_RATE > 0:
+      app.before_request(requestProfiler.start)
+      app.teardown_request(requestProfiler.finish)
+
+  @staticmethod
+  def start():
+    turn = next(requestProfiler._turn)
+    if turn % PROFILE_SAMPLE_RATE:
+      return
+
+    sampler = {"thread": threading.get_ident(), "stop": threading.Event(), "stacks": {}, "started": time.time(), "turn": turn}
+    sampler["worker"] = threading.Thread(target=requestProfiler.sample, args=(sampler,), daemon=True)
+    sampler["worker"].start()
+    g.profile = sampler
+
+  @staticmethod
+  def sample(sampler):
+    stacks = sampler["stacks"]
+
+    while not sampler["stop"].wait(PROFILE_INTERVAL):
+      frame = sys._current_frames().get(sampler["thread"])
+
+      frames = []
+      while frame is not None:
+        frames.append(requestProfiler.frame_name(frame.f_code))
+        frame = frame.f_back
+
+      if frames:
+        stack = ";".join(reversed(frames))
+        stacks[stack] = stacks.get(stack, 0) + 1
+
+  @staticmethod
+  def frame_name(code):
+    # per function rather than per line so samples of one call add up, and no ";" which separates frames
+    filename = code.co_filename
+    if "site-packages" in filename:
+      filename = filename.split("site-packages" + os.sep, 1)[-1]
+    else:
+      filename = os.path.relpath(filename)
+
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+  @staticmethod
+  def finish(error=None):
+    """
+    Stop the request's sampler and write its profile, runs after streamed responses have been sent too
+    """
+    sampler = g.pop("profile", None)
+    if sampler is None:
+      return
+
+    sampler["stop"].set()
+    sampler["worker"].join()
+
+    if not sampler["stacks"]:
+      return
+
+    route = (request.url_rule.rule if request.url_rule else "unmatched").strip("/").replace("/", "_").replace("<", "").replace(">", "")
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(sampler['started']))}-{os.getpid()}-{sampler['turn']}-{request.method}-{route or 'root'}.folded"
+
+    try:
+      os.makedirs(PROFILE_DIR, exist_ok=True)
+      with open(os.path.join(PROFILE_DIR, name), "w") as profile:
+        profile.writelines(f"{stack} {count}\n" for stack, count in sampler["stacks"].items())
+
+      requestProfiler.prune()
+    except OSError as e:
+      logging.getLogger("sports_book_rest_api").error(f"Failed to write profile {name}: {e}")
+
+  @staticmethod
+  def prune():
+    profiles = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".folded")]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime)
+
+    for entry in profiles[:max(len(profiles) - PROFILE_MAX_FILES, 0)]:
+      try:
+        os.remove(entry.path)
+      except OSError:
+        pass
@@ -0,0 +1,216 @@
+import queue
+import select
+import threading
+import time
+import ujson
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from src.config.config import *
+
+class eventHub:
+  """
+  Pub/sub hub behind the live update streams. Writes publish to a topic (e.g. event:42) and every
+  subscriber of that topic in this process gets the message on its own bounded queue.
+
+  Messages are published inside the write's transaction and only delivered once it commits, a
+  rolled back write or savepoint publishes nothing. With PUBSUB_BACKEND=memory they only reach subscribers of
+  the publishing process. With PUBSUB_BACKEND=postgres they go through pg_notify on PUBSUB_CHANNEL,
+  which Postgres holds back until the commit, and one LISTEN thread per process fans them out, so
+  every process sees every write.
+  """
+
+  _subscribers = {}
+  _lock = threading.Lock()
+  _stats = {"published": 0, "delivered": 0, "dropped": 0, "streams": 0, "rejected": 0}
+  _listener = None
+
+  @staticmethod
+  def open_stream():
+    """
+    Take one of this process' STREAM_MAX_PER_WORKER stream slots
+
+    :return [boolean] False when every slot is taken
+    """
+    with eventHub._lock:
+      if eventHub._stats["streams"] >= STREAM_MAX_PER_WORKER:
+        eventHub._stats["rejected"] += 1
+        return False
+
+      eventHub._stats["streams"] += 1
+      return True
+
+  @staticmethod
+  def close_stream():
+    with eventHub._lock:
+      eventHub._stats["streams"] -= 1
+
+  @staticmethod
+  def subscribe(topic, subscription=None):
+    """
+    Start receiving a topic's messages
+
+    :param  topic: [string] e.g. event:42
+    :param  subscription: [object] where to put the messages, anything with a put_nowait that raises queue.Full
+                          when the subscriber is too far behind, a new bounded queue when omitted
+
+    :return [object] the subscription, pass it to unsubscribe when done
+    """
+    if PUBSUB_BACKEND == "postgres":
+      eventHub.listen()
+
+    if subscription is None:
+      subscription = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    with eventHub._lock:
+      eventHub._subscribers.setdefault(topic, set()).add(subscription)
+
+    return subscription
+
+  @staticmethod
+  def unsubscribe(topic, subscription):
+    with eventHub._lock:
+      subscribers = eventHub._subscribers.get(topic)
+      if subscribers is not None:
+        subscribers.discard(subscription)
+        if not subscribers:
+          del eventHub._subscribers[topic]
+
+  @staticmethod
+  def publish(topic, message, session):
+    """
+    Publish a message as part of the write it describes, call it before the write's commit
+
+    :param  topic: [string] e.g. event:42
+    :param  message: [dictionary] JSON serializable, at most ~8000 bytes once serialized with the postgres backend
+    :param  session: [object] SQLAlchemy session of the write, the message is delivered when it commits
+    """
+    with eventHub._lock:
+      eventHub._stats["published"] += 1
+
+    if PUBSUB_BACKEND != "postgres":
+      # kept with the innermost transaction, so rolling back a savepoint drops what was published in it
+      transaction = session.get_nested_transaction() or session.get_transaction()
+      session.info.setdefault("pubsub", []).append((transaction, topic, message))
+      return
+
+    payload = ujson.dumps({"topic": topic, "message": message})
+
+    # a failing NOTIFY aborts the transaction, so an oversized message is dropped instead of the write
+    if len(payload.encode()) >= 8000:
+      with eventHub._lock:
+        eventHub._stats["dropped"] += 1
+      return
+
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": PUBSUB_CHANNEL, "payload": payload})
+
+  @staticmethod
+  def deliver(session):
+    # a released savepoint commits nothing yet
+    if session.in_nested_transaction():
+      return
+
+    for _, topic, message in session.info.pop("pubsub", ()):
+      eventHub.fanout(topic, message)
+
+  @staticmethod
+  def discard(session, previous_transaction):
+    if not previous_transaction.nested:
+      session.info.pop("pubsub", None)
+      return
+
+    # Postgres drops a rolled back savepoint's NOTIFYs itself, the memory backend drops its messages
+    # and those of the savepoints released into it
+    pending = session.info.get("pubsub")
+    if pending:
+      session.info["pubsub"] = [item for item in pending if not eventHub.within(item[0], previous_transaction)]
+
+  @staticmethod
+  def within(transaction, ancestor):
+    while transaction is not None:
+      if transaction is ancestor:
+        return True
+      transaction = transaction.parent
+
+    return False
+
+  @staticmethod
+  def fanout(topic, message):
+    """
+    Hand a message to every local subscriber of its topic without blocking on any of them.
+    A subscriber that fell STREAM_QUEUE_SIZE messages behind misses the message.
+    """
+    with eventHub._lock:
+      subscribers = list(eventHub._subscribers.get(topic, ()))
+
+    delivered = 0
+    for subscription in subscribers:
+      try:
+        subscription.put_nowait(message)
+        delivered += 1
+      except queue.Full:
+        pass
+
+    with eventHub._lock:
+      eventHub._stats["delivered"] += delivered
+      eventHub._stats["dropped"] += len(subscribers) - delivered
+
+  @staticmethod
+  def connect():
+    # optional dependency of the postgres backend, already required by SQLAlchemy for the database
+    import psycopg2
+
+    connection = psycopg2.connect(PUBSUB_DB_URI)
+    connection.autocommit = True
+    return connection
+
+  @staticmethod
+  def listen():
+    with eventHub._lock:
+      if eventHub._listener is None or not eventHub._listener.is_alive():
+        eventHub._listener = threading.Thread(target=eventHub.run_listener, name="pubsub-listener", daemon=True)
+        eventHub._listener.start()
+
+  @staticmethod
+  def run_listener():
+    """
+    LISTEN on PUBSUB_CHANNEL and fan the notifications out to local subscribers, reconnecting on failure
+    """
+    while True:
+      try:
+        connection = eventHub.connect()
+        try:
+          with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {PUBSUB_CHANNEL}")
+
+          while True:
+            if select.select([connection], [], [], STREAM_HEARTBEAT) == ([], [], []):
+              continue
+
+            connection.poll()
+            while connection.notifies:
+              notification = ujson.loads(connection.notifies.pop(0).payload)
+              eventHub.fanout(notification["topic"], notification["message"])
+        finally:
+          connection.close()
+      except Exception:
+        time.sleep(PUBSUB_RECONNECT_DELAY)
+
+  @staticmethod
+  def stats():
+    """
+    Get the hub's counters for this process
+
+    :return [dictionary] published, delivered and dropped messages, open and rejected streams, topics and subscribers
+    """
+    with eventHub._lock:
+      stats = dict(eventHub._stats)
+      stats["topics"] = len(eventHub._subscribers)
+      stats["subscribers"] = sum(len(subscribers) for subscribers in eventHub._subscribers.values())
+
+    stats["backend"] = PUBSUB_BACKEND
+    return stats
+
+# memory backend messages wait in the session until its transaction ends
+event.listen(Session, "after_commit", eventHub.deliver)
+event.listen(Session, "after_soft_rollback", eventHub.discard)
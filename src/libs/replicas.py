@@ -0,0 +1,228 @@
+import itertools
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+from src.config.config import *
+from src.libs.pool import poolMonitor
+
+# SQLSTATE of a statement cancelled by statement_timeout, the replica that ran it is fine
+QUERY_CANCELED = "57014"
+
+class replicaNode:
+  """
+  One read replica: its engine, whether it is usable and when to look at it again
+  """
+
+  def __init__(self, name, uri):
+    self.name = name
+    options = {**poolMonitor.engine_options(), "poolclass": QueuePool}
+    if uri.startswith("sqlite"):
+      # local stand-in for a replica, return its timestamp columns as datetimes like Postgres does
+      options["connect_args"] = {"detect_types": sqlite3.PARSE_DECLTYPES, "check_same_thread": False}
+    elif uri.startswith("postgresql"):
+      # an unreachable replica should fail its connect fast, the primary can serve the read
+      options["connect_args"] = {**options["connect_args"], "connect_timeout": REPLICA_CONNECT_TIMEOUT}
+    else:
+      options["connect_args"] = {}
+
+    self.engine = create_engine(uri, **options)
+    self.healthy = True
+    self.lag = None
+    self.reads = 0
+    self.failures = 0
+
+  def probe(self):
+    """
+    Look at the replica, called by the monitor thread. A replica that can't be reached, or that lags
+    more than REPLICA_MAX_LAG seconds behind, takes no reads until a later probe finds it usable.
+    """
+    try:
+      with self.engine.connect() as connection:
+        if self.engine.dialect.name == "postgresql":
+          self.lag = float(connection.execute(text(
+            "SELECT CASE WHEN pg_is_in_recovery() THEN coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+          )).scalar())
+        else:
+          connection.execute(text("SELECT 1"))
+          self.lag = 0
+
+      self.healthy = not REPLICA_MAX_LAG or self.lag <= REPLICA_MAX_LAG
+    except Exception:
+      self.healthy = False
+
+class replicaRouter:
+  """
+  Sends the list and single entity reads of the get_* methods to the read replicas in REPLICA_URIS,
+  round-robin over the healthy ones, one replica for all the reads of a request. Everything else, and every read of a client that wrote in the
+  last REPLICA_STICKY_SECONDS (tracked with a cookie), stays on the primary. With no replica
+  configured or none healthy, reads go to the primary too.
+  """
+
+  _nodes = None
+  _monitor = None
+  _lock = threading.Lock()
+  _turn = itertools.count()
+  _stats = {"sticky": 0, "unavailable": 0, "fallbacks": 0}
+
+  @staticmethod
+  def nodes():
+    with replicaRouter._lock:
+      if replicaRouter._nodes is None:
+        replicaRouter._nodes = [replicaNode(f"replica_{i}", uri) for i, uri in enumerate(REPLICA_URIS)]
+
+      # started in the process that reads, gunicorn workers fork after the app is loaded
+      if replicaRouter._monitor is None and replicaRouter._nodes:
+        replicaRouter._monitor = threading.Thread(target=replicaRouter.monitor, name="replica-monitor", daemon=True)
+        replicaRouter._monitor.start()
+
+      return replicaRouter._nodes
+
+  @staticmethod
+  def monitor():
+    """
+    Probe every replica each REPLICA_CHECK_INTERVAL seconds, off the request threads so a slow or
+    unreachable replica never holds up a read
+    """
+    while True:
+      for node in replicaRouter._nodes:
+        node.probe()
+      time.sleep(REPLICA_CHECK_INTERVAL)
+
+  @staticmethod
+  def init_app(app):
+    app.after_request(replicaRouter.stick_to_primary)
+
+  @staticmethod
+  def stick_to_primary(response):
+    """
+    After a successful write, keep the client's reads on the primary until replicas have caught up
+    """
+    if REPLICA_URIS and request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+      response.set_cookie(REPLICA_STICKY_COOKIE, str(int(time.time() + REPLICA_STICKY_SECONDS)), max_age=REPLICA_STICKY_SECONDS, httponly=True)
+    return response
+
+  @staticmethod
+  def reads_primary():
+    """
+    Whether the current request has to read from the primary: it is not a GET, or its client wrote recently
+    """
+    if not has_request_context():
+      return False
+
+    if request.method not in ("GET", "HEAD"):
+      return True
+
+    try:
+      return int(request.cookies.get(REPLICA_STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+      return False
+
+  @staticmethod
+  def pick():
+    """
+    Get the next healthy replica in turn
+
+    :return [object] replicaNode or None if there is none
+    """
+    healthy = [node for node in replicaRouter.nodes() if node.healthy]
+    if not healthy:
+      return None
+
+    return healthy[next(replicaRouter._turn) % len(healthy)]
+
+  @staticmethod
+  def route():
+    """
+    Get the replica serving the reads of the current request, picked at its first read and kept for
+    the others so e.g. a list's watermark, count and page all read the same replica. Reads outside
+    a request pick one each.
+
+    :return [object] replicaNode or None if the primary serves the reads
+    """
+    if has_request_context() and "replica" in g:
+      return g.replica
+
+    node = replicaRouter.pick()
+    if node is None:
+      with replicaRouter._lock:
+        replicaRouter._stats["unavailable"] += 1
+
+    if has_request_context():
+      g.replica = node
+
+    return node
+
+  @staticmethod
+  def cancelled(error):
+    """
+    Whether a failed read was cancelled by statement_timeout rather than failed by its replica
+    """
+    orig = getattr(error, "orig", None)
+    return (getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)) == QUERY_CANCELED
+
+  @staticmethod
+  def read(statement, params=None, fetchone=False):
+    """
+    Run a SELECT on a replica, outside the session since replicas never take part in a write
+
+    :param  statement: [object] TextClause
+    :param  params: [dict] bound parameters
+    :param  fetchone: [boolean] return the first row only
+
+    :return [tuple] (True, rows or row) or (False, None) when the primary has to serve the read
+    """
+    if not REPLICA_URIS:
+      return False, None
+
+    if replicaRouter.reads_primary():
+      with replicaRouter._lock:
+        replicaRouter._stats["sticky"] += 1
+      return False, None
+
+    node = replicaRouter.route()
+    if node is None:
+      return False, None
+
+    try:
+      with node.engine.connect() as connection:
+        result = connection.execute(statement, params or {})
+        rows = result.fetchone() if fetchone else result.fetchall()
+    except (exc.OperationalError, exc.TimeoutError) as e:
+      # a read that ran out of statement_timeout would run out of it on the primary too, it fails as it would there
+      if replicaRouter.cancelled(e):
+        raise
+
+      # unreachable or overloaded, it leaves the rotation until the monitor finds it usable again,
+      # the primary serves this read and the rest of the request's
+      node.healthy = False
+      if has_request_context():
+        g.replica = None
+      with replicaRouter._lock:
+        node.failures += 1
+        replicaRouter._stats["fallbacks"] += 1
+      return False, None
+
+    with replicaRouter._lock:
+      node.reads += 1
+
+    return True, rows
+
+  @staticmethod
+  def stats():
+    """
+    Get the replicas' health and read counters for this process
+
+    :return [dictionary]
+    """
+    with replicaRouter._lock:
+      stats = dict(replicaRouter._stats)
+
+    stats["replicas"] = [
+      {"name": node.name, "healthy": node.healthy, "lag": node.lag, "reads": node.reads, "failures": node.failures}
+      for node in replicaRouter.nodes()
+    ]
+    return stats
@@ -0,0 +1,64 @@
+import threading
+
+from sqlalchemy import DateTime
+
+class rowSerializer:
+  """
+  Turns result rows of a table into API dictionaries. The column order and which columns hold
+  datetimes are worked out once per table, so a row costs one pass over its values.
+  """
+
+  _serializers = {}
+  _lock = threading.Lock()
+
+  def __init__(self, table):
+    columns = list(table.columns)
+
+    self.columns = tuple(column.name for column in columns)
+    self.select = ", ".join(self.columns)
+    self.plain = tuple((i, column.name) for i, column in enumerate(columns) if not isinstance(column.type, DateTime))
+    self.datetimes = tuple((i, column.name) for i, column in enumerate(columns) if isinstance(column.type, DateTime))
+
+  @staticmethod
+  def of(table):
+    """
+    Get the serializer of a table, built on first use
+
+    :param  table: [object] SQLAlchemy Table e.g. Sport.__table__
+
+    :return [object] rowSerializer
+    """
+    with rowSerializer._lock:
+      if table.name not in rowSerializer._serializers:
+        rowSerializer._serializers[table.name] = rowSerializer(table)
+      return rowSerializer._serializers[table.name]
+
+  def one(self, row):
+    """
+    Serialize a row selected with `SELECT {self.select}`, None values are left out
+    and datetimes are formatted as "2016-10-21T23:46:50Z"
+
+    :param  row: [object] result row
+
+    :return [dictionary]
+    """
+    result = {name: row[i] for i, name in self.plain if row[i] is not None}
+
+    for i, name in self.datetimes:
+      value = row[i]
+      if value is not None:
+        # same output as datetime_to_str(value, True) for the naive UTC timestamps we store, at half the cost
+        result[name] = value.isoformat(timespec="seconds") + "Z"
+
+    return result
+
+  def many(self, rows):
+    """
+    Serialize result rows, see one
+
+    :param  rows: [list] result rows
+
+    :return [list] dictionaries
+    """
+    one = self.one
+    return [one(row) for row in rows]
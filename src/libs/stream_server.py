@@ -0,0 +1,175 @@
+import asyncio
+import collections
+import http
+import queue
+import re
+import socket
+import threading
+import ujson
+
+from urllib.parse import unquote
+from src.config.config import *
+from src.helpers import err_dict
+from src.libs.pubsub import eventHub
+
+STREAM_PATH = re.compile(re.escape(BASE_PATH) + r"/stream/events/([^/]+)$")
+
+class loopSubscription:
+  """
+  eventHub subscription of a stream served on the event loop. The hub's threads append messages and
+  wake the stream's coroutine, so an idle subscriber holds a deque and an asyncio.Event, no thread.
+  """
+
+  def __init__(self, loop):
+    self.loop = loop
+    self.messages = collections.deque()
+    self.ready = asyncio.Event()
+
+  def put_nowait(self, message):
+    if len(self.messages) >= STREAM_QUEUE_SIZE:
+      raise queue.Full
+
+    self.messages.append(message)
+    self.loop.call_soon_threadsafe(self.ready.set)
+
+class streamServer:
+  """
+  Live update streams served by an asyncio event loop on STREAM_BIND, one per process next to the
+  REST API and fed by the process' eventHub. An open stream is a socket and a coroutine, so a
+  process holds thousands of them without taking threads from the REST API. Every gunicorn worker
+  binds STREAM_BIND with SO_REUSEPORT and the kernel spreads new streams over them.
+  """
+
+  _lock = threading.Lock()
+  _thread = None
+  _port = None
+
+  @staticmethod
+  def start(snapshot, bind=STREAM_BIND):
+    """
+    Start serving streams from a background thread, once per process
+
+    :param  snapshot: [function] called as snapshot(event_id) off the event loop, returns the event
+                      dictionary sent first or None when there is no such event
+    :param  bind: [string] host:port e.g. 0.0.0.0:5001, port 0 picks a free one
+
+    :return [integer] port the streams are served on
+    """
+    with streamServer._lock:
+      if streamServer._thread is None:
+        host, port = bind.rsplit(":", 1)
+
+        # bound and listening here, so a taken port fails the caller and no early client is refused
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+          sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, int(port)))
+        sock.listen(1024)
+
+        streamServer._port = sock.getsockname()[1]
+        streamServer._thread = threading.Thread(target=streamServer.run, args=(sock, snapshot), name="stream-server", daemon=True)
+        streamServer._thread.start()
+
+      return streamServer._port
+
+  @staticmethod
+  def run(sock, snapshot):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    handle = lambda reader, writer: streamServer.handle(reader, writer, snapshot)
+    loop.run_until_complete(asyncio.start_server(handle, sock=sock, backlog=1024))
+    loop.run_forever()
+
+  @staticmethod
+  async def handle(reader, writer, snapshot):
+    try:
+      head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), STREAM_HEARTBEAT)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+      writer.close()
+      return
+
+    request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+    match = STREAM_PATH.match(request_line[1].split("?", 1)[0]) if len(request_line) == 3 else None
+
+    if request_line[0] != "GET" or not match:
+      return await streamServer.respond(writer, 404, err_dict("No such stream", "NOT_FOUND"))
+
+    if not eventHub.open_stream():
+      return await streamServer.respond(writer, 503, err_dict("Too many open streams, retry later", "STREAM_LIMIT_ERROR"),
+        f"Retry-After: {int(STREAM_HEARTBEAT)}")
+
+    try:
+      await streamServer.stream(reader, writer, snapshot, unquote(match.group(1)))
+    finally:
+      eventHub.close_stream()
+
+  @staticmethod
+  async def stream(reader, writer, snapshot, event_id):
+    """
+    Server-Sent Events of an event: the event itself first, then every committed update of the
+    event and of its selections, and a keep-alive comment every STREAM_HEARTBEAT seconds
+    """
+    loop = asyncio.get_running_loop()
+
+    # subscribe before the snapshot is read, so no update falls in between
+    topic = f"event:{event_id}"
+    subscription = eventHub.subscribe(topic, loopSubscription(loop))
+    closed = loop.create_task(streamServer.until_closed(reader))
+
+    try:
+      event = await loop.run_in_executor(None, snapshot, event_id)
+
+      if not event:
+        return await streamServer.respond(writer, 404, err_dict("No such event found", "EVENT_NOT_FOUND"))
+
+      writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+        b"X-Accel-Buffering: no\r\nAccess-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n")
+      writer.write(f"retry: {int(STREAM_HEARTBEAT * 1000)}\nevent: snapshot\ndata: {ujson.dumps(event)}\n\n".encode())
+
+      while not closed.done():
+        # a client that stops reading fills its socket buffer, then its subscription, and misses messages
+        await writer.drain()
+
+        ready = loop.create_task(subscription.ready.wait())
+        done, _ = await asyncio.wait((ready, closed), timeout=STREAM_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+
+        if ready not in done:
+          ready.cancel()
+          if not closed.done():
+            writer.write(b": keep-alive\n\n")
+          continue
+
+        subscription.ready.clear()
+        while subscription.messages:
+          message = subscription.messages.popleft()
+          writer.write(f"event: {message['type']}\ndata: {ujson.dumps(message)}\n\n".encode())
+    except ConnectionError:
+      pass
+    finally:
+      eventHub.unsubscribe(topic, subscription)
+      closed.cancel()
+      writer.close()
+
+  @staticmethod
+  async def until_closed(reader):
+    # a stream's client sends nothing after its request, the read only returns once it goes away
+    try:
+      while await reader.read(1024):
+        pass
+    except ConnectionError:
+      pass
+
+  @staticmethod
+  async def respond(writer, status, body, *headers):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}", "Content-Type: application/json",
+      f"Content-Length: {len(body.encode())}", "Connection: close", *headers]
+
+    try:
+      writer.write(("\r\n".join(lines) + "\r\n\r\n" + body).encode())
+      await writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
@@ -3,8 +3,99 @@ import pytz
 import re
 from datetime import datetime
 
+# years below 1000 do not survive the strptime/strftime round trip, so they are left out here too
+DATE_PATTERN     = re.compile(r"([1-9]\d{3})-(\d{2})-(\d{2})", re.ASCII)
+DATETIME_PATTERN = re.compile(r"([1-9]\d{3})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})", re.ASCII)
+TIME_PATTERN     = re.compile(r"([01]\d|2[0-3]):([0-5]\d):([0-5]\d)", re.ASCII)
+
+class compiledSchema:
+  """
+  A _validations_ dictionary turned into a validator once: a callable per field and the required
+  fields worked out up front. validate gives the same result as validationManager.validate.
+  """
+
+  def __init__(self, assertions):
+    self.assertions = assertions
+    self.required = tuple(key for key, assertion in assertions.items() if assertion["required"])
+    self.validators = {key: validationManager.compile_field(key, assertion) for key, assertion in assertions.items()}
+
+  def validate(self, data, skip=[], sanitize=True, join_msg=True):
+    """
+    Validate and sanitize a payload
+
+    :param  data: [dictionary] payload
+    :param  skip: [list] fields that are neither validated nor required
+    :param  sanitize: [boolean] strip whitespace from strings
+    :param  join_msg: [boolean] join the error messages into one string
+
+    :return [dictionary] errors and sanitized data
+    """
+    skip = set(skip)
+    validators = self.validators
+    errors = []
+    sanitized = {}
+    supplied = set()
+
+    for key, value in data.items():
+      if sanitize and type(value) is str:
+        value = value.strip()
+      sanitized[key] = value
+
+      validator = validators.get(key)
+      if validator is not None and key not in skip:
+        supplied.add(key)
+
+        error = validator(value)
+        if error:
+          errors.append(error)
+
+    missing = [key for key in self.required if key not in supplied and key not in skip]
+    if missing:
+      errors.append("Missing required fields: " + ", ".join(missing))
+
+    if not supplied:
+      errors = "No valid input data supplied" if join_msg else ["No valid input data supplied"]
+    elif join_msg:
+      errors = ", ".join(errors)
+
+    return {"errors": errors, "data": sanitized}
+
 class validationManager:
 
+  @staticmethod
+  def compile(assertions):
+    """
+    Compile a _validations_ dictionary, do it once per model rather than per request
+
+    :param  assertions: [dictionary] e.g. Sport._validations_
+
+    :return [object] compiledSchema
+    """
+    return compiledSchema(assertions)
+
+  @staticmethod
+  def compile_field(key, assertion):
+    validation = validationManager.type_validations().get(assertion.get("type"))
+
+    if validation is None:
+      return lambda value: "Invalid type for {}".format(key)
+
+    return lambda value: validation(key, value, assertion)
+
+  @staticmethod
+  def type_validations():
+    return {
+      "string": validationManager.string_validation,
+      "enum": validationManager.enum_validation,
+      "boolean": validationManager.boolean_validation,
+      "integer": validationManager.integer_validation,
+      "date": validationManager.date_pattern_validation,
+      "datetime": validationManager.datetime_pattern_validation,
+      "float": validationManager.float_validation,
+      "array": validationManager.array_validation,
+      "time": validationManager.time_pattern_validation,
+    }
+
   @staticmethod
   def validate(data, assertions, skip=[], sanitize=True, join_msg=True):
     errors = []
@@ -168,4 +259,35 @@ class validationManager:
         raise ValueError
       return None
     except ValueError:
-      return "{} value is of incorrect time format, should be HH:MM:SS".format(value)
\ No newline at end of file
+      return "{} value is of incorrect time format, should be HH:MM:SS".format(value)
+
+  ### format validations of compiled schemas, same results as the strptime round trips above ###
+  ##############################################################################################
+
+  @staticmethod
+  def date_pattern_validation(key, value, assertion):
+    match = DATE_PATTERN.fullmatch(value) if type(value) is str else None
+    try:
+      if match is None:
+        raise ValueError
+      datetime(*map(int, match.groups()))
+      return None
+    except ValueError:
+      return "{} value is of incorrect data format, should be YYYY-MM-DD".format(value)
+
+  @staticmethod
+  def datetime_pattern_validation(key, value, assertion):
+    match = DATETIME_PATTERN.fullmatch(value) if type(value) is str else None
+    try:
+      if match is None:
+        raise ValueError
+      datetime(*map(int, match.groups()))
+      return None
+    except ValueError:
+      return "{} value is of incorrect datatime format, should be YYYY-MM-DD HH:MM:SS".format(value)
+
+  @staticmethod
+  def time_pattern_validation(key, value, assertion):
+    if type(value) is str and ('1900-01-01T' in value or TIME_PATTERN.fullmatch(value)):
+      return None
+    return "{} value is of incorrect time format, should be HH:MM:SS".format(value)
\ No newline at end of file
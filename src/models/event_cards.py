@@ -0,0 +1,68 @@
+from sqlalchemy.dialects.postgresql import JSONB
+from src.app import db, app
+from src.helpers import *
+
+class EventCard(db.Model):
+    __tablename__ = "event_cards"
+
+    # maintained by the refresh_selection_derived and refresh_event_cards_of_* triggers, never written by the API
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id'), primary_key=True)
+    sport_id = db.Column(db.String(50), nullable=False)
+    active = db.Column(db.Boolean, nullable=False)
+    scheduled_start = db.Column(db.DateTime, nullable=False)
+    card = db.Column(JSONB, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def get_board(sport_id=None, active=True, cursor=None, limit=None):
+        """
+        Get a page of the market board: one card per event holding the event, its sport and its
+        selections, in scheduled start order. The database patches a card whenever one of its rows
+        changes, so a page is a single index range read however many markets there are.
+
+        :param sport_id: [str] only the cards of this sport
+        :param active: [bool] active state of the events, defaults to True
+        :param cursor: [dict] decoded next_cursor of the previous page, {} for the first page
+        :param limit: [int] cards per page
+
+        :return [dict] cards as JSON strings, ready to be written out as they are, or None if the query failed
+        """
+        limit = limit or BOARD_PAGE_SIZE
+        cursor = cursor or {}
+
+        # a literal predicate rather than a bound one, so prepared generic plans can still use the WHERE active indexes
+        where_query = "active" if active else "NOT active"
+        params = {"limit": limit + 1}
+
+        if sport_id is not None:
+            where_query += " AND sport_id = :sport_id"
+            params["sport_id"] = sport_id
+
+        if cursor:
+            where_query += " AND (scheduled_start, event_id) > (:cursor_start, :cursor_id)"
+            params.update({"cursor_start": cursor["t"], "cursor_id": cursor["id"]})
+
+        sql = f"""SELECT scheduled_start, event_id, CAST(card AS text) FROM event_cards
+            WHERE {where_query} ORDER BY scheduled_start, event_id LIMIT :limit"""
+
+        app.logger.info('Board retrieval request received')
+        app.logger.debug(f'Request parameters - sport_id: {sport_id}, active: {active}, cursor: {cursor}, limit: {limit}')
+
+        try:
+            cards = execute_sql_query(db, sql, params, operation="select", replica=True)
+
+            if cards is None:
+                raise Exception('Failed to execute SQL query')
+
+            has_more = len(cards) > limit
+            cards = cards[:limit]
+
+            next_cursor = encode_watermark(cards[-1].scheduled_start, cards[-1].event_id) if has_more else None
+
+            app.logger.info(f'Retrieved {len(cards)} board cards')
+
+            return {"cards": [card[2] for card in cards], "meta_data": {"event_count": len(cards), "page_offset": limit, "has_more": has_more, "next_cursor": next_cursor}}
+        except Exception as e:
+            app.logger.error('Board retrieval failed')
+            app.logger.debug(f'Error details: {e}, sport_id: {sport_id}, cursor: {cursor}')
+            return None
@@ -1,9 +1,15 @@
+import time
 from datetime import datetime
 from sqlalchemy import CheckConstraint, ForeignKey, UniqueConstraint, exc, text
 from sqlalchemy.dialects.postgresql import UUID
 from src.app import db, app
 from src.models.mixins import BaseMixin
 from src.helpers import *
+from src.libs.cache import entityCache
+from src.libs.pubsub import eventHub
+from src.libs.serializer import rowSerializer
+from src.libs.metadata import modelMetadata
+from src.models.selections import Selection
 
 class Event(BaseMixin, db.Model):
     __tablename__ = "events"
@@ -47,12 +53,7 @@ class Event(BaseMixin, db.Model):
         """
         app.logger.info('Event creation initiated')
 
-        allowed_columns = list_diff(Event().columns_list(), Event()._restrict_in_creation_)
-        insert_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                insert_data[column] = data.get(column)
+        insert_data = modelMetadata.of(Event).insert_data(data)
 
         # Check if the event status is "Started"
         if data['status'] == "Started":
@@ -62,17 +63,14 @@ class Event(BaseMixin, db.Model):
 
         app.logger.debug(f'Event data to be inserted: {insert_data}')
         
-        result = Event().validate_and_sanitize(insert_data, Event()._restrict_in_creation_)
+        result = Event().validate_and_sanitize(insert_data, Event._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Event data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
             return {"error": result["errors"]}
 
         try:
-            sql = """INSERT INTO events({}) VALUES ({})""".format(
-                ', '.join(insert_data.keys()),
-                ', '.join([':' + k for k in insert_data.keys()])
-            )
+            sql = modelMetadata.of(Event).insert_sql(insert_data.keys())
 
             app.logger.info('Executing SQL query')
             operation_result = execute_sql_query(db, sql, insert_data, operation="insert")
@@ -97,7 +95,85 @@ class Event(BaseMixin, db.Model):
             return {"error": str(e)}
     
     @staticmethod
-    def get_events(event_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None):
+    def create_events(data_list, limit=None):
+        """
+        Create many events within a single transaction, skipping the ones that already exist. New events
+        beyond the limit are counted as truncated and has_more is set.
+
+        :param data_list: [list] event info dictionaries in key value pair
+        :param limit: [int] maximum number of new events to insert
+
+        :return [dict]
+        """
+        app.logger.info(f'Bulk event creation initiated for {len(data_list)} events')
+
+        metadata = modelMetadata.of(Event)
+        rows = []
+
+        for data in data_list:
+            insert_data = metadata.insert_data(data)
+
+            # Check if the event status is "Started"
+            if data.get('status') == "Started":
+                insert_data['actual_start'] = datetime.utcnow()
+
+            insert_data['active'] = False
+
+            result = Event().validate_and_sanitize(insert_data, Event._restrict_in_creation_)
+            if result.get("errors"):
+                app.logger.error('Event data validation and sanitization failed')
+                app.logger.debug(f'Validation errors: {result["errors"]}')
+                return {"error": result["errors"]}
+
+            rows.append(insert_data)
+
+        try:
+            # One set based lookup for the events that are already stored
+            sql = """SELECT url_identifier FROM events WHERE url_identifier = ANY(:url_identifiers)"""
+            existing = execute_sql_query(db, sql, {"url_identifiers": list({row["url_identifier"] for row in rows})}, operation="select")
+
+            if existing is None:
+                raise Exception('Failed to execute SQL query')
+
+            seen = {url_identifier for url_identifier, in existing}
+            new_rows = []
+
+            for row in rows:
+                if row["url_identifier"] not in seen:
+                    seen.add(row["url_identifier"])
+                    new_rows.append(row)
+
+            skipped = len(rows) - len(new_rows)
+            # new events beyond the limit are left for a later ingest of the same feed, which skips the stored ones
+            truncated = max(len(new_rows) - limit, 0) if limit else 0
+            new_rows = new_rows[:limit] if limit else new_rows
+            inserted = 0
+
+            if new_rows:
+                sql, params = bulk_insert_query("events", new_rows)
+
+                app.logger.info('Executing SQL query')
+                operation_result = execute_sql_query(db, sql, params, operation="select")
+
+                if operation_result is None:
+                    raise Exception('Failed to execute SQL query')
+
+                # rows hitting the (name, sport_id) constraint or a concurrent insert are reported as skipped
+                inserted = len(operation_result)
+                skipped += len(new_rows) - inserted
+
+            db.session.commit()
+
+            app.logger.info(f'Bulk event creation successful, inserted: {inserted}, skipped: {skipped}, truncated: {truncated}')
+            return {"inserted": inserted, "skipped": skipped, "truncated": truncated, "has_more": truncated > 0}
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Exception encountered during bulk event creation')
+            app.logger.debug(f'Exception details: {str(e)}')
+            return {"error": str(e)}
+
+    @staticmethod
+    def get_events(event_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None, cursor=None, count=None, match=None, if_none_match=None, sport_id=None):
         """
         Get events data by event_id or get paginated list of events
 
@@ -107,6 +183,11 @@ class Event(BaseMixin, db.Model):
         :param orderby: [int] sort order (-1 for descending, 1 for ascending)
         :param sortby: [str] column to sort by
         :param active: [bool] active state of the event
+        :param cursor: [dict] decoded keyset cursor, switches to cursor pagination when not None
+        :param count: [str] total count mode: exact, estimate or none
+        :param match: [str] how regex is matched against 'name' and 'url_identifier': regex, contains, prefix or exact
+        :param if_none_match: [object] the request's If-None-Match ETags, a matching list ETag returns not_modified instead of the page
+        :param sport_id: [str] only list the events of this sport
 
         :return [dict/list]
         """
@@ -114,72 +195,106 @@ class Event(BaseMixin, db.Model):
         offset = offset or 20
         orderby = orderby or "ASC"
         sortby = sortby or "name"
+        count = count or "exact"
+        match = match or "regex"
         active_query = ""
         regex_query = ""
+        filter_params = {}
 
         if active is not None:
             active = bool(active)
-            active_query = f"active = {active}"
+            # a literal predicate rather than a bound one, so prepared generic plans can still use the WHERE active indexes
+            active_query = "active" if active else "NOT active"
 
         if regex is not None:
-            regex_query = f"(name ~* '{regex}' OR url_identifier ~* '{regex}')"
+            regex_query, search_params = search_clause(["name", "url_identifier"], regex, match)
+            filter_params.update(search_params)
 
         if active_query and regex_query:
             active_query = f"WHERE {active_query} AND {regex_query}"
         elif active_query or regex_query:
             active_query = f"WHERE {active_query} {regex_query}"
 
+        if sport_id is not None:
+            # served by the (sport_id, sort column, id) indexes
+            active_query = f"{active_query} AND sport_id = :sport_id" if active_query else "WHERE sport_id = :sport_id"
+            filter_params["sport_id"] = sport_id
+
         app.logger.info('Event retrieval request received')
-        app.logger.debug(f'Request parameters - event_id: {event_id}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}, active: {active}, regex: {regex}')
+        app.logger.debug(f'Request parameters - event_id: {event_id}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}, active: {active}, regex: {regex}, sport_id: {sport_id}')
 
         try:
             if not event_id:
                 offset = int(offset)
-                page = int(page) - 1
-                sql = f"SELECT * FROM events {active_query} ORDER BY {sortby} {orderby} LIMIT {offset} OFFSET {page * offset}"
-                events = execute_sql_query(db, sql, operation="select")
+                meta_data = {"page_offset": offset, "count_mode": count}
+
+                if cursor is not None:
+                    sortby = cursor.get("s", sortby)
+                    orderby = cursor.get("o", orderby)
+                    keyset_query, order_query, keyset_params, _ = keyset_clause(cursor, sortby, orderby)
+
+                    where_query = active_query
+                    if keyset_query:
+                        where_query = f"{active_query} AND {keyset_query}" if active_query else f"WHERE {keyset_query}"
+
+                    page_query = f"{where_query} ORDER BY {order_query} LIMIT :limit"
+                    page_params = {**filter_params, **keyset_params, "limit": offset + 1}
+                else:
+                    page = int(page) - 1
+                    page_query = f"{active_query} ORDER BY {order_clause(sortby, orderby)} LIMIT :limit OFFSET :offset"
+                    page_params = {**filter_params, "limit": offset, "offset": page * offset}
+
+                    meta_data["page_number"] = page + 1
+
+                # the ETag is derived from a watermark of every row of the filter, a client that holds it
+                # skips the count and the page query
+                watermark = list_watermark(db, "events", active_query, filter_params, replica=True)
+                etag = make_etag("events", page_query, page_params, count, *watermark)
+                if if_none_match and if_none_match.contains_weak(etag):
+                    app.logger.info('Events page not modified')
+                    return {"etag": etag, "not_modified": True}
+
+                # an exact count is the watermark's
+                total_events = watermark[0] if count == "exact" else count_rows(db, "events", active_query, filter_params, count, replica=True)
+
+                sql = f"SELECT {rowSerializer.of(Event.__table__).select} FROM events {page_query}"
+                events = execute_sql_query(db, sql, page_params, operation="select", replica=True)
+
+                if events is None:
+                    raise Exception('Failed to execute SQL query')
+
+                if cursor is not None:
+                    events, next_cursor, prev_cursor = keyset_page(events, cursor, sortby, orderby, offset)
+                    meta_data.update({"next_cursor": next_cursor, "prev_cursor": prev_cursor})
     
                 if not events:
-                    return {"events": [], "meta_data": {"event_count": 0, "page_number": page + 1, "page_offset": offset}}
-
-                events_dict = []
-                for event in events:
-                    scheduled_start = datetime_to_str(event[7], True) if event[7] else None
-                    actual_start = datetime_to_str(event[8], True) if event[8] else None
-                    created_at = datetime_to_str(event[9], True) if event[9] else None
-                    updated_at = datetime_to_str(event[10], True) if event[10] else None
-                    
-                    event_dict = dict(zip(("id", "name", "url_identifier", "active", "type", "sport_id", "status", "scheduled_start", "actual_start", "created_at", "updated_at"), 
-                        (event[0], event[1], event[2], event[3], event[4], event[5], event[6], scheduled_start, actual_start, created_at, updated_at)))
-
-                    event_dict = {k: v for k, v in event_dict.items() if v is not None}
-                    
-                    events_dict.append(event_dict)
-
-                count_sql = f"SELECT COUNT(*) FROM events {active_query}"
-                total_events = execute_sql_query(db, count_sql, operation="select")
-                total_events = total_events[0][0] if total_events else 0
+                    return {"events": [], "meta_data": {"event_count": 0, **meta_data}, "etag": etag}
+
+                events_dict = rowSerializer.of(Event.__table__).many(events)
 
                 app.logger.info(f'Retrieved {total_events} events')
 
-                return {"events": events_dict, "meta_data": {"event_count": total_events, "page_number": page + 1, "page_offset": offset}}
+                return {"events": events_dict, "meta_data": {"event_count": total_events, **meta_data}, "etag": etag}
 
             else:
-                sql = f"SELECT * FROM events WHERE id = :id"
-                event = execute_sql_query(db, sql, {"id": event_id}, operation="select", fetchone=True)
+                event_dict = entityCache.get("event", event_id)
+                if event_dict is not None:
+                    app.logger.info(f'Retrieved event with id {event_id} from cache')
+                    return event_dict
+
+                # taken before the read, a write committed in between keeps the row read out of the cache
+                version = entityCache.version("event", event_id)
+
+                sql = f"SELECT {rowSerializer.of(Event.__table__).select} FROM events WHERE id = :id"
+                # the cache is only filled from the primary, a lagging replica would put back rows a write just invalidated
+                event = execute_sql_query(db, sql, {"id": event_id}, operation="select", fetchone=True, replica=CACHE_BACKEND == "none")
 
                 if not event:
                     return None
-                
-                scheduled_start = datetime_to_str(event[7], True) if event[7] else None
-                actual_start = datetime_to_str(event[8], True) if event[8] else None
-                created_at = datetime_to_str(event[9], True) if event[9] else None
-                updated_at = datetime_to_str(event[10], True) if event[10] else None
 
-                event_dict = dict(zip(("id", "name", "url_identifier", "active", "type", "sport_id", "status", "scheduled_start", "actual_start", "created_at", "updated_at"), 
-                    (event[0], event[1], event[2], event[3], event[4], event[5], event[6], scheduled_start, actual_start, created_at, updated_at)))
+                event_dict = rowSerializer.of(Event.__table__).one(event)
 
-                event_dict = {k: v for k, v in event_dict.items() if v is not None}
+                entityCache.set("event", event_id, event_dict, version)
 
                 app.logger.info(f'Retrieved event with id {event_id}')
 
@@ -190,6 +305,144 @@ class Event(BaseMixin, db.Model):
             app.logger.debug(f'Error details: {e}, event_id: {event_id}, page: {page}, offset: {offset}')
             return None
     
+    @staticmethod
+    def get_an_event_with_selections(event_id):
+        """
+        Get an event together with its selections in one joined query, for ?expand=selections
+
+        :param event_id: [str] events table primary key
+
+        :return [dict] event with a selections list, None if there is no such event
+        """
+        event_serializer = rowSerializer.of(Event.__table__)
+        selection_serializer = rowSerializer.of(Selection.__table__)
+        width = len(event_serializer.columns)
+
+        event_columns = ", ".join(f"e.{column}" for column in event_serializer.columns)
+        selection_columns = ", ".join(f"s.{column}" for column in selection_serializer.columns)
+
+        sql = f"""SELECT {event_columns}, {selection_columns} FROM events e
+            LEFT JOIN selections s ON s.event_id = e.id WHERE e.id = :id ORDER BY s.name, s.id"""
+
+        app.logger.info('Event with selections retrieval request received')
+        app.logger.debug(f'Request parameters - event_id: {event_id}')
+
+        try:
+            rows = execute_sql_query(db, sql, {"id": event_id}, operation="select", replica=True)
+
+            if not rows:
+                return None
+
+            # not cached, the entity cache is invalidated per entity and a selection write would leave it stale
+            event_dict = event_serializer.one(rows[0][:width])
+            event_dict["selections"] = [selection_serializer.one(row[width:]) for row in rows if row[width] is not None]
+
+            app.logger.info(f'Retrieved event with id {event_id} and {len(event_dict["selections"])} selections')
+
+            return event_dict
+        except Exception as e:
+            app.logger.error('Event with selections retrieval failed')
+            app.logger.debug(f'Error details: {e}, event_id: {event_id}')
+            return None
+
+    @staticmethod
+    def export_events(updated_since=None):
+        """
+        Stream every event in id order through a server-side cursor, for full-table exports
+
+        :param updated_since: [datetime] only events created or updated at or after this time
+
+        :return [generator] lists of at most EXPORT_BATCH_SIZE event dictionaries
+        """
+        serializer = rowSerializer.of(Event.__table__)
+        where_query = ""
+        params = {}
+
+        if updated_since is not None:
+            where_query = "WHERE coalesce(updated_at, created_at) >= :updated_since"
+            params["updated_since"] = updated_since
+
+        app.logger.info('Event export started')
+        app.logger.debug(f'Request parameters - updated_since: {updated_since}')
+
+        sql = f"SELECT {serializer.select} FROM events {where_query} ORDER BY id"
+        exported = 0
+
+        try:
+            for rows in stream_rows(db, sql, params, EXPORT_BATCH_SIZE):
+                exported += len(rows)
+                yield serializer.many(rows)
+        except Exception as e:
+            # the response has already started, streamify ends it with the failure
+            app.logger.error('Event export failed')
+            app.logger.debug(f'Error details: {e}, exported: {exported}')
+            raise
+
+        app.logger.info(f'Event export finished, exported: {exported}')
+
+    @staticmethod
+    def get_event_changes(since=None, limit=None, wait=None):
+        """
+        Get the events changed after a change feed position, oldest change first.
+        When nothing changed yet, keeps polling the change position index until wait runs out.
+
+        :param since: [dict] decoded change position, {} or None to start from the oldest change
+        :param limit: [int] maximum number of events to return
+        :param wait: [int] seconds to long-poll for a change when there is none
+
+        :return [dict]
+        """
+        since = since or {}
+        limit = int(limit or 100)
+        wait = int(wait or 0)
+        serializer = rowSerializer.of(Event.__table__)
+
+        # rows of transactions still running, or younger than one still running, are held back: the
+        # set_change_position trigger numbers writes as they happen, not as they commit, so an older
+        # transaction committing later would land behind a position already handed out. The price is
+        # that a write transaction left open anywhere on the server stalls the feed until it ends.
+        where_query = "change_xid < (SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint)"
+        params = {"limit": limit + 1}
+
+        if since:
+            where_query += " AND (change_xid, change_seq) > (:since_xid, :since_seq)"
+            params.update({"since_xid": since["x"], "since_seq": since["s"]})
+
+        sql = f"""SELECT {serializer.select}, change_xid, change_seq FROM events
+            WHERE {where_query} ORDER BY change_xid, change_seq LIMIT :limit"""
+
+        app.logger.info('Event changes request received')
+        app.logger.debug(f'Request parameters - since: {since}, limit: {limit}, wait: {wait}')
+
+        try:
+            deadline = time.monotonic() + wait
+
+            while True:
+                events = execute_sql_query(db, sql, params, operation="select")
+
+                if events is None:
+                    raise Exception('Failed to execute SQL query')
+
+                if events or time.monotonic() >= deadline:
+                    break
+
+                # don't sit on a pooled connection while waiting
+                db.session.rollback()
+                time.sleep(max(0, min(CHANGES_POLL_INTERVAL, deadline - time.monotonic())))
+
+            has_more = len(events) > limit
+            events = events[:limit]
+
+            next_since = encode_change_position(events[-1].change_xid, events[-1].change_seq) if events else (encode_change_position(since["x"], since["s"]) if since else "")
+
+            app.logger.info(f'Retrieved {len(events)} changed events')
+
+            return {"events": serializer.many(events), "meta_data": {"event_count": len(events), "has_more": has_more, "next_since": next_since}}
+        except Exception as e:
+            app.logger.error('Event changes retrieval failed')
+            app.logger.debug(f'Error details: {e}, since: {since}')
+            return None
+
     @staticmethod
     def update_an_event(event_id, data):
         """
@@ -214,16 +467,11 @@ class Event(BaseMixin, db.Model):
         if existing_event.status == "Started" and data.get("status") != "Started":
             data["actual_start"] = None
 
-        allowed_columns = list_diff(Event().columns_list(), Event()._restrict_in_update_)
-        update_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                update_data[column] = data.get(column)
+        update_data = modelMetadata.of(Event).update_data(data)
 
         app.logger.debug(f'Event data to be updated: {update_data}')
 
-        result = Event().validate_and_sanitize(update_data, Event()._restrict_in_update_)
+        result = Event().validate_and_sanitize(update_data, Event._restrict_in_update_)
         if result.get("errors"):
             app.logger.error('Event data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
@@ -244,7 +492,11 @@ class Event(BaseMixin, db.Model):
                 if not operation_result:
                     raise Exception('Failed to execute SQL query')
 
+                changes = {k: datetime_to_str(v, True) if isinstance(v, datetime) else v for k, v in update_data.items() if k != "id"}
+                eventHub.publish(f"event:{event_id}", {"type": "event", "id": event_id, **changes}, db.session)
+
                 db.session.commit()
+                entityCache.invalidate("event", event_id)
 
                 app.logger.info('Event update successful')
                 return {"message": f"Event successfully updated with id={event_id}"}
@@ -279,6 +531,7 @@ class Event(BaseMixin, db.Model):
                 raise Exception('Failed to execute SQL query')
 
             db.session.commit()
+            entityCache.invalidate("event", event_id)
 
             app.logger.info('Event deletion successful')
             return {"message": f"Event successfully deleted with id={event_id}"}
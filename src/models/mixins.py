@@ -7,15 +7,23 @@ import datetime
 from sqlalchemy.orm import class_mapper, ColumnProperty
 from src.helpers import *
 from src.libs.validation_manager import validationManager
+from src.libs.metadata import modelMetadata
 
 class BaseMixin(object):
 
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+
+    # compile the model's _validations_ once, when the model class is defined
+    if hasattr(cls, "_validations_"):
+      cls._validator_ = validationManager.compile(cls._validations_)
+
   def validate_and_sanitize(self, data, skip=[]):
-    if not hasattr(self, "_validations_"):
+    if not hasattr(self, "_validator_"):
       return {}
 
     try:
-      result = validationManager.validate(data, self._validations_, skip, True)
+      result = self._validator_.validate(data, skip, True)
       if not result["errors"]:
         for  k, v in result.get("data").items():
           # reset the value with sanitized data
@@ -64,9 +72,4 @@ class BaseMixin(object):
 #     return result
 
   def columns_list(self):
-    columns = []
-    for prop in class_mapper(self.__class__).iterate_properties:
-      if isinstance(prop, ColumnProperty):
-        columns.append(prop.key)
-
-    return columns
+    return list(modelMetadata.of(self.__class__).columns)
@@ -1,8 +1,13 @@
+import time
 from datetime import datetime
 from sqlalchemy import CheckConstraint, ForeignKey, UniqueConstraint, exc, DECIMAL
 from src.app import db, app
 from src.models.mixins import BaseMixin
 from src.helpers import *
+from src.libs.cache import entityCache
+from src.libs.pubsub import eventHub
+from src.libs.serializer import rowSerializer
+from src.libs.metadata import modelMetadata
 
 class Selection(BaseMixin, db.Model):
     __tablename__ = "selections"
@@ -31,6 +36,12 @@ class Selection(BaseMixin, db.Model):
     _restrict_in_creation_  = ["id", "created_at", "updated_at"]
     _restrict_in_update_    = ["id", "event_id", "created_at", "updated_at"]
 
+    # fields a batch update may change, see update_selections
+    _batch_columns_ = ["price", "active", "outcome"]
+
+    # returned by selection writes so the cached event and sport whose active flag the trigger may recompute can be dropped
+    _returning_parents_ = "id, active, event_id, (SELECT sport_id FROM events WHERE id = selections.event_id)"
+
     @staticmethod
     def create_a_selection(data):
         """
@@ -42,34 +53,27 @@ class Selection(BaseMixin, db.Model):
         """
         app.logger.info('Selection creation initiated')
 
-        allowed_columns = list_diff(Selection().columns_list(), Selection()._restrict_in_creation_)
-        insert_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                insert_data[column] = data.get(column)
+        insert_data = modelMetadata.of(Selection).insert_data(data)
 
         app.logger.debug(f'Selection data to be inserted: {insert_data}')
         
-        result = Selection().validate_and_sanitize(insert_data, Selection()._restrict_in_creation_)
+        result = Selection().validate_and_sanitize(insert_data, Selection._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Selection data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
             return {"error": result["errors"]}
 
         try:
-            sql = """INSERT INTO selections({}) VALUES ({})""".format(
-                ', '.join(insert_data.keys()),
-                ', '.join([':' + k for k in insert_data.keys()])
-            )
+            sql = modelMetadata.of(Selection).insert_sql(insert_data.keys(), Selection._returning_parents_)
 
             app.logger.info('Executing SQL query')
-            operation_result = execute_sql_query(db, sql, insert_data, operation="insert")
+            operation_result = execute_sql_query(db, sql, insert_data, operation="select")
            
             if not operation_result:
                 raise Exception('Failed to execute SQL query')
 
             db.session.commit()
+            Selection.invalidate_cached(operation_result)
 
             app.logger.info('Selection creation successful')
             return {"message": "Selection successfully created"}
@@ -86,7 +90,87 @@ class Selection(BaseMixin, db.Model):
             return {"error": str(e)}
 
     @staticmethod
-    def get_selections(selection_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None):
+    def create_selections(data_list, limit=None):
+        """
+        Create many selection entries in the database within a single transaction.
+        Selections that already exist for their event are skipped.
+
+        :param data_list: [list] dictionaries containing the data of the new selections.
+        :param limit: [int] maximum number of new selections to insert, optional.
+
+        :return [dict]: Returns a dictionary containing the inserted, skipped and truncated counts, with has_more set when
+            the limit left new selections out, or an error message.
+        """
+        app.logger.info(f'Bulk selection creation initiated for {len(data_list)} selections')
+
+        metadata = modelMetadata.of(Selection)
+        rows = []
+
+        for data in data_list:
+            insert_data = metadata.insert_data(data)
+
+            result = Selection().validate_and_sanitize(insert_data, Selection._restrict_in_creation_)
+            if result.get("errors"):
+                app.logger.error('Selection data validation and sanitization failed')
+                app.logger.debug(f'Validation errors: {result["errors"]}')
+                return {"error": result["errors"]}
+
+            rows.append(insert_data)
+
+        try:
+            # One set based lookup for the selections that are already stored, keyed on (event_id, name)
+            # so it only probes the unique index for the pairs of this batch
+            pairs = list({(str(row["event_id"]), row["name"]) for row in rows})
+            sql = """SELECT event_id, name FROM selections
+                WHERE (event_id, name) IN (SELECT * FROM unnest(CAST(:event_ids AS INT[]), CAST(:names AS TEXT[])))"""
+            existing = execute_sql_query(db, sql, {"event_ids": [pair[0] for pair in pairs], "names": [pair[1] for pair in pairs]}, operation="select")
+
+            if existing is None:
+                raise Exception('Failed to execute SQL query')
+
+            seen = {(str(event_id), name) for event_id, name in existing}
+            new_rows = []
+
+            for row in rows:
+                key = (str(row["event_id"]), row["name"])
+                if key not in seen:
+                    seen.add(key)
+                    new_rows.append(row)
+
+            skipped = len(rows) - len(new_rows)
+            # counted so has_more tells the caller the feed holds more new selections
+            truncated = max(len(new_rows) - limit, 0) if limit else 0
+            new_rows = new_rows[:limit] if limit else new_rows
+            inserted = 0
+
+            if new_rows:
+                sql, params = bulk_insert_query("selections", new_rows, Selection._returning_parents_)
+
+                app.logger.info('Executing SQL query')
+                operation_result = execute_sql_query(db, sql, params, operation="select")
+
+                if operation_result is None:
+                    raise Exception('Failed to execute SQL query')
+
+                # rows lost to a concurrent insert are reported as skipped as well
+                inserted = len(operation_result)
+                skipped += len(new_rows) - inserted
+
+            db.session.commit()
+
+            if new_rows:
+                Selection.invalidate_cached(operation_result)
+
+            app.logger.info(f'Bulk selection creation successful, inserted: {inserted}, skipped: {skipped}, truncated: {truncated}')
+            return {"inserted": inserted, "skipped": skipped, "truncated": truncated, "has_more": truncated > 0}
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Exception encountered during bulk selection creation')
+            app.logger.debug(f'Exception details: {str(e)}')
+            return {"error": str(e)}
+
+    @staticmethod
+    def get_selections(selection_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None, cursor=None, count=None, match=None, if_none_match=None, event_id=None):
         """
         Get selections data by selection_id or get paginated list of selections.
 
@@ -97,6 +181,11 @@ class Selection(BaseMixin, db.Model):
         :param sortby: [str] column to sort by, defaults to "name".
         :param active: [bool] active state of the selection, optional.
         :param regex: [str] regex pattern to search for in 'name', optional.
+        :param cursor: [dict] decoded keyset cursor, switches to cursor pagination when not None, optional.
+        :param count: [str] total count mode ("exact", "estimate" or "none"), defaults to "exact".
+        :param match: [str] how regex is matched against 'name' ("regex", "contains", "prefix" or "exact"), defaults to "regex".
+        :param if_none_match: [object] the request's If-None-Match ETags, a matching list ETag returns not_modified instead of the page, optional.
+        :param event_id: [str] only list the selections of this event, optional.
 
         :return [dict/list]: Returns either a list of dictionaries representing each selection, or a single dictionary if a selection_id was given.
         """
@@ -104,68 +193,106 @@ class Selection(BaseMixin, db.Model):
         offset = offset or 20
         orderby = orderby or "ASC"
         sortby = sortby or "name"
+        count = count or "exact"
+        match = match or "regex"
         active_query = ""
         regex_query = ""
+        filter_params = {}
 
         if active is not None:
             active = bool(active)
-            active_query = f"active = {active}"
+            # a literal predicate rather than a bound one, so prepared generic plans can still use the WHERE active indexes
+            active_query = "active" if active else "NOT active"
 
         if regex is not None:
-            regex_query = f"(name ~* '{regex}')"
+            regex_query, search_params = search_clause(["name"], regex, match)
+            filter_params.update(search_params)
 
         if active_query and regex_query:
             active_query = f"WHERE {active_query} AND {regex_query}"
         elif active_query or regex_query:
             active_query = f"WHERE {active_query} {regex_query}"
 
+        if event_id is not None:
+            # served by the (event_id, sort column, id) indexes
+            active_query = f"{active_query} AND event_id = :event_id" if active_query else "WHERE event_id = :event_id"
+            filter_params["event_id"] = event_id
+
         app.logger.info('Selection retrieval request received')
-        app.logger.debug(f'Request parameters - selection_id: {selection_id}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}, active: {active}, regex: {regex}')
+        app.logger.debug(f'Request parameters - selection_id: {selection_id}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}, active: {active}, regex: {regex}, event_id: {event_id}')
 
         try:
             if not selection_id:
                 offset = int(offset)
-                page = int(page) - 1
-                sql = f"SELECT * FROM selections {active_query} ORDER BY {sortby} {orderby} LIMIT {offset} OFFSET {page * offset}"
-                selections = execute_sql_query(db, sql, operation="select")
-                
-                if not selections:
-                    return {"selections": [], "meta_data": {"selection_count": 0, "page_number": page + 1, "page_offset": offset}}
+                meta_data = {"page_offset": offset, "count_mode": count}
+
+                if cursor is not None:
+                    sortby = cursor.get("s", sortby)
+                    orderby = cursor.get("o", orderby)
+                    keyset_query, order_query, keyset_params, _ = keyset_clause(cursor, sortby, orderby)
+
+                    where_query = active_query
+                    if keyset_query:
+                        where_query = f"{active_query} AND {keyset_query}" if active_query else f"WHERE {keyset_query}"
+
+                    page_query = f"{where_query} ORDER BY {order_query} LIMIT :limit"
+                    page_params = {**filter_params, **keyset_params, "limit": offset + 1}
+                else:
+                    page = int(page) - 1
+                    page_query = f"{active_query} ORDER BY {order_clause(sortby, orderby)} LIMIT :limit OFFSET :offset"
+                    page_params = {**filter_params, "limit": offset, "offset": page * offset}
+
+                    meta_data["page_number"] = page + 1
 
-                selections_dict = []
-                for selection in selections:
-                    created_at = datetime_to_str(selection[6], True) if selection[6] else None
-                    updated_at = datetime_to_str(selection[7], True) if selection[7] else None
+                # the ETag is derived from a watermark of every row of the filter, a client that holds it
+                # skips the count and the page query
+                watermark = list_watermark(db, "selections", active_query, filter_params, replica=True)
+                etag = make_etag("selections", page_query, page_params, count, *watermark)
+                if if_none_match and if_none_match.contains_weak(etag):
+                    app.logger.info('Selections page not modified')
+                    return {"etag": etag, "not_modified": True}
 
-                    selection_dict = dict(zip(("id", "name", "event_id", "price", "active", "outcome", "created_at", "updated_at"), 
-                        (selection[0], selection[1], selection[2], selection[3], selection[4], selection[5], created_at, updated_at)))
+                # an exact count is the watermark's
+                total_selections = watermark[0] if count == "exact" else count_rows(db, "selections", active_query, filter_params, count, replica=True)
 
-                    selection_dict = {k: v for k, v in selection_dict.items() if v is not None}
-                    
-                    selections_dict.append(selection_dict)
+                sql = f"SELECT {rowSerializer.of(Selection.__table__).select} FROM selections {page_query}"
+                selections = execute_sql_query(db, sql, page_params, operation="select", replica=True)
 
-                count_sql = f"SELECT COUNT(*) FROM selections {active_query}"
-                total_selections = execute_sql_query(db, count_sql, operation="select")
-                total_selections = total_selections[0][0] if total_selections else 0
+                if selections is None:
+                    raise Exception('Failed to execute SQL query')
+
+                if cursor is not None:
+                    selections, next_cursor, prev_cursor = keyset_page(selections, cursor, sortby, orderby, offset)
+                    meta_data.update({"next_cursor": next_cursor, "prev_cursor": prev_cursor})
+                
+                if not selections:
+                    return {"selections": [], "meta_data": {"selection_count": 0, **meta_data}, "etag": etag}
+
+                selections_dict = rowSerializer.of(Selection.__table__).many(selections)
 
                 app.logger.info(f'Retrieved {total_selections} selections')
 
-                return {"selections": selections_dict, "meta_data": {"selection_count": total_selections, "page_number": page + 1, "page_offset": offset}}
+                return {"selections": selections_dict, "meta_data": {"selection_count": total_selections, **meta_data}, "etag": etag}
 
             else:
-                sql = f"SELECT * FROM selections WHERE id = :id"
-                selection = execute_sql_query(db, sql, {"id": selection_id}, operation="select", fetchone=True)
+                selection_dict = entityCache.get("selection", selection_id)
+                if selection_dict is not None:
+                    app.logger.info(f'Retrieved selection with id {selection_id} from cache')
+                    return selection_dict
+
+                # taken before the read, a write committed in between keeps the row read out of the cache
+                version = entityCache.version("selection", selection_id)
+
+                sql = f"SELECT {rowSerializer.of(Selection.__table__).select} FROM selections WHERE id = :id"
+                # the cache is only filled from the primary, a lagging replica would put back rows a write just invalidated
+                selection = execute_sql_query(db, sql, {"id": selection_id}, operation="select", fetchone=True, replica=CACHE_BACKEND == "none")
 
                 if not selection:
                     return None
 
-                created_at = datetime_to_str(selection[6], True) if selection[6] else None
-                updated_at = datetime_to_str(selection[7], True) if selection[7] else None
-
-                selection_dict = dict(zip(("id", "name", "event_id", "price", "active", "outcome", "created_at", "updated_at"), 
-                    (selection[0], selection[1], selection[2], selection[3], selection[4], selection[5], created_at, updated_at)))
+                selection_dict = rowSerializer.of(Selection.__table__).one(selection)
 
-                selection_dict = {k: v for k, v in selection_dict.items() if v is not None}
+                entityCache.set("selection", selection_id, selection_dict, version)
 
                 app.logger.info(f'Retrieved selection with id {selection_id}')
 
@@ -176,6 +303,104 @@ class Selection(BaseMixin, db.Model):
             app.logger.debug(f'Error details: {e}, selection_id: {selection_id}, page: {page}, offset: {offset}')
             return None
 
+    @staticmethod
+    def export_selections(updated_since=None):
+        """
+        Stream every selection in id order through a server-side cursor, for full-table exports.
+
+        :param updated_since: [datetime] only selections created or updated at or after this time, optional.
+
+        :return [generator]: Yields lists of at most EXPORT_BATCH_SIZE selection dictionaries.
+        """
+        serializer = rowSerializer.of(Selection.__table__)
+        where_query = ""
+        params = {}
+
+        if updated_since is not None:
+            where_query = "WHERE coalesce(updated_at, created_at) >= :updated_since"
+            params["updated_since"] = updated_since
+
+        app.logger.info('Selection export started')
+        app.logger.debug(f'Request parameters - updated_since: {updated_since}')
+
+        sql = f"SELECT {serializer.select} FROM selections {where_query} ORDER BY id"
+        exported = 0
+
+        try:
+            for rows in stream_rows(db, sql, params, EXPORT_BATCH_SIZE):
+                exported += len(rows)
+                yield serializer.many(rows)
+        except Exception as e:
+            # the response has already started, streamify ends it with the failure
+            app.logger.error('Selection export failed')
+            app.logger.debug(f'Error details: {e}, exported: {exported}')
+            raise
+
+        app.logger.info(f'Selection export finished, exported: {exported}')
+
+    @staticmethod
+    def get_selection_changes(since=None, limit=None, wait=None):
+        """
+        Get the selections changed after a change feed position, oldest change first.
+        When nothing changed yet, keeps polling the change position index until wait runs out.
+
+        :param since: [dict] decoded change position, {} or None to start from the oldest change.
+        :param limit: [int] maximum number of selections to return, defaults to 100.
+        :param wait: [int] seconds to long-poll for a change when there is none, defaults to 0.
+
+        :return [dict]: Returns the changed selections and the position to resume from, or None on failure.
+        """
+        since = since or {}
+        limit = int(limit or 100)
+        wait = int(wait or 0)
+        serializer = rowSerializer.of(Selection.__table__)
+
+        # rows of transactions still running, or younger than one still running, are held back: the
+        # set_change_position trigger numbers writes as they happen, not as they commit, so an older
+        # transaction committing later would land behind a position already handed out. The price is
+        # that a write transaction left open anywhere on the server stalls the feed until it ends.
+        where_query = "change_xid < (SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint)"
+        params = {"limit": limit + 1}
+
+        if since:
+            where_query += " AND (change_xid, change_seq) > (:since_xid, :since_seq)"
+            params.update({"since_xid": since["x"], "since_seq": since["s"]})
+
+        sql = f"""SELECT {serializer.select}, change_xid, change_seq FROM selections
+            WHERE {where_query} ORDER BY change_xid, change_seq LIMIT :limit"""
+
+        app.logger.info('Selection changes request received')
+        app.logger.debug(f'Request parameters - since: {since}, limit: {limit}, wait: {wait}')
+
+        try:
+            deadline = time.monotonic() + wait
+
+            while True:
+                selections = execute_sql_query(db, sql, params, operation="select")
+
+                if selections is None:
+                    raise Exception('Failed to execute SQL query')
+
+                if selections or time.monotonic() >= deadline:
+                    break
+
+                # don't sit on a pooled connection while waiting
+                db.session.rollback()
+                time.sleep(max(0, min(CHANGES_POLL_INTERVAL, deadline - time.monotonic())))
+
+            has_more = len(selections) > limit
+            selections = selections[:limit]
+
+            next_since = encode_change_position(selections[-1].change_xid, selections[-1].change_seq) if selections else (encode_change_position(since["x"], since["s"]) if since else "")
+
+            app.logger.info(f'Retrieved {len(selections)} changed selections')
+
+            return {"selections": serializer.many(selections), "meta_data": {"selection_count": len(selections), "has_more": has_more, "next_since": next_since}}
+        except Exception as e:
+            app.logger.error('Selection changes retrieval failed')
+            app.logger.debug(f'Error details: {e}, since: {since}')
+            return None
+
     @staticmethod
     def update_a_selection(selection_id, data):
         """
@@ -189,16 +414,11 @@ class Selection(BaseMixin, db.Model):
         app.logger.info(f'Update selection request received for selection id: {selection_id}')
         app.logger.debug(f'Request data: {data}')
         
-        allowed_columns = list_diff(Selection().columns_list(), Selection()._restrict_in_update_)
-        update_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                update_data[column] = data.get(column)
+        update_data = modelMetadata.of(Selection).update_data(data)
 
         app.logger.debug(f'Selection data to be updated: {update_data}')
 
-        result = Selection().validate_and_sanitize(update_data, Selection()._restrict_in_update_)
+        result = Selection().validate_and_sanitize(update_data, Selection._restrict_in_update_)
         if result.get("errors"):
             app.logger.error('Selection data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
@@ -211,15 +431,19 @@ class Selection(BaseMixin, db.Model):
                 set_query = ', '.join([f"{column} = :{column}" for column in update_data.keys()])
                 update_data["id"] = selection_id
 
-                sql = f"""UPDATE selections SET {set_query} WHERE id = :id"""
+                sql = f"""UPDATE selections SET {set_query} WHERE id = :id RETURNING {Selection._returning_parents_}"""
                 
                 app.logger.info('Executing SQL query')
-                operation_result = execute_sql_query(db, sql, update_data, operation="update")
+                operation_result = execute_sql_query(db, sql, update_data, operation="select")
                 
-                if not operation_result:
+                if operation_result is None:
                     raise Exception('Failed to execute SQL query')
 
+                Selection.publish_update(operation_result, update_data)
+
                 db.session.commit()
+                # price only updates leave the event and sport active flags alone
+                Selection.invalidate_cached(operation_result, "active" in update_data)
 
                 app.logger.info('Selection update successful')
                 return {"message": f"Selection successfully updated with id={selection_id}"}
@@ -233,6 +457,105 @@ class Selection(BaseMixin, db.Model):
             app.logger.info('No valid data found for update')
             return {"error": "No valid data found for update"}
 
+    @staticmethod
+    def update_selections(items):
+        """
+        Update the price, active state and outcome of many selections with a single UPDATE in one transaction.
+        Every item is checked against _validations_ for the fields it supplies, invalid items are left out.
+
+        :param items: [list] dictionaries with the selection id and any of price, active and outcome.
+
+        :return [dict]: Returns per item results in request order with the updated and failed counts, or an error message.
+        """
+        app.logger.info(f'Batch selection update initiated for {len(items)} selections')
+
+        results = []
+        updates = {}
+
+        for item in items:
+            selection_id = item.get("id") if isinstance(item, dict) else None
+
+            if type(selection_id) is str and selection_id.isdigit():
+                selection_id = int(selection_id)
+
+            if type(selection_id) is not int:
+                results.append({"id": selection_id, "error": "id must be a selection id"})
+                continue
+
+            if selection_id in updates:
+                results.append({"id": selection_id, "error": "Selection is updated more than once in this batch"})
+                continue
+
+            update_data = {column: item[column] for column in Selection._batch_columns_ if column in item}
+
+            if not update_data:
+                results.append({"id": selection_id, "error": "No valid update fields provided"})
+                continue
+
+            # fields an item leaves out are kept as they are, so only the supplied ones are required
+            skip = [column for column in Selection._validations_ if column not in update_data]
+            result = Selection._validator_.validate(update_data, skip, True)
+            if result["errors"]:
+                results.append({"id": selection_id, "error": result["errors"]})
+                continue
+
+            updates[selection_id] = result["data"]
+            results.append({"id": selection_id})
+
+        if not updates:
+            app.logger.info('No valid selection updates in batch')
+            return {"results": results, "updated": 0, "failed": len(results)}
+
+        try:
+            updated_at = datetime.utcnow()
+            set_query = ', '.join([f"{column} = CASE WHEN v.item ? '{column}' THEN v.new_{column} ELSE selections.{column} END" for column in Selection._batch_columns_])
+            new_columns = ', '.join([f"r.{column} AS new_{column}" for column in Selection._batch_columns_])
+
+            # jsonb_populate_record types every value like the selections column it goes to, enums included
+            sql = f"""UPDATE selections SET {set_query}, updated_at = :updated_at
+                FROM (
+                    SELECT item, r.id AS item_id, {new_columns}
+                    FROM jsonb_array_elements(CAST(:items AS jsonb)) AS item, jsonb_populate_record(NULL::selections, item) AS r
+                ) AS v
+                WHERE selections.id = v.item_id
+                RETURNING {Selection._returning_parents_}"""
+
+            payload = ujson.dumps([{"id": selection_id, **update_data} for selection_id, update_data in updates.items()])
+
+            app.logger.info('Executing SQL query')
+            operation_result = execute_sql_query(db, sql, {"items": payload, "updated_at": updated_at}, operation="select")
+
+            if operation_result is None:
+                raise Exception('Failed to execute SQL query')
+
+            for row in operation_result:
+                Selection.publish_update([row], {**updates[row[0]], "updated_at": updated_at})
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Exception encountered during batch selection update')
+            app.logger.debug(f'Exception details: {str(e)}')
+            return {"error": str(e)}
+
+        updated = {row[0]: row for row in operation_result}
+
+        for row in updated.values():
+            changes = updates[row[0]]
+            Selection.invalidate_cached([row], "active" in changes)
+
+        for result in results:
+            if "error" not in result:
+                if result["id"] in updated:
+                    result["message"] = "Selection successfully updated"
+                else:
+                    result["error"] = "No such selection found"
+
+        failed = sum(1 for result in results if "error" in result)
+
+        app.logger.info(f'Batch selection update successful, updated: {len(updated)}, failed: {failed}')
+        return {"results": results, "updated": len(updated), "failed": failed}
+
     @staticmethod
     def delete_selection_permanently(selection_id):
         """
@@ -245,15 +568,16 @@ class Selection(BaseMixin, db.Model):
         app.logger.info(f'Delete selection request received for selection id: {selection_id}')
 
         try:
-            sql = """DELETE FROM selections WHERE id = :id"""
+            sql = f"""DELETE FROM selections WHERE id = :id RETURNING {Selection._returning_parents_}"""
             
             app.logger.info('Executing SQL query')
-            operation_result = execute_sql_query(db, sql, {"id": selection_id}, operation="delete")
+            operation_result = execute_sql_query(db, sql, {"id": selection_id}, operation="select")
             
-            if not operation_result:
+            if operation_result is None:
                 raise Exception('Failed to execute SQL query')
 
             db.session.commit()
+            Selection.invalidate_cached(operation_result)
 
             app.logger.info('Selection deletion successful')
             return {"message": f"Selection successfully deleted with id={selection_id}"}
@@ -261,4 +585,38 @@ class Selection(BaseMixin, db.Model):
             db.session.rollback()
             app.logger.error('Exception encountered during selection deletion')
             app.logger.debug(f'Exception details: {str(e)}')
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+
+    @staticmethod
+    def invalidate_cached(rows, active_changed=None):
+        """
+        Drop the cached selections written by a committed statement, together with the events and
+        sports whose active flag the refresh_selection_derived trigger may have recomputed.
+
+        :param rows: [list] (id, active, event_id, sport_id) rows returned through _returning_parents_.
+        :param active_changed: [bool] whether an update set the active column, None for inserts and deletes.
+        """
+        if active_changed is None:
+            # an inserted or deleted selection only counts towards its parents' active flags if it is active
+            touched = [row for row in rows if row[1]]
+        else:
+            # price and outcome updates leave the parents alone, and event_id can't be updated
+            touched = rows if active_changed else []
+
+        entityCache.invalidate("selection", *(row[0] for row in rows))
+        entityCache.invalidate("event", *(row[2] for row in touched))
+        entityCache.invalidate("sport", *(row[3] for row in touched))
+
+    @staticmethod
+    def publish_update(rows, changes):
+        """
+        Push a selection update to the live stream of its event once the update's transaction commits.
+
+        :param rows: [list] (id, active, event_id, sport_id) rows returned through _returning_parents_.
+        :param changes: [dict] the columns set by the update, including updated_at.
+        """
+        message = {k: v for k, v in changes.items() if k not in ("id", "updated_at")}
+        message["updated_at"] = datetime_to_str(changes["updated_at"], True)
+
+        for row in rows:
+            eventHub.publish(f"event:{row[2]}", {"type": "selection", "id": row[0], "event_id": row[2], **message}, db.session)
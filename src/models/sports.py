@@ -3,6 +3,9 @@ from src.app import db, app
 import uuid
 from src.models.mixins import BaseMixin
 from src.helpers import *
+from src.libs.cache import entityCache
+from src.libs.serializer import rowSerializer
+from src.libs.metadata import modelMetadata
 from sqlalchemy import exc, text
 
 class Sport(BaseMixin, db.Model):
@@ -34,26 +37,18 @@ class Sport(BaseMixin, db.Model):
         """
         app.logger.info('Sport creation initiated')
 
-        allowed_columns = list_diff(Sport().columns_list(), Sport()._restrict_in_creation_)
-        insert_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                insert_data[column] = data.get(column)
+        insert_data = modelMetadata.of(Sport).insert_data(data)
 
         app.logger.debug(f'Sport data to be inserted: {insert_data}')
         
-        result = Sport().validate_and_sanitize(insert_data, Sport()._restrict_in_creation_)
+        result = Sport().validate_and_sanitize(insert_data, Sport._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Sport data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
             return {"error": result["errors"]}
 
         try:
-            sql = """INSERT INTO sports({}) VALUES ({})""".format(
-                ', '.join(insert_data.keys()),
-                ', '.join([':' + k for k in insert_data.keys()])
-            )
+            sql = modelMetadata.of(Sport).insert_sql(insert_data.keys())
 
             app.logger.info('Executing SQL query')
             operation_result = execute_sql_query(db, sql, insert_data, operation="insert")
@@ -78,7 +73,7 @@ class Sport(BaseMixin, db.Model):
             return {"error": str(e)}
 
     @staticmethod
-    def get_sports(sport_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None):
+    def get_sports(sport_id=None, page=None, offset=None, orderby=None, sortby=None, active=None, regex=None, cursor=None, count=None, match=None, if_none_match=None):
         """
         Get sports data by sport_id or get paginated list of sports
 
@@ -89,6 +84,10 @@ class Sport(BaseMixin, db.Model):
         :param sortby: [str] column to sort by
         :param active: [bool] active state of the sport
         :param regex: [str] regex pattern to search for in 'name' and 'url_identifier'
+        :param cursor: [dict] decoded keyset cursor, switches to cursor pagination when not None
+        :param count: [str] total count mode: exact, estimate or none
+        :param match: [str] how regex is matched against 'name' and 'url_identifier': regex, contains, prefix or exact
+        :param if_none_match: [object] the request's If-None-Match ETags, a matching list ETag returns not_modified instead of the page
 
         :return [dict/list]
         """
@@ -96,15 +95,20 @@ class Sport(BaseMixin, db.Model):
         offset = offset or 20
         orderby = orderby or "ASC"
         sortby = sortby or "name"
+        count = count or "exact"
+        match = match or "regex"
         active_query = ""
         regex_query = ""
+        filter_params = {}
 
         if active is not None:
             active = bool(active)
-            active_query = f"active = {active}"
+            # a literal predicate rather than a bound one, so prepared generic plans can still use the WHERE active indexes
+            active_query = "active" if active else "NOT active"
 
         if regex is not None:
-            regex_query = f"(name ~* '{regex}' OR url_identifier ~* '{regex}')"
+            regex_query, search_params = search_clause(["name", "url_identifier"], regex, match)
+            filter_params.update(search_params)
 
         if active_query and regex_query:
             active_query = f"WHERE {active_query} AND {regex_query}"
@@ -117,48 +121,75 @@ class Sport(BaseMixin, db.Model):
         try:
             if not sport_id:
                 offset = int(offset)
-                page = int(page) - 1
-                sql = f"SELECT * FROM sports {active_query} ORDER BY {sortby} {orderby} LIMIT {offset} OFFSET {page * offset}"
-                sports = execute_sql_query(db, sql, operation="select")
-                
-                if not sports:
-                    return {"sports": [], "meta_data": {"sport_count": 0, "page_number": page + 1, "page_offset": offset}}
+                meta_data = {"page_offset": offset, "count_mode": count}
+
+                if cursor is not None:
+                    sortby = cursor.get("s", sortby)
+                    orderby = cursor.get("o", orderby)
+                    keyset_query, order_query, keyset_params, _ = keyset_clause(cursor, sortby, orderby)
 
-                sports_dict = []
-                for sport in sports:
-                    created_at = datetime_to_str(sport[4], True) if sport[4] else None
-                    updated_at = datetime_to_str(sport[5], True) if sport[5] else None
+                    where_query = active_query
+                    if keyset_query:
+                        where_query = f"{active_query} AND {keyset_query}" if active_query else f"WHERE {keyset_query}"
 
-                    sport_dict = dict(zip(("id", "name", "url_identifier", "active", "created_at", "updated_at"), 
-                        (sport[0], sport[1], sport[2], sport[3], created_at, updated_at)))
+                    page_query = f"{where_query} ORDER BY {order_query} LIMIT :limit"
+                    page_params = {**filter_params, **keyset_params, "limit": offset + 1}
+                else:
+                    page = int(page) - 1
+                    page_query = f"{active_query} ORDER BY {order_clause(sortby, orderby)} LIMIT :limit OFFSET :offset"
+                    page_params = {**filter_params, "limit": offset, "offset": page * offset}
 
-                    sport_dict = {k: v for k, v in sport_dict.items() if v is not None}
-                    
-                    sports_dict.append(sport_dict)
+                    meta_data["page_number"] = page + 1
 
-                count_sql = f"SELECT COUNT(*) FROM sports {active_query}"
-                total_sports = execute_sql_query(db, count_sql, operation="select")
-                total_sports = total_sports[0][0] if total_sports else 0
+                # the ETag is derived from a watermark of every row of the filter, a client that holds it
+                # skips the count and the page query. Sports have no change_seq, their write time stands in.
+                watermark = list_watermark(db, "sports", active_query, filter_params, "EXTRACT(EPOCH FROM coalesce(updated_at, created_at))", replica=True)
+                etag = make_etag("sports", page_query, page_params, count, *watermark)
+                if if_none_match and if_none_match.contains_weak(etag):
+                    app.logger.info('Sports page not modified')
+                    return {"etag": etag, "not_modified": True}
+
+                # an exact count is the watermark's
+                total_sports = watermark[0] if count == "exact" else count_rows(db, "sports", active_query, filter_params, count, replica=True)
+
+                sql = f"SELECT {rowSerializer.of(Sport.__table__).select} FROM sports {page_query}"
+                sports = execute_sql_query(db, sql, page_params, operation="select", replica=True)
+
+                if sports is None:
+                    raise Exception('Failed to execute SQL query')
+
+                if cursor is not None:
+                    sports, next_cursor, prev_cursor = keyset_page(sports, cursor, sortby, orderby, offset)
+                    meta_data.update({"next_cursor": next_cursor, "prev_cursor": prev_cursor})
+                
+                if not sports:
+                    return {"sports": [], "meta_data": {"sport_count": 0, **meta_data}, "etag": etag}
+
+                sports_dict = rowSerializer.of(Sport.__table__).many(sports)
 
                 app.logger.info(f'Retrieved {total_sports} sports')
 
-                return {"sports": sports_dict, "meta_data": {"sport_count": total_sports, "page_number": page + 1, "page_offset": offset}}
+                return {"sports": sports_dict, "meta_data": {"sport_count": total_sports, **meta_data}, "etag": etag}
 
             else:
-                sql = f"SELECT * FROM sports WHERE id = :id"
-                sport = execute_sql_query(db, sql, {"id": sport_id}, operation="select", fetchone=True)
+                sport_dict = entityCache.get("sport", sport_id)
+                if sport_dict is not None:
+                    app.logger.info(f'Retrieved sport with id {sport_id} from cache')
+                    return sport_dict
+
+                # taken before the read, a write committed in between keeps the row read out of the cache
+                version = entityCache.version("sport", sport_id)
+
+                sql = f"SELECT {rowSerializer.of(Sport.__table__).select} FROM sports WHERE id = :id"
+                # the cache is only filled from the primary, a lagging replica would put back rows a write just invalidated
+                sport = execute_sql_query(db, sql, {"id": sport_id}, operation="select", fetchone=True, replica=CACHE_BACKEND == "none")
 
                 if not sport:
                     return None
-                
 
-                created_at = datetime_to_str(sport[4], True) if sport[4] else None
-                updated_at = datetime_to_str(sport[5], True) if sport[5] else None
+                sport_dict = rowSerializer.of(Sport.__table__).one(sport)
 
-                sport_dict = dict(zip(("id", "name", "url_identifier", "active", "created_at", "updated_at"), 
-                    (sport[0], sport[1], sport[2], sport[3], created_at, updated_at)))
-
-                sport_dict = {k: v for k, v in sport_dict.items() if v is not None}
+                entityCache.set("sport", sport_id, sport_dict, version)
 
                 app.logger.info(f'Retrieved sport with id {sport_id}')
 
@@ -169,6 +200,41 @@ class Sport(BaseMixin, db.Model):
             app.logger.debug(f'Error details: {e}, sport_id: {sport_id}, page: {page}, offset: {offset}')
             return None
 
+    @staticmethod
+    def export_sports(updated_since=None):
+        """
+        Stream every sport in id order through a server-side cursor, for full-table exports
+
+        :param updated_since: [datetime] only sports created or updated at or after this time
+
+        :return [generator] lists of at most EXPORT_BATCH_SIZE sport dictionaries
+        """
+        serializer = rowSerializer.of(Sport.__table__)
+        where_query = ""
+        params = {}
+
+        if updated_since is not None:
+            where_query = "WHERE coalesce(updated_at, created_at) >= :updated_since"
+            params["updated_since"] = updated_since
+
+        app.logger.info('Sport export started')
+        app.logger.debug(f'Request parameters - updated_since: {updated_since}')
+
+        sql = f"SELECT {serializer.select} FROM sports {where_query} ORDER BY id"
+        exported = 0
+
+        try:
+            for rows in stream_rows(db, sql, params, EXPORT_BATCH_SIZE):
+                exported += len(rows)
+                yield serializer.many(rows)
+        except Exception as e:
+            # the response has already started, streamify ends it with the failure
+            app.logger.error('Sport export failed')
+            app.logger.debug(f'Error details: {e}, exported: {exported}')
+            raise
+
+        app.logger.info(f'Sport export finished, exported: {exported}')
+
     @staticmethod
     def update_a_sport(sport_id, data):
         """
@@ -182,16 +248,11 @@ class Sport(BaseMixin, db.Model):
         app.logger.info(f'Update sport request received for sport id: {sport_id}')
         app.logger.debug(f'Request data: {data}')
         
-        allowed_columns = list_diff(Sport().columns_list(), Sport()._restrict_in_update_)
-        update_data = {}
-
-        for column in allowed_columns:
-            if column in data:
-                update_data[column] = data.get(column)
+        update_data = modelMetadata.of(Sport).update_data(data)
 
         app.logger.debug(f'Sport data to be updated: {update_data}')
 
-        result = Sport().validate_and_sanitize(update_data, Sport()._restrict_in_update_)
+        result = Sport().validate_and_sanitize(update_data, Sport._restrict_in_update_)
         if result.get("errors"):
             app.logger.error('Sport data validation and sanitization failed')
             app.logger.debug(f'Validation errors: {result["errors"]}')
@@ -213,6 +274,7 @@ class Sport(BaseMixin, db.Model):
                     raise Exception('Failed to execute SQL query')
 
                 db.session.commit()
+                entityCache.invalidate("sport", sport_id)
 
                 app.logger.info('Sport update successful')
                 return {"message": f"Sport successfully updated with id={sport_id}"}
@@ -247,6 +309,7 @@ class Sport(BaseMixin, db.Model):
                 raise Exception('Failed to execute SQL query')
 
             db.session.commit()
+            entityCache.invalidate("sport", sport_id)
 
             app.logger.info('Sport deletion successful')
             return {"message": f"Sport successfully deleted with id={sport_id}"}
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+# before the app is imported: no migrations or gunicorn, and every read reaches the primary's session
+os.environ.setdefault("APP_ENVIRONMENT", "test")
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["REPLICA_URIS"] = ""
+os.environ["EX_API_BACKOFF"] = "0"  # retries against the local stubs without sleeping
+
+from sqlalchemy import text
+
+from src.app import app, db  # models need the app loaded first, as in run.py
+
+@pytest.fixture(scope="session")
+def database():
+  """
+  App context on the database of the config, migrated to head. Skipped without one, except on CI
+  where a missing database fails the run.
+  """
+  with app.app_context():
+    try:
+      db.session.execute(text("SELECT 1"))
+    except Exception as e:
+      db.session.rollback()
+      if os.getenv("CI"):
+        pytest.fail(f"database of the config unreachable: {e}")
+      pytest.skip(f"database of the config unreachable: {e}")
+
+    yield db
@@ -0,0 +1,108 @@
+import uuid
+
+import pytest
+
+from sqlalchemy import text
+
+from src.app import app
+from src.config.config import BASE_PATH, SELECTIONS_BATCH_MAX
+from src.models.selections import Selection
+
+URL = BASE_PATH + "/selections:batch"
+
+@pytest.fixture
+def client():
+  return app.test_client()
+
+@pytest.fixture
+def selections(database):
+  """
+  Two committed selections priced 2.50 of a committed event, deleted with it afterwards
+  """
+  suffix = uuid.uuid4().hex[:12]
+  with database.engine.begin() as connection:
+    sport_id = connection.execute(text("""INSERT INTO sports (name, url_identifier, active)
+      VALUES (:name, :name, false) RETURNING id"""), {"name": f"batch-sport-{suffix}"}).scalar()
+    event_id = connection.execute(text("""INSERT INTO events (name, url_identifier, active, type, sport_id, status, scheduled_start)
+      VALUES (:name, :name, false, 'preplay', :sport_id, 'Pending', timezone('utc', now())) RETURNING id"""),
+      {"name": f"batch-event-{suffix}", "sport_id": sport_id}).scalar()
+    ids = connection.execute(text("""INSERT INTO selections (name, event_id, price, active, outcome)
+      VALUES ('batch first', :event_id, 2.5, false, 'Unsettled'), ('batch second', :event_id, 2.5, false, 'Unsettled')
+      RETURNING id"""), {"event_id": event_id}).scalars().all()
+
+  yield sorted(ids)
+
+  database.session.rollback()
+  with database.engine.begin() as connection:
+    connection.execute(text("DELETE FROM selections WHERE event_id = :id"), {"id": event_id})
+    connection.execute(text("DELETE FROM events WHERE id = :id"), {"id": event_id})
+    connection.execute(text("DELETE FROM sports WHERE id = :id"), {"id": sport_id})
+
+def stored(database, ids):
+  database.session.rollback()
+  rows = database.session.execute(text("SELECT id, price, outcome FROM selections WHERE id = ANY(:ids) ORDER BY id"), {"ids": ids})
+  return [(float(row.price), row.outcome) for row in rows]
+
+@pytest.mark.parametrize("body", [None, {}, []], ids=["no body", "object", "empty list"])
+def test_batch_must_be_a_non_empty_list(client, body):
+  response = client.patch(URL, json=body)
+
+  assert response.status_code == 400
+  assert response.json["code"] == "INVALID_REQUEST"
+
+def test_batch_over_the_limit_is_refused(client):
+  response = client.patch(URL, json=[{"id": i, "price": 2.5} for i in range(1, SELECTIONS_BATCH_MAX + 2)])
+
+  assert response.status_code == 400
+
+def test_batch_without_a_valid_item_updates_nothing(client):
+  items = [{"id": "x", "price": 2.5}, {"price": 2.5}, {"id": 1}, {"id": 2, "price": -1}, {"id": 3, "outcome": "Maybe"}]
+
+  response = client.patch(URL, json=items)
+
+  assert response.status_code == 400
+  assert [("error" in result) for result in response.json["errors"][0]["results"]] == [True] * len(items)
+  assert response.json["errors"][0]["updated"] == 0 and response.json["errors"][0]["failed"] == len(items)
+
+def test_invalid_and_unknown_items_fail_alone(database, client, selections):
+  first, second = selections
+  missing = second + 1000000
+
+  response = client.patch(URL, json=[
+    {"id": first, "price": 3.5, "outcome": "Win"},
+    {"id": second, "price": "cheap"},
+    {"id": missing, "price": 4.5},
+    {"id": first, "price": 9.5},
+  ])
+  results = response.json["results"]
+
+  assert response.status_code == 200
+  assert [result["id"] for result in results] == [first, second, missing, first]
+  assert results[0]["message"] == "Selection successfully updated"
+  assert "error" in results[1]
+  assert results[2]["error"] == "No such selection found"
+  assert results[3]["error"] == "Selection is updated more than once in this batch"
+  assert (response.json["updated"], response.json["failed"]) == (1, 3)
+  assert stored(database, [first, second]) == [(3.5, "Win"), (2.5, "Unsettled")]
+
+def test_batch_of_unknown_ids_is_a_400(database, client, selections):
+  response = client.patch(URL, json=[{"id": selections[1] + 1000000, "price": 4.5}])
+
+  assert response.status_code == 400
+  assert response.json["errors"][0]["results"][0]["error"] == "No such selection found"
+
+def test_failure_after_the_update_rolls_back_the_whole_batch(database, client, selections, monkeypatch):
+  published = []
+  def publish_update(rows, changes):
+    # the UPDATE has run for every item, the second one fails before the commit
+    published.append(rows[0][0])
+    if len(published) == 2:
+      raise RuntimeError("publish failed")
+
+  monkeypatch.setattr(Selection, "publish_update", staticmethod(publish_update))
+
+  response = client.patch(URL, json=[{"id": selection_id, "price": 7.5} for selection_id in selections])
+
+  assert response.status_code == 500
+  assert response.json["code"] == "SELECTIONS_UPDATE_FAILED"
+  assert stored(database, selections) == [(2.5, "Unsettled"), (2.5, "Unsettled")]
@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+from sqlalchemy import text
+
+from src.models.selections import Selection
+
+@pytest.fixture
+def event_id(database):
+  """
+  A committed sport and event to write selections of, deleted with them afterwards
+  """
+  suffix = uuid.uuid4().hex[:12]
+  with database.engine.begin() as connection:
+    sport_id = connection.execute(text("""INSERT INTO sports (name, url_identifier, active)
+      VALUES (:name, :name, false) RETURNING id"""), {"name": f"feed-sport-{suffix}"}).scalar()
+    event_id = connection.execute(text("""INSERT INTO events (name, url_identifier, active, type, sport_id, status, scheduled_start)
+      VALUES (:name, :name, false, 'preplay', :sport_id, 'Pending', timezone('utc', now())) RETURNING id"""),
+      {"name": f"feed-event-{suffix}", "sport_id": sport_id}).scalar()
+
+  yield event_id
+
+  database.session.rollback()
+  with database.engine.begin() as connection:
+    connection.execute(text("DELETE FROM selections WHERE event_id = :id"), {"id": event_id})
+    connection.execute(text("DELETE FROM events WHERE id = :id"), {"id": event_id})
+    connection.execute(text("DELETE FROM sports WHERE id = :id"), {"id": sport_id})
+
+def commit(database, sql, params):
+  with database.engine.begin() as connection:
+    return connection.execute(text(sql), params).fetchall()
+
+def changes_of(database, event_id, since):
+  database.session.rollback()
+  changes = Selection.get_selection_changes(since, 1000, 0)
+
+  assert changes is not None, "the feed read failed"
+  return [str(selection["id"]) for selection in changes["selections"] if str(selection["event_id"]) == str(event_id)]
+
+def test_writes_are_numbered_by_their_transaction(database, event_id):
+  xid = database.session.execute(text("SELECT pg_current_xact_id()::text::bigint")).scalar()
+  inserted = database.session.execute(text("""INSERT INTO selections (name, event_id, price, active, outcome)
+    VALUES ('feed numbered', :event_id, 2.5, false, 'Unsettled') RETURNING id, change_xid, change_seq"""), {"event_id": event_id}).fetchone()
+  updated = database.session.execute(text("UPDATE selections SET price = 3.5 WHERE id = :id RETURNING change_xid, change_seq"), {"id": inserted.id}).fetchone()
+
+  assert inserted.change_xid == updated.change_xid == xid
+  assert updated.change_seq > inserted.change_seq
+
+def test_feed_hands_out_committed_changes_in_position_order(database, event_id):
+  first, second = commit(database, """INSERT INTO selections (name, event_id, price, active, outcome)
+    VALUES ('feed first', :event_id, 2.5, false, 'Unsettled'), ('feed second', :event_id, 2.5, false, 'Unsettled')
+    RETURNING id, change_xid, change_seq""", {"event_id": event_id})
+  since = {"x": min(first.change_xid, second.change_xid), "s": min(first.change_seq, second.change_seq) - 1}
+
+  assert changes_of(database, event_id, since) == [str(row.id) for row in sorted((first, second), key=lambda row: row.change_seq)]
+
+  # a later write moves the row behind the other one
+  commit(database, "UPDATE selections SET price = 3.5 WHERE id = :id", {"id": first.id})
+
+  assert changes_of(database, event_id, since) == [str(second.id), str(first.id)]
+
+def test_open_write_transaction_holds_back_the_feed(database, event_id):
+  (row,) = commit(database, """INSERT INTO selections (name, event_id, price, active, outcome)
+    VALUES ('feed held', :event_id, 2.5, false, 'Unsettled') RETURNING id, change_xid, change_seq""", {"event_id": event_id})
+  since = {"x": row.change_xid, "s": row.change_seq - 1}
+
+  with database.engine.connect() as blocker:
+    # any write transaction left open, on any table, stalls both feeds until it ends
+    blocker.execute(text("SELECT pg_current_xact_id()"))
+    commit(database, "UPDATE selections SET price = 3.5 WHERE id = :id", {"id": row.id})
+
+    held = changes_of(database, event_id, since)
+    blocker.rollback()
+
+  assert held == []
+  assert changes_of(database, event_id, since) == [str(row.id)]
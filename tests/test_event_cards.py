@@ -0,0 +1,44 @@
+import pytest
+
+from sqlalchemy import text
+
+from benchmarks.query_plans import load
+
+WRITES = [
+  ("price", "UPDATE selections SET price = coalesce(price, 1) + 0.5 WHERE id = (SELECT min(id) FROM selections WHERE event_id = :id)"),
+  ("price removed", "UPDATE selections SET price = NULL WHERE id = (SELECT max(id) FROM selections WHERE event_id = :id)"),
+  ("outcome", "UPDATE selections SET outcome = 'Win' WHERE event_id = :id"),
+  ("rename reorders", "UPDATE selections SET name = 'a first ' || name WHERE id = (SELECT max(id) FROM selections WHERE event_id = :id)"),
+  ("active flip", "UPDATE selections SET active = NOT active WHERE event_id = :id"),
+  ("selection added", "INSERT INTO selections (name, event_id, price, active, outcome) VALUES ('card test', :id, 2.5, TRUE, 'Unsettled')"),
+  ("selection removed", "DELETE FROM selections WHERE id = (SELECT min(id) FROM selections WHERE event_id = :id)"),
+  ("event", "UPDATE events SET status = 'Started', actual_start = scheduled_start, name = name || ' live' WHERE id = :id"),
+  ("sport renamed", "UPDATE sports SET name = name || ' renamed' WHERE id = (SELECT sport_id FROM events WHERE id = :id)"),
+]
+
+@pytest.fixture(scope="module")
+def event_id(database):
+  """
+  An event of the synthetic dataset with selections, rolled back after the module
+  """
+  load(20)
+
+  yield database.session.execute(text("SELECT max(event_id) FROM selections")).scalar()
+
+  database.session.rollback()
+
+def card(session, event_id):
+  return session.execute(text("SELECT card FROM event_cards WHERE event_id = :id"), {"id": event_id}).scalar()
+
+@pytest.mark.parametrize("name, statement", WRITES, ids=[write[0] for write in WRITES])
+def test_write_leaves_the_card_a_rebuild_would_build(database, event_id, name, statement):
+  before = card(database.session, event_id)
+
+  database.session.execute(text(statement), {"id": event_id})
+  patched = card(database.session, event_id)
+
+  database.session.execute(text("SELECT build_event_cards(ARRAY[:id])"), {"id": event_id})
+  rebuilt = card(database.session, event_id)
+
+  assert patched != before, f"{name}: the card did not change"
+  assert patched == rebuilt, f"{name}: the card differs from a rebuild"
@@ -0,0 +1,98 @@
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.libs.external_api import externalApi
+
+class stubHandler(BaseHTTPRequestHandler):
+  """
+  The odds API: /odds answers with a body naming its path, /flaky fails once with a 503 first
+  """
+
+  failed = set()
+
+  def do_GET(self):
+    if self.path.startswith("/flaky") and self.path not in stubHandler.failed:
+      stubHandler.failed.add(self.path)
+      return self.reply(503, b"unavailable")
+
+    self.reply(200, self.path.encode())
+
+  def reply(self, status, body):
+    self.send_response(status)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture(scope="module")
+def stub():
+  """
+  Base url of a local stub of the odds API, served from a thread for the module
+  """
+  server = ThreadingHTTPServer(("127.0.0.1", 0), stubHandler)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+
+  yield f"http://127.0.0.1:{server.server_port}"
+
+  server.shutdown()
+  server.server_close()
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+  """
+  Every test starts without the process's session
+  """
+  externalApi._session = None
+  yield
+  externalApi._session = None
+
+def test_threads_share_one_session():
+  barrier = threading.Barrier(16)
+  sessions = []
+
+  def build():
+    barrier.wait()
+    sessions.append(externalApi.session())
+
+  threads = [threading.Thread(target=build) for _ in range(16)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert len(sessions) == 16
+  assert len({id(session) for session in sessions}) == 1
+
+def test_get_many_keys_the_responses(stub):
+  urls = {f"sport_{i}": f"{stub}/odds/{i}" for i in range(20)}
+
+  responses = externalApi.get_many(urls)
+
+  assert list(responses) == list(urls)
+  for key, response in responses.items():
+    assert response.status_code == 200
+    assert response.text == "/odds/" + key.split("_")[1]
+
+def test_get_retries_a_server_error(stub):
+  response = externalApi.get(f"{stub}/flaky/1")
+
+  assert response.status_code == 200
+  assert "/flaky/1" in stubHandler.failed
+
+def test_get_many_returns_the_failure_of_a_url(stub):
+  # nothing listens on the stub's port once a throwaway server has released it
+  server = ThreadingHTTPServer(("127.0.0.1", 0), stubHandler)
+  closed = f"http://127.0.0.1:{server.server_port}/odds"
+  server.server_close()
+
+  responses = externalApi.get_many({"up": f"{stub}/odds/up", "down": closed})
+
+  assert responses["up"].status_code == 200
+  assert isinstance(responses["down"], requests.ConnectionError)
@@ -0,0 +1,137 @@
+import base64
+import sqlite3
+import ujson
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from src.helpers import decode_cursor, encode_cursor, keyset_clause, keyset_page
+
+START = datetime(2026, 10, 1, 12, 0, 0)
+# three names and five creation times over 15 rows, every sort key is shared by several rows
+ROWS = [(i, ("alpha", "beta", "gamma")[i % 3], START + timedelta(minutes=i % 5)) for i in range(1, 16)]
+SORTS = [(sortby, orderby) for sortby in ("name", "created_at") for orderby in ("ASC", "DESC")]
+
+@pytest.fixture(scope="module")
+def connection():
+  """
+  SQLite table of ROWS, read back with its timestamps as datetimes like Postgres returns them
+  """
+  engine = create_engine("sqlite://", connect_args={"detect_types": sqlite3.PARSE_DECLTYPES})
+  with engine.connect() as connection:
+    connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, created_at TIMESTAMP)"))
+    connection.execute(text("INSERT INTO items VALUES (:id, :name, :created_at)"),
+      [{"id": i, "name": name, "created_at": created_at.isoformat(" ")} for i, name, created_at in ROWS])
+
+    yield connection
+
+def page(connection, token, sortby, orderby, limit=4):
+  """
+  Fetch a page the way the list endpoints do: decode the token, seek with LIMIT limit + 1, trim
+
+  :return [tuple] (ids of the page, next_cursor, prev_cursor)
+  """
+  cursor = decode_cursor(token)
+  condition, order_by, params, _ = keyset_clause(cursor, cursor.get("s", sortby), cursor.get("o", orderby))
+  where_query = f"WHERE {condition}" if condition else ""
+
+  rows = connection.execute(text(f"SELECT id, name, created_at FROM items {where_query} ORDER BY {order_by} LIMIT :limit"),
+    {**params, "limit": limit + 1}).fetchall()
+  rows, next_cursor, prev_cursor = keyset_page(rows, cursor, sortby, orderby, limit)
+
+  return [row.id for row in rows], next_cursor, prev_cursor
+
+def expected(sortby, orderby):
+  column = 1 if sortby == "name" else 2
+  return [row[0] for row in sorted(ROWS, key=lambda row: (row[column], row[0]), reverse=orderby == "DESC")]
+
+def token(payload):
+  return base64.urlsafe_b64encode(ujson.dumps(payload).encode()).decode().rstrip("=")
+
+def test_cursor_round_trips():
+  name_token = encode_cursor("name", "DESC", "beta", 7, "prev")
+  date_token = encode_cursor("created_at", "ASC", START, 3)
+
+  assert "=" not in name_token and "+" not in name_token and "/" not in name_token
+  assert decode_cursor(name_token) == {"s": "name", "o": "DESC", "v": "beta", "id": 7, "d": "prev"}
+  assert decode_cursor(date_token) == {"s": "created_at", "o": "ASC", "v": START, "id": 3, "d": "next"}
+  assert decode_cursor("") == decode_cursor(None) == {}
+
+@pytest.mark.parametrize("sortby, orderby", SORTS)
+def test_next_cursors_visit_every_row_once_in_order(connection, sortby, orderby):
+  ids, next_cursor, prev_cursor = page(connection, "", sortby, orderby)
+  visited = list(ids)
+
+  assert prev_cursor is None
+  while next_cursor:
+    ids, next_cursor, prev_cursor = page(connection, next_cursor, sortby, orderby)
+    visited += ids
+    assert prev_cursor
+
+  assert visited == expected(sortby, orderby)
+
+@pytest.mark.parametrize("sortby, orderby", SORTS)
+def test_prev_cursors_walk_back_over_the_same_pages(connection, sortby, orderby):
+  pages = []
+  ids, next_cursor, prev_cursor = page(connection, "", sortby, orderby)
+  pages.append(ids)
+  while next_cursor:
+    ids, next_cursor, prev_cursor = page(connection, next_cursor, sortby, orderby)
+    pages.append(ids)
+
+  walked_back = []
+  while prev_cursor:
+    ids, _, prev_cursor = page(connection, prev_cursor, sortby, orderby)
+    walked_back.append(ids)
+
+  assert walked_back == pages[-2::-1]
+  assert next_cursor is None
+
+def test_rows_sharing_a_sort_key_are_split_by_id(connection):
+  # the page boundary falls inside the rows named alpha (ids 3, 6, 9, 12, 15)
+  first, next_cursor, _ = page(connection, "", "name", "ASC", limit=2)
+  second, _, _ = page(connection, next_cursor, "name", "ASC", limit=2)
+
+  assert (first, second) == ([3, 6], [9, 12])
+
+def test_descending_seeks_below_the_cursor():
+  condition, order_by, params, backwards = keyset_clause(decode_cursor(encode_cursor("name", "DESC", "beta", 7)), "name", "DESC")
+
+  assert (condition, order_by, backwards) == ("(name, id) < (:cursor_value, :cursor_id)", "name DESC, id DESC", False)
+  assert params == {"cursor_value": "beta", "cursor_id": 7}
+
+def test_prev_cursor_of_descending_order_seeks_ascending():
+  condition, order_by, _, backwards = keyset_clause(decode_cursor(encode_cursor("name", "DESC", "beta", 7, "prev")), "name", "DESC")
+
+  assert (condition, order_by, backwards) == ("(name, id) > (:cursor_value, :cursor_id)", "name ASC, id ASC", True)
+
+@pytest.mark.parametrize("value", [
+  "not a cursor!",
+  base64.urlsafe_b64encode(b"not json").decode(),
+  token(["name", "ASC", "beta", 7, "next"]),
+  token({"s": "name", "o": "ASC", "v": "beta", "id": 7}),
+], ids=["not base64", "not json", "not an object", "missing direction"])
+def test_malformed_cursors_are_rejected(value):
+  assert decode_cursor(value) is None
+
+@pytest.mark.parametrize("change", [
+  {"s": "id; DROP TABLE selections"},
+  {"s": "price"},
+  {"o": "ASC NULLS FIRST"},
+  {"d": "sideways"},
+  {"v": ["beta"]},
+  {"v": None},
+  {"id": {"$gt": 0}},
+  {"s": "created_at", "v": "yesterday"},
+], ids=["sql in sort", "unsorted column", "order", "direction", "list value", "null value", "object id", "bad timestamp"])
+def test_tampered_cursors_are_rejected(change):
+  cursor = {"s": "name", "o": "ASC", "v": "beta", "id": 7, "d": "next", **change}
+
+  assert decode_cursor(token(cursor)) is None
+
+def test_unknown_sort_is_refused():
+  with pytest.raises(ValueError):
+    keyset_clause({}, "id; DROP TABLE selections", "ASC")
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.query_plans import TRIGGER_LOOKUPS, cases, check, explain, load
+
+EVENTS = 20000
+
+CASES = [name for name, _ in cases(None, None, None)]
+
+@pytest.fixture(scope="module")
+def dataset(database):
+  """
+  The synthetic dataset of benchmarks/query_plans.py, rolled back after the module
+  """
+  connection = database.session.connection()
+  ids = load(EVENTS)
+
+  yield connection, ids
+
+  database.session.rollback()
+
+@pytest.mark.parametrize("name", CASES)
+def test_read_uses_an_index(dataset, name):
+  connection, ids = dataset
+  call = dict(cases(*ids[:3]))[name]
+
+  result, plans = check(connection, call)
+
+  assert result is not None, f"{name}: the read failed"
+  assert plans, f"{name}: no statement ran"
+  for statement, seq_scans in plans:
+    assert not seq_scans, f"{name}: sequential scan on {', '.join(seq_scans)}: {' '.join(statement.split())}"
+
+@pytest.mark.parametrize("name, statement, column", TRIGGER_LOOKUPS, ids=[lookup[0] for lookup in TRIGGER_LOOKUPS])
+def test_trigger_lookup_uses_an_index(dataset, name, statement, column):
+  connection, ids = dataset
+
+  seq_scans = explain(connection, statement, {"id": ids[3] if column == "event_id" else ids[4]})
+
+  assert not seq_scans, f"{name}: sequential scan on {', '.join(seq_scans)}"
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from flask import Response
+from sqlalchemy import event, exc, text
+
+import src.libs.replicas
+from src.app import app
+from src.libs.replicas import QUERY_CANCELED, replicaNode, replicaRouter
+
+SOURCE = text("SELECT name FROM source")
+
+class statementCancelled(Exception):
+  """
+  What the driver raises for a statement that ran out of statement_timeout
+  """
+  sqlstate = QUERY_CANCELED
+
+@pytest.fixture
+def replicas(tmp_path, monkeypatch):
+  """
+  Two SQLite stand-ins for replicas, each answering SOURCE with its name, and fresh router counters
+  """
+  nodes = []
+  for i in range(2):
+    node = replicaNode(f"replica_{i}", f"sqlite:///{tmp_path}/replica_{i}.db")
+    with node.engine.begin() as connection:
+      connection.execute(text("CREATE TABLE source (name TEXT)"))
+      connection.execute(text("INSERT INTO source VALUES (:name)"), {"name": node.name})
+    nodes.append(node)
+
+  monkeypatch.setattr(src.libs.replicas, "REPLICA_URIS", [str(node.engine.url) for node in nodes])
+  monkeypatch.setattr(replicaRouter, "_nodes", nodes)
+  # no monitor thread, the tests set the replicas' health themselves
+  monkeypatch.setattr(replicaRouter, "_monitor", object())
+  monkeypatch.setattr(replicaRouter, "_stats", {"sticky": 0, "unavailable": 0, "fallbacks": 0})
+
+  yield nodes
+
+  for node in nodes:
+    node.engine.dispose()
+
+def read(**request):
+  with app.test_request_context("/v1/sports", **request):
+    return replicaRouter.read(SOURCE, fetchone=True)
+
+def test_gets_read_from_the_replicas_in_turn(replicas):
+  served = [read() for _ in range(4)]
+
+  assert all(replica for replica, _ in served)
+  assert {row.name for _, row in served} == {"replica_0", "replica_1"}
+  assert [node.reads for node in replicas] == [2, 2]
+
+def test_a_request_reads_one_replica(replicas):
+  with app.test_request_context("/v1/sports"):
+    names = {replicaRouter.read(SOURCE, fetchone=True)[1].name for _ in range(5)}
+
+  assert len(names) == 1
+
+def test_writes_and_clients_that_wrote_read_the_primary(replicas):
+  with app.test_request_context("/v1/sports", method="POST"):
+    cookie = replicaRouter.stick_to_primary(Response(status=201)).headers["Set-Cookie"]
+
+  assert read(method="POST") == (False, None)
+  assert cookie.startswith(src.libs.replicas.REPLICA_STICKY_COOKIE)
+  assert read(headers={"Cookie": cookie.split(";", 1)[0]}) == (False, None)
+  assert read(headers={"Cookie": f"{src.libs.replicas.REPLICA_STICKY_COOKIE}={int(time.time()) - 1}"})[0]
+  assert replicaRouter.stats()["sticky"] == 2
+
+def test_failed_writes_set_no_cookie(replicas):
+  with app.test_request_context("/v1/sports", method="POST"):
+    response = replicaRouter.stick_to_primary(Response(status=400))
+
+  assert "Set-Cookie" not in response.headers
+
+def test_unreachable_replica_falls_back_to_the_primary(replicas, tmp_path):
+  replicas[0].engine.dispose()
+  replicas[0].engine = replicaNode("replica_0", f"sqlite:///{tmp_path}/missing/replica_0.db").engine
+  replicas[1].healthy = False
+
+  with app.test_request_context("/v1/sports"):
+    first = replicaRouter.read(SOURCE, fetchone=True)
+    replicas[1].healthy = True
+    second = replicaRouter.read(SOURCE, fetchone=True)
+
+  assert first == second == (False, None)
+  assert not replicas[0].healthy and replicas[0].failures == 1
+  assert replicaRouter.stats()["fallbacks"] == 1
+  assert read()[1].name == "replica_1"
+
+def test_no_healthy_replica_reads_the_primary(replicas):
+  for node in replicas:
+    node.healthy = False
+
+  assert read() == (False, None)
+  assert replicaRouter.stats()["unavailable"] == 1
+
+def test_cancelled_read_fails_without_failing_its_replica(replicas):
+  # the stand-ins report their errors the way Postgres reports a statement_timeout
+  cancel = lambda context: exc.OperationalError(context.statement, context.parameters, statementCancelled("canceling statement due to statement timeout"))
+  for node in replicas:
+    event.listen(node.engine, "handle_error", cancel)
+
+  with app.test_request_context("/v1/sports"):
+    with pytest.raises(exc.OperationalError):
+      replicaRouter.read(text("SELECT name FROM missing"))
+
+  assert all(node.healthy and not node.failures for node in replicas)
+  assert replicaRouter.stats()["fallbacks"] == 0
@@ -0,0 +1,91 @@
+import socket
+import time
+
+import pytest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import src.libs.pubsub
+from src.libs.pubsub import eventHub
+from src.libs.stream_server import streamServer
+
+EVENTS = {"7": {"id": "7", "name": "stand-in event"}}
+
+@pytest.fixture(scope="module")
+def port():
+  """
+  Port of this process' stream server, serving the events of EVENTS
+  """
+  return streamServer.start(lambda event_id: EVENTS.get(event_id), "127.0.0.1:0")
+
+def request(port, path):
+  connection = socket.create_connection(("127.0.0.1", port))
+  connection.sendall(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+  connection.settimeout(5)
+  return connection
+
+def read_until(connection, marker):
+  received = b""
+  while marker not in received:
+    chunk = connection.recv(65536)
+    if not chunk:
+      break
+    received += chunk
+
+  return received.decode()
+
+def commit(*messages, rolled_back=()):
+  """
+  Publish messages in a write's transaction and commit it, rolled_back ones from a savepoint that is rolled back
+  """
+  session = Session(create_engine("sqlite://"))
+  session.execute(text("SELECT 1"))
+
+  for topic, message in messages:
+    eventHub.publish(topic, message, session)
+
+  savepoint = session.begin_nested()
+  for topic, message in rolled_back:
+    eventHub.publish(topic, message, session)
+  savepoint.rollback()
+
+  session.commit()
+
+def test_stream_sends_the_snapshot_then_committed_updates(port):
+  connection = request(port, "/v1/stream/events/7")
+  head = read_until(connection, b"stand-in event\"}\n\n")
+
+  commit(("event:7", {"type": "selection", "id": 1, "price": 2.5}), rolled_back=[("event:7", {"type": "selection", "id": 1, "price": 9.5})])
+  commit(("event:7", {"type": "selection", "id": 1, "price": 3.5}))
+  body = read_until(connection, b'"price":3.5')
+
+  connection.close()
+
+  assert head.startswith("HTTP/1.1 200 OK") and "text/event-stream" in head
+  assert '"price":2.5' in body and '"price":3.5' in body
+  assert '"price":9.5' not in body
+
+def test_closed_stream_unsubscribes(port):
+  connection = request(port, "/v1/stream/events/7")
+  read_until(connection, b"stand-in event\"}\n\n")
+  subscribers = eventHub.stats()["subscribers"]
+
+  connection.close()
+  deadline = time.monotonic() + 5
+  while eventHub.stats()["subscribers"] == subscribers and time.monotonic() < deadline:
+    time.sleep(0.05)
+
+  assert eventHub.stats()["subscribers"] == subscribers - 1
+
+def test_unknown_event_and_path_get_404(port):
+  assert read_until(request(port, "/v1/stream/events/404"), b"}").startswith("HTTP/1.1 404")
+  assert "EVENT_NOT_FOUND" in read_until(request(port, "/v1/stream/events/404"), b"}")
+  assert "NOT_FOUND" in read_until(request(port, "/v1/sports"), b"}")
+
+def test_streams_over_the_limit_get_503(port, monkeypatch):
+  monkeypatch.setattr(src.libs.pubsub, "STREAM_MAX_PER_WORKER", eventHub.stats()["streams"])
+
+  response = read_until(request(port, "/v1/stream/events/7"), b"}")
+
+  assert response.startswith("HTTP/1.1 503") and "Retry-After" in response
@@ -0,0 +1,95 @@
+import pytest
+
+from src.app import app  # models need the app loaded first, as in run.py
+from src.libs.validation_manager import validationManager
+from src.models.events import Event
+from src.models.selections import Selection
+from src.models.sports import Sport
+
+LONG = "x" * 256
+
+SPORTS = [
+  {"name": "Football", "url_identifier": "football"},
+  {"name": "  Football  ", "url_identifier": " football"},
+  {"name": "", "url_identifier": "football"},
+  {"name": LONG, "url_identifier": "football"},
+  {"name": 7, "url_identifier": "football"},
+  {"name": None, "url_identifier": "football"},
+  {"name": "Football"},
+  {"url_identifier": "football", "id": 3, "active": True},
+  {"id": 3, "active": True, "created_at": "2026-10-17 12:00:00"},
+  {"unknown": "field"},
+  {},
+]
+
+EVENTS = [
+  {"name": "Final", "url_identifier": "final", "type": "preplay", "status": "Pending", "scheduled_start": "2026-10-17 12:00:00", "sport_id": 1},
+  {"name": "Final", "url_identifier": "final", "type": "live", "status": "Pending", "scheduled_start": "2026-10-17 12:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "pending", "scheduled_start": "2026-10-17 12:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": " 2026-10-17 12:00:00 "},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": "2026-10-17T12:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": "2026-02-30 12:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": "2026-1-7 1:02:03"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": "0999-01-01 00:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": "2026-10-17 24:00:00"},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": 20261017},
+  {"name": "Final", "url_identifier": "final", "type": "inplay", "status": "Started", "scheduled_start": None},
+  {"name": "Final", "status": "Ended", "sport_id": 2, "active": False},
+  {"sport_id": 2, "id": 9},
+]
+
+SELECTIONS = [
+  {"name": "Home", "event_id": "1", "price": 2.5, "active": True, "outcome": "Unsettled"},
+  {"name": "Home", "event_id": "1", "active": True, "outcome": "Unsettled"},
+  {"name": "Home", "event_id": "1", "price": 2, "active": True, "outcome": "Unsettled"},
+  {"name": "Home", "event_id": "1", "price": -0.5, "active": True, "outcome": "Unsettled"},
+  {"name": "Home", "event_id": "1", "price": 50000.5, "active": True, "outcome": "Unsettled"},
+  {"name": "Home", "event_id": "1", "price": "2.5", "active": "true", "outcome": "Win"},
+  {"name": "Home", "event_id": 1, "price": 2.5, "active": 1, "outcome": "Draw"},
+  {"name": "Home", "event_id": "1", "price": None, "active": None, "outcome": None},
+  {"price": 3.5, "outcome": "Lose"},
+  {"event_id": "2", "id": 4},
+  {"id": 4, "created_at": "2026-10-17 12:00:00", "updated_at": "2026-10-17 12:00:00"},
+]
+
+CASES = [(model, skip, payload)
+  for model, payloads in ((Sport, SPORTS), (Event, EVENTS), (Selection, SELECTIONS))
+  for skip in ("_restrict_in_creation_", "_restrict_in_update_")
+  for payload in payloads]
+IDS = [f"{model.__name__}{skip.replace('_restrict_in', '').rstrip('_')}-{i}" for i, (model, skip, _) in enumerate(CASES)]
+
+def per_request(model, data, skip):
+  """
+  What validate_and_sanitize returned before the schemas were compiled: validationManager.validate
+  run on the model's _validations_, an exception turned into an error
+  """
+  try:
+    result = validationManager.validate(data, model._validations_, skip, True)
+    return {"errors": result["errors"]} if result["errors"] else {}
+  except Exception as e:
+    return {"errors": [f"Data validation failed:{e}"]}
+
+@pytest.mark.parametrize("model, skip, payload", CASES, ids=IDS)
+def test_compiled_validator_accepts_and_rejects_like_the_per_request_path(model, skip, payload):
+  before = per_request(model, dict(payload), getattr(model, skip))
+  after = model().validate_and_sanitize(dict(payload), getattr(model, skip))
+
+  assert bool(after.get("errors")) == bool(before.get("errors"))
+  # the strptime round trips raised on values that aren't strings (a list of the exception), the
+  # compiled checks report them as invalid instead
+  if not isinstance(before.get("errors"), list):
+    assert after == before
+
+@pytest.mark.parametrize("model, skip, payload", CASES, ids=IDS)
+@pytest.mark.parametrize("join_msg", [True, False])
+def test_compiled_validator_gives_the_same_errors_and_data(model, skip, payload, join_msg):
+  try:
+    before = validationManager.validate(dict(payload), model._validations_, getattr(model, skip), True, join_msg)
+  except (TypeError, ValueError):
+    pytest.skip("the per-request path raised on this payload")
+
+  assert model._validator_.validate(dict(payload), getattr(model, skip), True, join_msg) == before
+
+def test_compiled_schema_is_shared_by_the_model():
+  assert Selection()._validator_ is Selection._validator_
+  assert Selection._validator_.required == ("name", "event_id", "active", "outcome")